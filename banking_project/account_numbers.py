@@ -0,0 +1,210 @@
+import threading
+import psycopg2
+from psycopg2 import extensions
+
+# checking_accounts.account_number is an INT, so allocated numbers must stay below 2^31
+MAX_ACCOUNT_NUMBER = 2147483647
+FIRST_ACCOUNT_NUMBER = 111111111
+
+# Serializes first-use creation of the sequence across processes; released at the end of the transaction
+SEQUENCE_LOCK_QUERY = "SELECT pg_advisory_xact_lock(hashtext(%s));"
+SEQUENCE_INCREMENT_QUERY = "SELECT increment_by FROM pg_sequences WHERE sequencename = %s;"
+NEXT_BLOCKS_QUERY = "SELECT nextval(%s) FROM generate_series(1, %s);"
+
+
+class AccountNumbersExhausted(psycopg2.DataError):
+    """
+    Raised when the sequence cannot issue as many account numbers as were requested.
+    """
+
+
+def luhn_check_digit(number):
+    """
+    Compute the Luhn (mod 10) check digit for a number.
+
+    Args:
+        number (int): The number to protect.
+
+    Returns:
+        int: The digit to append so the result passes a Luhn check.
+    """
+    total = 0
+    for position, digit in enumerate(reversed(str(number))):
+        value = int(digit)
+        if position % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return (10 - total % 10) % 10
+
+
+def is_valid_account_number(account_number):
+    """
+    Check an account number issued in check-digit format.
+
+    Args:
+        account_number (int): Account number whose last digit is a Luhn check digit.
+
+    Returns:
+        bool: True if the check digit matches.
+    """
+    return luhn_check_digit(account_number // 10) == account_number % 10
+
+
+class AccountNumberAllocator:
+    def __init__(self, sequence_name="checking_account_number_seq", block_size=100, check_digit=False):
+        """
+        Hand out unique checking account numbers from blocks reserved on a database sequence.
+
+        Each nextval() on the sequence reserves block_size consecutive numbers that are then issued from
+        memory, so opening accounts costs one round trip per block rather than per account, and numbers
+        can never collide with each other or with rows that existed when the sequence was created.
+
+        Args:
+            sequence_name (str, optional): Sequence used for reservations. Created on first use, starting
+                                           above the highest existing account number.
+                                           Defaults to "checking_account_number_seq".
+            block_size (int, optional): Numbers reserved per round trip. Only applies when the sequence is
+                                        created; an existing sequence keeps its own increment. Defaults to 100.
+            check_digit (bool, optional): Append a Luhn check digit to every issued number. Defaults to False.
+        """
+        self.sequence_name = sequence_name
+        self.block_size = block_size
+        self.check_digit = check_digit
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._ready = False
+
+    def allocate(self, connection, count=1):
+        """
+        Return count unique account numbers, reserving new blocks through the connection when needed.
+
+        All blocks that are needed are reserved in a single round trip. Reserved numbers are never
+        returned to the sequence, so a rolled back insert leaves a gap rather than a duplicate.
+
+        Args:
+            connection (connection): Connection used to reach the sequence.
+            count (int, optional): How many numbers to allocate. Defaults to 1.
+
+        Returns:
+            list: Exactly count account numbers, in check-digit format when enabled.
+
+        Raises:
+            AccountNumbersExhausted: The sequence has run out of numbers that fit checking_accounts.account_number.
+        """
+        with self._lock:
+            numbers, missing = self._take(count)
+            if missing:
+                cursor = connection.cursor()
+                self._ensure_sequence(cursor)
+
+                cursor.execute(NEXT_BLOCKS_QUERY, (self.sequence_name, -(-missing // self.block_size)))
+                numbers += self._fill([row[0] for row in cursor.fetchall()], missing)
+                cursor.close()
+
+        return self._format(self._check_exhausted(numbers, count))
+
+    async def allocate_async(self, connection, count=1):
+        """
+        Asyncio counterpart of allocate() for a psycopg 3 AsyncConnection.
+
+        Two coroutines that both run out of numbers may each reserve a block; the unused remainder of one
+        of them is skipped, which leaves a gap but never a duplicate.
+
+        Args:
+            connection (AsyncConnection): Connection used to reach the sequence.
+            count (int, optional): How many numbers to allocate. Defaults to 1.
+
+        Returns:
+            list: Exactly count account numbers, in check-digit format when enabled.
+
+        Raises:
+            AccountNumbersExhausted: The sequence has run out of numbers that fit checking_accounts.account_number.
+        """
+        with self._lock:
+            numbers, missing = self._take(count)
+        if missing:
+            async with connection.cursor() as cursor:
+                if not self._ready:
+                    await cursor.execute(SEQUENCE_LOCK_QUERY, (self.sequence_name,))
+                    await cursor.execute(SEQUENCE_INCREMENT_QUERY, (self.sequence_name,))
+                    row = await cursor.fetchone()
+                    if row is None:
+                        await cursor.execute("SELECT COALESCE(MAX(account_number), 0) FROM checking_accounts;")
+                        await cursor.execute(self._create_sequence_query((await cursor.fetchone())[0]))
+                    else:
+                        self.block_size = row[0]
+                        self._ready = True
+
+                await cursor.execute(NEXT_BLOCKS_QUERY, (self.sequence_name, -(-missing // self.block_size)))
+                starts = [row[0] for row in await cursor.fetchall()]
+            with self._lock:
+                numbers += self._fill(starts, missing)
+
+        return self._format(self._check_exhausted(numbers, count))
+
+    def _take(self, count):
+        numbers = list(range(self._next, min(self._end, self._next + count)))
+        self._next += len(numbers)
+        return numbers, count - len(numbers)
+
+    def _fill(self, starts, missing):
+        numbers = []
+        for start in sorted(starts):
+            taken = min(missing, self.block_size)
+            end = min(start + self.block_size, self._max_base() + 1)
+            numbers.extend(range(start, min(start + taken, end)))
+            missing -= taken
+            self._next, self._end = start + taken, end
+        return numbers
+
+    def _check_exhausted(self, numbers, count):
+        # The last block below MAXVALUE is cut short, so a request can come back with fewer numbers
+        if len(numbers) < count:
+            raise AccountNumbersExhausted(
+                f"Account numbers exhausted: {self.sequence_name} issued {len(numbers)} of {count} requested "
+                f"before reaching its limit of {self._max_base()}")
+        return numbers
+
+    def _format(self, numbers):
+        if self.check_digit:
+            return [number * 10 + luhn_check_digit(number) for number in numbers]
+        return numbers
+
+    def _create_sequence_query(self, highest_account_number):
+        scale = 10 if self.check_digit else 1
+        start = max(highest_account_number // scale + 1, FIRST_ACCOUNT_NUMBER // scale)
+        return f"""
+            CREATE SEQUENCE IF NOT EXISTS {self.sequence_name}
+            START WITH {start} INCREMENT BY {self.block_size} MAXVALUE {self._max_base()};
+        """
+
+    def _ensure_sequence(self, cursor):
+        if self._ready:
+            return
+
+        was_idle = cursor.connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+
+        cursor.execute(SEQUENCE_LOCK_QUERY, (self.sequence_name,))
+        cursor.execute(SEQUENCE_INCREMENT_QUERY, (self.sequence_name,))
+        row = cursor.fetchone()
+        if row is not None:
+            self.block_size = row[0]
+            self._ready = True
+            return
+
+        cursor.execute("SELECT COALESCE(MAX(account_number), 0) FROM checking_accounts;")
+        cursor.execute(self._create_sequence_query(cursor.fetchone()[0]))
+
+        # Commit the new sequence right away unless the caller already had work in flight; in that case
+        # it commits (or rolls back) with the caller's transaction and is checked again next time
+        if was_idle:
+            cursor.connection.commit()
+            self._ready = True
+
+    def _max_base(self):
+        if self.check_digit:
+            return (MAX_ACCOUNT_NUMBER - 9) // 10
+        return MAX_ACCOUNT_NUMBER
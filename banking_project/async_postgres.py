@@ -0,0 +1,510 @@
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+from tabulate import tabulate
+from account_numbers import AccountNumberAllocator, AccountNumbersExhausted
+from schema_cache import CATALOG_QUERY, TABLE_QUERY
+from schema_planner import SchemaChangePlan
+
+
+class async_postgres:
+    def __init__(self, host, database, user, password, port="5432", min_connections=1, max_connections=10,
+                 account_number_block_size=100, account_number_check_digit=False):
+        """
+        Initialize an asyncio PostgreSQL client with the same surface as the postgres class.
+
+        Built on psycopg 3 with its own async connection pool, so one event loop can drive many
+        concurrent banking operations without pushing blocking calls onto threads. Covers querying, schema
+        management, customers, accounts, balances and user deletion; bulk ingest, exports, statements,
+        replicas, transaction() blocks and instrumentation are only on the postgres class.
+
+        Args:
+            host (str): Hostname or IP address of the PostgreSQL server.
+            database (str): Name of the database to connect to.
+            user (str): Username for the database connection.
+            password (str): Password for the database connection.
+            port (str, optional): Port number for the database connection. Defaults to "5432".
+            min_connections (int, optional): Warm connections kept open by the pool. Defaults to 1.
+            max_connections (int, optional): Upper bound on open connections. Defaults to 10.
+            account_number_block_size (int, optional): Account numbers reserved from the database sequence per
+                                                       round trip. Defaults to 100.
+            account_number_check_digit (bool, optional): Issue account numbers with a trailing Luhn check
+                                                         digit. Defaults to False.
+        """
+        self.host = host
+        self.database = database
+        self.user = user
+        self.password = password
+        self.port = port
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.pool = None
+        self.account_numbers = AccountNumberAllocator(block_size=account_number_block_size,
+                                                      check_digit=account_number_check_digit)
+        self._tables = None
+
+    async def connect(self):
+        """
+        Open the connection pool and wait until its minimum number of connections is ready.
+        """
+        try:
+            self.pool = AsyncConnectionPool(
+                make_conninfo(host=self.host, dbname=self.database, user=self.user, password=self.password,
+                              port=self.port),
+                min_size=self.min_connections,
+                max_size=self.max_connections,
+                check=AsyncConnectionPool.check_connection,
+                open=False
+            )
+            await self.pool.open(wait=True)
+            print("Connection to PostgreSQL successful!")
+        except (psycopg.Error, PoolTimeout) as e:
+            print(f"Error connecting to PostgreSQL: {e}")
+
+    def _is_connected(self):
+        return self.pool is not None and not self.pool.closed
+
+    def pool_stats(self):
+        """
+        Return connection pool statistics.
+
+        Returns:
+            dict: psycopg_pool's usage counters, or None when not connected.
+        """
+        if self.pool is None:
+            return None
+        return self.pool.get_stats()
+
+    async def query(self, query, params=None, max_rows=None):
+        """
+        Execute a SQL query and print the results in a table format.
+
+        Args:
+            query (str): SQL query to be executed.
+            params (tuple, optional): Parameters bound to the query. Defaults to None.
+            max_rows (int, optional): Only fetch and format the first max_rows rows. Defaults to None.
+
+        Returns:
+            list: The fetched rows, or None if the query failed.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            async with self.pool.connection() as connection:
+                async with connection.cursor() as cursor:
+                    await cursor.execute(query, params)
+                    results = await (cursor.fetchall() if max_rows is None else cursor.fetchmany(max_rows))
+
+                    headers = [desc[0] for desc in cursor.description]
+                    print(tabulate(results, headers=headers, tablefmt="grid"))
+                    return results
+        except psycopg.Error as e:
+            print(f"Error executing query: {e}")
+
+    async def pipeline(self, statements):
+        """
+        Send many independent statements on one connection in pipeline mode.
+
+        Every statement is written to the server before any result is read, so the batch costs roughly one
+        network round trip instead of one per statement. The batch commits together.
+
+        Args:
+            statements (list): Tuples of (sql, params).
+
+        Returns:
+            list: For each statement, its fetched rows if it returned any, otherwise its row count.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            async with self.pool.connection() as connection:
+                cursors = []
+                async with connection.pipeline():
+                    for sql, params in statements:
+                        cursor = connection.cursor()
+                        await cursor.execute(sql, params)
+                        cursors.append(cursor)
+
+                results = []
+                for cursor in cursors:
+                    results.append(await cursor.fetchall() if cursor.description else cursor.rowcount)
+                    await cursor.close()
+                return results
+        except psycopg.Error as e:
+            print(f"Error executing pipeline: {e}")
+
+    async def add_table(self, table_name, table_definition):
+        """
+        Create a new table in the connected PostgreSQL database.
+
+        Args:
+            table_name (str): Name of the new table.
+            table_definition (str): Definition of the new table's columns and data types.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            async with self.pool.connection() as connection:
+                await connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({table_definition});")
+            self._tables = None
+            print(f"Table '{table_name}' created successfully!")
+        except psycopg.Error as e:
+            print(f"Error adding table: {e}")
+
+    async def add_columns(self, table_name, column_data, dry_run=False):
+        """
+        Add new columns to a table with one combined ALTER TABLE. See postgres.add_columns().
+
+        Args:
+            table_name (str): Name of the table to which the columns will be added.
+            column_data (list): List of tuples containing column name and data type pairs.
+            dry_run (bool, optional): Only print the plan without executing it. Defaults to False.
+
+        Returns:
+            SchemaChangePlan: The planned changes, or None if no connection is established.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            plan = SchemaChangePlan(table_name, await self._load_table(table_name))
+            for column_name, column_type in column_data:
+                plan.add_column(column_name, column_type)
+
+            await self._apply_schema_plan(plan, dry_run)
+            if not dry_run:
+                print(f"Columns added successfully to table '{table_name}'.")
+            return plan
+        except psycopg.Error as e:
+            print(f"Error adding columns: {e}")
+
+    async def update_columns(self, table_name, column_name_mapping, dry_run=False):
+        """
+        Rename columns, change their types and make them NOT NULL in one transaction. See
+        postgres.update_columns().
+
+        Args:
+            table_name (str): Name of the table in which the columns will be updated.
+            column_name_mapping (dict): Old column names mapped to (new column name, new data type).
+            dry_run (bool, optional): Only print the plan without executing it. Defaults to False.
+
+        Returns:
+            SchemaChangePlan: The planned changes, or None if no connection is established.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            plan = SchemaChangePlan(table_name, await self._load_table(table_name))
+            for old_column_name, (new_column_name, new_data_type) in column_name_mapping.items():
+                plan.rename_column(old_column_name, new_column_name)
+                plan.alter_column_type(new_column_name, new_data_type)
+                plan.set_not_null(new_column_name)
+
+            await self._apply_schema_plan(plan, dry_run)
+            if not dry_run:
+                print(f"Columns in table '{table_name}' updated successfully.")
+            return plan
+        except psycopg.Error as e:
+            print(f"Error updating columns: {e}")
+
+    async def _apply_schema_plan(self, plan, dry_run):
+        if dry_run or plan.rewrites:
+            print(plan.describe())
+        if dry_run or plan.is_empty():
+            return
+
+        try:
+            # The block commits the whole plan together, or rolls all of it back
+            async with self.pool.connection() as connection:
+                await connection.execute(plan.sql())
+        finally:
+            self._tables = None
+
+    async def show_tables(self):
+        """
+        Show a list of tables in the connected PostgreSQL database.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            results = sorted(await self._catalog())
+            if len(results) == 0:
+                print("No tables found in the 'public' schema.")
+            else:
+                print("Tables in the 'public' schema:")
+                for table_name in results:
+                    print(table_name)
+        except psycopg.Error as e:
+            print(f"Error showing tables: {e}")
+
+    async def show_table_schema(self, table_name):
+        """
+        Show the schema of a specific table in the connected PostgreSQL database.
+
+        Args:
+            table_name (str): Name of the table to display the schema for.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            rows = []
+            for column_name, data_type, max_length, is_nullable, is_primary_key in \
+                    (await self._catalog()).get(table_name, []):
+                rows.append([column_name, data_type, str(max_length), "YES" if is_nullable else "NO",
+                             "Yes" if is_primary_key else "No"])
+
+            headers = ["Column Name", "Data Type", "Max Length", "OPTIONAL", "Primary Key"]
+            print(f"Schema for table '{table_name}':")
+            print(tabulate(rows, headers=headers, tablefmt="grid"))
+        except psycopg.Error as e:
+            print(f"Error showing table schema: {e}")
+
+    async def get_table_schema(self, table_name):
+        """
+        Return the cached schema of a table without printing it.
+
+        Args:
+            table_name (str): Name of the table to look up.
+
+        Returns:
+            list: Tuples of (column_name, data_type, max_length, is_nullable, is_primary_key), or None if
+                  the table does not exist or no connection is established.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            return (await self._catalog()).get(table_name)
+        except psycopg.Error as e:
+            print(f"Error reading table schema: {e}")
+
+    async def new_customer(self, first_name, last_name, email,
+                           date_of_birth, phone_number, phone_type, ssn, gender,
+                           street_number, street_name, city, state, zip_code):
+        """
+        Create a new customer record in the "Users" table. See postgres.new_customer() for the arguments.
+
+        Returns:
+            str: The new customer's user_id, or None if the record could not be created.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            query = """
+                INSERT INTO users (user_id, first_name, last_name,
+                email, date_of_birth, phone_number, phone_type, ssn,
+                gender, street_number, street_name, city, state, zip_code)
+                VALUES (uuid_generate_v4(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING user_id;
+            """
+
+            # psycopg 3 prepares statements it sees repeatedly on a connection, so no explicit cache is needed
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(query, (first_name, last_name, email, date_of_birth, phone_number,
+                                                          phone_type, ssn, gender, street_number, street_name, city,
+                                                          state, zip_code))
+                user_id = (await cursor.fetchone())[0]
+            print("New customer record created successfully!")
+            return str(user_id)
+        except psycopg.Error as e:
+            print(f"Error creating new customer record: {e}")
+
+    async def create_new_checking_account(self, user_id, overdraft_limit=None):
+        """
+        Create a new checking account in the 'checking_accounts' table.
+
+        Args:
+            user_id (str): The user ID of the associated user.
+            overdraft_limit (int, optional): The overdraft limit for the checking account. Defaults to None.
+
+        Returns:
+            int: The account number issued to the new account, or None if it could not be created.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            async with self.pool.connection() as connection:
+                account_number = (await self.account_numbers.allocate_async(connection))[0]
+                await connection.execute("""
+                    INSERT INTO checking_accounts (checking_id, account_number, account_status, overdraft_limit, user_id)
+                    VALUES (uuid_generate_v4(), %s, 'Active', %s, %s);
+                """, (account_number, overdraft_limit, user_id))
+            print("New checking account created successfully!")
+            return account_number
+        except (psycopg.Error, AccountNumbersExhausted) as e:
+            print(f"Error creating checking account: {e}")
+
+    async def get_balance(self, checking_account_id):
+        """
+        Return the current balance of a checking account. See postgres.get_balance().
+
+        Args:
+            checking_account_id (str): The checking_id of the account.
+
+        Returns:
+            int: The current balance.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute("""
+                    SELECT COALESCE(
+                        (SELECT account_balance FROM checking_balances WHERE checking_account_id = %(id)s),
+                        (SELECT COALESCE(SUM(transaction_amount), 0) FROM checking_details
+                         WHERE checking_account_id = %(id)s)
+                        + (SELECT COALESCE(SUM(transaction_amount), 0) FROM checking_details_archive
+                           WHERE checking_account_id = %(id)s)
+                    );
+                """, {"id": str(checking_account_id)})
+                return (await cursor.fetchone())[0]
+        except psycopg.Error as e:
+            print(f"Error reading balance: {e}")
+
+    async def delete_user(self, user_id):
+        """
+        Delete a user, together with their checking accounts, balances and ledger rows.
+
+        Args:
+            user_id (str): The user ID of the user to be deleted.
+        """
+        result = await self._delete_users([user_id], 1)
+        if result is None:
+            return
+        if result["users"]:
+            print(f"User with ID {user_id} deleted successfully.")
+        else:
+            print(f"User with ID {user_id} not found.")
+
+    async def delete_users(self, user_ids, chunk_size=1000):
+        """
+        Delete many users and everything that references them, in one transaction. See
+        postgres.delete_users().
+
+        Args:
+            user_ids (list): The user IDs to delete. IDs with no matching user are skipped.
+            chunk_size (int, optional): User IDs per statement. Defaults to 1000.
+
+        Returns:
+            dict: 'users' (list of deleted user IDs), and counts of deleted 'accounts', 'balances' and
+                  'transactions', or None if nothing was deleted because of an error.
+        """
+        result = await self._delete_users(user_ids, chunk_size)
+        if result is not None:
+            print(f"{len(result['users'])} users deleted with {result['accounts']} checking accounts and "
+                  f"{result['transactions']} transactions.")
+        return result
+
+    async def _delete_users(self, user_ids, chunk_size):
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+            result = {"users": [], "accounts": 0, "balances": 0, "transactions": 0}
+
+            query = """
+                WITH users_locked AS (
+                    SELECT user_id FROM users WHERE user_id = ANY(%(users)s::uuid[])
+                    ORDER BY user_id
+                    FOR UPDATE
+                ),
+                accounts AS (
+                    SELECT checking_id FROM checking_accounts
+                    WHERE user_id IN (SELECT user_id FROM users_locked)
+                ),
+                details AS (
+                    DELETE FROM checking_details
+                    WHERE user_id IN (SELECT user_id FROM users_locked)
+                       OR checking_account_id IN (SELECT checking_id FROM accounts)
+                    RETURNING 1
+                ),
+                archived_details AS (
+                    DELETE FROM checking_details_archive
+                    WHERE user_id IN (SELECT user_id FROM users_locked)
+                       OR checking_account_id IN (SELECT checking_id FROM accounts)
+                    RETURNING 1
+                ),
+                balances AS (
+                    DELETE FROM checking_balances
+                    WHERE checking_account_id IN (SELECT checking_id FROM accounts)
+                    RETURNING 1
+                ),
+                deleted_accounts AS (
+                    DELETE FROM checking_accounts
+                    WHERE checking_id IN (SELECT checking_id FROM accounts)
+                    RETURNING 1
+                ),
+                deleted_users AS (
+                    DELETE FROM users
+                    WHERE user_id IN (SELECT user_id FROM users_locked)
+                    RETURNING user_id
+                )
+                SELECT ARRAY(SELECT user_id::text FROM deleted_users),
+                       (SELECT COUNT(*) FROM deleted_accounts),
+                       (SELECT COUNT(*) FROM balances),
+                       (SELECT COUNT(*) FROM details) + (SELECT COUNT(*) FROM archived_details);
+            """
+
+            # Every chunk runs on one connection and commits together when the block exits
+            async with self.pool.connection() as connection:
+                for offset in range(0, len(user_ids), chunk_size):
+                    cursor = await connection.execute(query, {"users": user_ids[offset:offset + chunk_size]})
+                    users, accounts, balances, transactions = await cursor.fetchone()
+                    result["users"].extend(users)
+                    result["accounts"] += accounts
+                    result["balances"] += balances
+                    result["transactions"] += transactions
+            return result
+        except psycopg.Error as e:
+            print(f"Error deleting users: {e}")
+
+    async def close_connection(self):
+        """
+        Close every pooled connection.
+        """
+        if self._is_connected():
+            await self.pool.close()
+            print("Connection pool closed.")
+
+    async def _catalog(self):
+        if self._tables is None:
+            tables = {}
+            async with self.pool.connection() as connection:
+                cursor = await connection.execute(CATALOG_QUERY, ("public",))
+                for table_name, column_name, *column in await cursor.fetchall():
+                    columns = tables.setdefault(table_name, [])
+                    if column_name is not None:
+                        columns.append((column_name, *column))
+            self._tables = tables
+        return self._tables
+
+    async def _load_table(self, table_name):
+        # DDL is planned from a fresh catalog read, never from the cache
+        async with self.pool.connection() as connection:
+            cursor = await connection.execute(TABLE_QUERY, ("public", table_name))
+            rows = await cursor.fetchall()
+        if not rows:
+            return None
+        return [(column_name, *column) for _, column_name, *column in rows if column_name is not None]
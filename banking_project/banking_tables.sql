@@ -8,6 +8,11 @@ CREATE TABLE
 	phone_type VARCHAR(6) NOT NULL,
 	ssn VARCHAR(11) NOT NULL,
 	email VARCHAR(150) NOT NULL,
+	street_number VARCHAR(10),
+	street_name VARCHAR(100),
+	city VARCHAR(50),
+	state VARCHAR(2),
+	zip_code VARCHAR(10),
 	account_creation_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
 	account_status VARCHAR(8) DEFAULT 'active',
 	UNIQUE(ssn),
@@ -39,4 +44,25 @@ CREATE TABLE
 	transaction_date DATE NOT NULL DEFAULT CURRENT_DATE,
 	account_balance INT NOT NULL DEFAULT 0,
 	memo VARCHAR(150)
-	)
\ No newline at end of file
+	);
+
+CREATE TABLE
+	checking_balances (checking_account_id UUID NOT NULL PRIMARY KEY,
+	FOREIGN KEY (checking_account_id) REFERENCES checking_accounts(checking_id),
+	account_balance INT NOT NULL DEFAULT 0,
+	last_transaction DATE,
+	updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+	);
+
+CREATE TABLE
+	checking_details_archive (checking_details_id UUID NOT NULL PRIMARY KEY,
+	user_id UUID,
+	checking_account_id UUID,
+	account_number INT NOT NULL,
+	transaction_amount INT,
+	transaction_type VARCHAR(8),
+	transaction_date DATE NOT NULL,
+	account_balance INT NOT NULL DEFAULT 0,
+	memo VARCHAR(150),
+	archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+	);
@@ -0,0 +1,313 @@
+"""Benchmarks postgres.py against a throwaway local PostgreSQL cluster and writes a JSON report.
+
+Usage:
+    python benchmark.py --output report.json
+    python benchmark.py --output new.json --compare old.json
+
+Requires the PostgreSQL server binaries (initdb, pg_ctl) on PATH or in --pg-bin, and must not run as root.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from psycopg2 import extensions
+from postgres import postgres
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "banking_tables.sql")
+
+
+class ThrowawayCluster:
+    def __init__(self, pg_bin=None):
+        """
+        A PostgreSQL cluster created with initdb in a temporary directory and removed on stop().
+
+        Args:
+            pg_bin (str, optional): Directory holding initdb and pg_ctl. Defaults to None (search PATH).
+        """
+        self.pg_bin = pg_bin
+        self.directory = None
+        self.port = None
+
+    def start(self):
+        self.directory = tempfile.mkdtemp(prefix="banking_bench_")
+        data_directory = os.path.join(self.directory, "data")
+        self.port = free_port()
+
+        subprocess.run([self._binary("initdb"), "-D", data_directory, "-U", "bench", "--auth=trust",
+                        "--encoding=UTF8", "--no-sync"], check=True, capture_output=True)
+        subprocess.run([self._binary("pg_ctl"), "-D", data_directory, "-l", os.path.join(self.directory, "server.log"),
+                        "-o", f"-p {self.port} -k {self.directory} -c listen_addresses=''", "-w", "start"],
+                       check=True, capture_output=True)
+
+    def stop(self):
+        if self.directory is None:
+            return
+        subprocess.run([self._binary("pg_ctl"), "-D", os.path.join(self.directory, "data"), "-m", "fast", "-w",
+                        "stop"], capture_output=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+    def _binary(self, name):
+        if self.pg_bin:
+            return os.path.join(self.pg_bin, name)
+        path = shutil.which(name)
+        if path is None:
+            raise RuntimeError(f"'{name}' not found on PATH. Pass --pg-bin with the PostgreSQL bin directory.")
+        return path
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_schema(db):
+    with db._checkout() as connection:
+        cursor = connection.cursor()
+        # uuid-ossp is not always installed; gen_random_uuid() (PostgreSQL 13+) is an equivalent fallback
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'uuid-ossp';")
+        if cursor.fetchone():
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS "uuid-ossp";')
+        else:
+            cursor.execute("CREATE FUNCTION uuid_generate_v4() RETURNS uuid LANGUAGE sql AS 'SELECT gen_random_uuid()';")
+        with open(SCHEMA_FILE) as f:
+            cursor.execute(f.read())
+        connection.commit()
+        cursor.close()
+
+
+def customer(n):
+    return {"first_name": "Bench", "last_name": f"User{n}", "email": f"bench{n}@example.com",
+            "date_of_birth": "1990-01-01", "phone_number": f"{n:012d}", "phone_type": "Cell",
+            "ssn": f"{n:09d}", "gender": random.choice(["Male", "Female"])}
+
+
+def measure(db, name, operations):
+    """
+    Time each call in operations individually.
+
+    postgres methods print errors instead of raising, so an operation counts as failed when it leaves the
+    connection in an aborted transaction; that transaction is rolled back before the next operation.
+
+    Args:
+        db (postgres): Connected client the operations run against.
+        name (str): Benchmark name.
+        operations (iterable): Zero-argument callables, one per operation.
+
+    Returns:
+        dict: Operation count, error count, wall time, throughput and latency percentiles in milliseconds.
+    """
+    latencies = []
+    errors = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for operation in operations:
+            operation_started = time.perf_counter()
+            operation()
+            latencies.append(time.perf_counter() - operation_started)
+            if db.connection.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+                db.connection.rollback()
+                errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(percent):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] * 1000 if latencies else 0.0
+
+    result = {
+        "operations": len(latencies),
+        "errors": errors,
+        "seconds": elapsed,
+        "ops_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+    print(f"{name}: {result['ops_per_second']:.0f} ops/sec, p50 {result['p50_ms']:.2f} ms, "
+          f"p99 {result['p99_ms']:.2f} ms" + (f", {errors} errors" if errors else ""))
+    return result
+
+
+def count_rows(db, table_name):
+    with db._checkout() as connection:
+        cursor = connection.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name};")
+        count = cursor.fetchone()[0]
+        connection.commit()
+        cursor.close()
+        return count
+
+
+def run_benchmarks(db, scale):
+    results = {}
+
+    results["new_customer"] = measure(db, "new_customer", [
+        (lambda c=customer(n): db.new_customer(*[c[column] for column in
+                                                 ["first_name", "last_name", "email", "date_of_birth", "phone_number",
+                                                  "phone_type", "ssn", "gender"]], None, None, None, None, None))
+        for n in range(scale)
+    ])
+
+    results["bulk_new_customers"] = measure(db, "bulk_new_customers", [
+        lambda: db.bulk_new_customers(customer(n) for n in range(scale, scale * 11))
+    ])
+    results["bulk_new_customers"]["rows"] = scale * 10
+
+    user_ids = [row[0] for row in db.stream_query("SELECT user_id FROM users ORDER BY user_id;")]
+    results["create_new_checking_account"] = measure(db, "create_new_checking_account", [
+        (lambda user_id=user_id: db.create_new_checking_account(user_id)) for user_id in user_ids[:scale]
+    ])
+    # The last scale users keep no accounts so delete_user has rows it is allowed to remove
+    results["create_new_checking_accounts"] = measure(db, "create_new_checking_accounts", [
+        lambda: db.create_new_checking_accounts(user_ids[scale:-scale])
+    ])
+
+    account_ids = [str(row[0]) for row in db.stream_query("SELECT checking_id FROM checking_accounts;")]
+    start_date = datetime.date.today() - datetime.timedelta(days=365)
+
+    def batch():
+        return [(random.choice(account_ids), random.randint(-500, 1000), "Deposit", None,
+                 str(start_date + datetime.timedelta(days=random.randint(0, 365)))) for _ in range(100)]
+
+    results["post_transactions"] = measure(db, "post_transactions (100 per batch)", [
+        (lambda transactions=batch(): db.post_transactions(transactions)) for _ in range(scale)
+    ])
+
+    results["query_first_rows"] = measure(db, "query (first 50 rows of checking_details)", [
+        lambda: db.query("SELECT * FROM checking_details;", max_rows=50) for _ in range(20)
+    ])
+    results["stream_query_full_scan"] = measure(db, "stream_query (full checking_details scan)", [
+        lambda: sum(1 for _ in db.stream_query("SELECT * FROM checking_details;")) for _ in range(5)
+    ])
+    results["get_balance"] = measure(db, "get_balance", [
+        (lambda account_id=random.choice(account_ids): db.get_balance(account_id)) for _ in range(scale)
+    ])
+
+    with db._checkout() as connection:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT u.user_id FROM users u
+            WHERE NOT EXISTS (SELECT 1 FROM checking_accounts a WHERE a.user_id = u.user_id) LIMIT %s;
+        """, (scale,))
+        deletable = [row[0] for row in cursor.fetchall()]
+        connection.commit()
+        cursor.close()
+
+    users_before = count_rows(db, "users")
+    results["delete_user"] = measure(db, "delete_user", [
+        (lambda user_id=user_id: db.delete_user(user_id)) for user_id in deletable
+    ])
+    results["delete_user"]["rows_deleted"] = users_before - count_rows(db, "users")
+
+    # These users own accounts and ledger rows, which are deleted with them
+    users_before = count_rows(db, "users")
+    results["delete_users"] = measure(db, f"delete_users ({scale} users with accounts)", [
+        lambda: db.delete_users(user_ids[:scale])
+    ])
+    results["delete_users"]["rows_deleted"] = users_before - count_rows(db, "users")
+
+    return results
+
+
+def compare(report, baseline, tolerance):
+    """
+    Print throughput changes against a baseline report.
+
+    Returns:
+        bool: True if any benchmark lost more than tolerance (a fraction) of its throughput or failed more
+              operations than before.
+    """
+    regressed = False
+    print(f"\nComparison against {baseline['metadata'].get('commit') or 'baseline'}:")
+    for name, result in report["results"].items():
+        previous = baseline["results"].get(name)
+        if previous is None or not previous["ops_per_second"]:
+            continue
+        change = result["ops_per_second"] / previous["ops_per_second"] - 1
+        flag = ""
+        if change < -tolerance or result.get("errors", 0) > previous.get("errors", 0):
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"  {name}: {previous['ops_per_second']:.0f} -> {result['ops_per_second']:.0f} ops/sec "
+              f"({change:+.1%}){flag}")
+    return regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(SCHEMA_FILE)).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark postgres.py against a throwaway PostgreSQL cluster.")
+    parser.add_argument("--output", default="benchmark_report.json", help="Where to write the JSON report.")
+    parser.add_argument("--compare", help="Baseline JSON report to compare throughput against.")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Throughput loss (fraction) that counts as a regression. Defaults to 0.10.")
+    parser.add_argument("--scale", type=int, default=1000, help="Operations per benchmark. Defaults to 1000.")
+    parser.add_argument("--pg-bin", help="Directory containing initdb and pg_ctl.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed. Defaults to 0.")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    cluster = ThrowawayCluster(args.pg_bin)
+    cluster.start()
+    try:
+        db = postgres(cluster.directory, "postgres", "bench", "", port=str(cluster.port))
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.connect()
+        load_schema(db)
+
+        with db._checkout() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SHOW server_version;")
+            server_version = cursor.fetchone()[0]
+            connection.commit()
+            cursor.close()
+
+        report = {
+            "metadata": {
+                "commit": git_commit(),
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "postgres": server_version,
+                "platform": platform.platform(),
+                "scale": args.scale,
+                "seed": args.seed,
+            },
+            "results": run_benchmarks(db, args.scale),
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            db.close_connection()
+    finally:
+        cluster.stop()
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
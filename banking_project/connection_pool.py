@@ -0,0 +1,154 @@
+import threading
+import time
+import psycopg2
+from psycopg2 import pool
+
+
+class ConnectionPool:
+    def __init__(self, min_connections, max_connections, health_check_interval=30.0,
+                 checkout_timeout=30.0, **connect_kwargs):
+        """
+        Initialize a thread-safe pool of warm PostgreSQL connections.
+
+        Args:
+            min_connections (int): Number of connections opened up front and kept warm.
+            max_connections (int): Maximum number of connections the pool will ever hold open.
+            health_check_interval (float, optional): Seconds a connection may sit idle before it is
+                                                     pinged with 'SELECT 1' on checkout. Defaults to 30.
+            checkout_timeout (float, optional): Seconds a caller will wait for a free connection before
+                                                giving up. Defaults to 30.
+            **connect_kwargs: Keyword arguments passed straight to psycopg2.connect().
+        """
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._pool = pool.ThreadedConnectionPool(min_connections, max_connections, **connect_kwargs)
+        # psycopg2 raises instead of blocking when the pool is exhausted, so callers queue here first
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+        self._last_used = {}
+
+        self._checkouts = 0
+        self._in_use = 0
+        self._peak_in_use = 0
+        self._health_checks = 0
+        self._discarded = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    @property
+    def closed(self):
+        return self._pool.closed
+
+    def getconn(self):
+        """
+        Check a connection out of the pool, blocking until one is free.
+
+        Stale connections (closed, or idle longer than health_check_interval and failing a ping)
+        are discarded. Once one has failed (e.g. after a server restart) every other idle connection is
+        pinged before use too, and discarded until one passes or the pool opens a fresh one.
+
+        Returns:
+            connection: A live psycopg2 connection. Must be handed back with putconn().
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise pool.PoolError(f"Timed out after {self.checkout_timeout}s waiting for a pooled connection")
+        waited = time.monotonic() - started
+
+        try:
+            connection = self._pool.getconn()
+            attempts = 0
+            while not self._is_healthy(connection, force=attempts > 0):
+                self._forget(connection)
+                self._pool.putconn(connection, close=True)
+                with self._lock:
+                    self._discarded += 1
+                attempts += 1
+                # Every idle connection has been tried, and so has at least one newly opened one
+                if attempts > self.max_connections:
+                    raise psycopg2.OperationalError("No pooled connection passed its health check")
+                connection = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._peak_in_use = max(self._peak_in_use, self._in_use)
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return connection
+
+    def putconn(self, connection, close=False):
+        """
+        Return a connection to the pool. Any open transaction is rolled back by psycopg2.
+
+        Args:
+            connection: The connection previously obtained from getconn().
+            close (bool, optional): Close the connection instead of keeping it warm. Defaults to False.
+        """
+        if close or connection.closed:
+            self._forget(connection)
+        else:
+            self._last_used[id(connection)] = time.monotonic()
+
+        try:
+            self._pool.putconn(connection, close=close)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def closeall(self):
+        """
+        Close every connection held by the pool.
+        """
+        self._pool.closeall()
+        self._last_used.clear()
+
+    def stats(self):
+        """
+        Return a snapshot of pool usage.
+
+        Returns:
+            dict: Pool size limits, connections in use, checkout counts, stale connections discarded
+                  and the average/maximum time callers waited for a connection (seconds).
+        """
+        with self._lock:
+            return {
+                "min_connections": self.min_connections,
+                "max_connections": self.max_connections,
+                "in_use": self._in_use,
+                "peak_in_use": self._peak_in_use,
+                "checkouts": self._checkouts,
+                "health_checks": self._health_checks,
+                "discarded": self._discarded,
+                "avg_wait": self._total_wait / self._checkouts if self._checkouts else 0.0,
+                "max_wait": self._max_wait,
+            }
+
+    def _is_healthy(self, connection, force=False):
+        if connection.closed:
+            return False
+
+        last_used = self._last_used.get(id(connection))
+        if not force and last_used is not None and time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        with self._lock:
+            self._health_checks += 1
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.close()
+            connection.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _forget(self, connection):
+        self._last_used.pop(id(connection), None)
@@ -0,0 +1,186 @@
+import datetime
+import decimal
+import gzip
+import json
+import os
+import re
+from contextlib import contextmanager
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".gzip": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+# PostgreSQL type OIDs mapped to the Arrow type each column is exported as; anything else becomes text
+ARROW_TYPES = {
+    16: "bool_", 20: "int64", 21: "int16", 23: "int32", 26: "int64", 700: "float32", 701: "float64",
+    17: "binary", 1082: "date32",
+}
+TIMESTAMP_OID = 1114
+TIMESTAMPTZ_OID = 1184
+NUMERIC_OID = 1700
+
+TABLE_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_$]*(\.[A-Za-z_][A-Za-z0-9_$]*)?$")
+
+
+def is_table_name(source, params=None):
+    """
+    Return whether source is a bare table name rather than a SELECT statement. Parameters only make sense
+    for a statement, so passing them with a table name is an error rather than silently ignored.
+    """
+    if not TABLE_NAME.match(source.strip()):
+        return False
+    if params:
+        raise ValueError(f"params were given but '{source.strip()}' is a table name, not a SELECT statement")
+    return True
+
+
+def copy_source(cursor, source, params=None):
+    """
+    Build the COPY source for a table name or a SELECT statement, binding params into the statement.
+    """
+    if is_table_name(source, params):
+        return source.strip()
+    query = source.strip().rstrip(";")
+    if params is not None:
+        query = cursor.mogrify(query, params).decode()
+    return f"({query})"
+
+
+def select_query(source, params=None):
+    """
+    Return source as a SELECT statement, expanding a bare table name to SELECT * FROM it.
+    """
+    if is_table_name(source, params):
+        return f"SELECT * FROM {source.strip()}"
+    return source
+
+
+def infer_compression(destination, compression):
+    if compression is not None or not isinstance(destination, (str, os.PathLike)):
+        return compression
+    return COMPRESSION_SUFFIXES.get(os.path.splitext(os.fspath(destination))[1].lower())
+
+
+@contextmanager
+def open_sink(destination, compression=None):
+    """
+    Yield a binary file object that writes to destination, compressing on the fly.
+
+    Args:
+        destination (str or file): Path, or a writable binary file-like object. File objects are flushed but
+                                   left open.
+        compression (str, optional): None, "gzip" or "zstd". Defaults to None, or to the compression implied
+                                     by a .gz/.zst path suffix.
+    """
+    compression = infer_compression(destination, compression)
+    if compression not in (None, "gzip", "zstd"):
+        raise ValueError(f"Unsupported compression '{compression}'; use None, 'gzip' or 'zstd'")
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("zstd compression requires the 'zstandard' package")
+
+    opened = isinstance(destination, (str, os.PathLike))
+    raw = open(destination, "wb") if opened else destination
+    try:
+        if compression == "gzip":
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as sink:
+                yield sink
+        elif compression == "zstd":
+            with zstandard.ZstdCompressor().stream_writer(raw, closefd=False) as sink:
+                yield sink
+        else:
+            yield raw
+        raw.flush()
+    finally:
+        if opened:
+            raw.close()
+
+
+def arrow_schema(description):
+    """
+    Build an Arrow schema from a psycopg2 cursor description, so every batch shares one schema even when
+    a batch is all NULL in some column.
+    """
+    if pa is None:
+        raise ImportError("Parquet and Arrow export require the 'pyarrow' package")
+
+    fields = []
+    for column in description:
+        if column.type_code in ARROW_TYPES:
+            arrow_type = getattr(pa, ARROW_TYPES[column.type_code])()
+        elif column.type_code == TIMESTAMP_OID:
+            arrow_type = pa.timestamp("us")
+        elif column.type_code == TIMESTAMPTZ_OID:
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif column.type_code == NUMERIC_OID and column.precision and column.precision <= 38:
+            arrow_type = pa.decimal128(column.precision, column.scale or 0)
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def to_text(value):
+    """
+    Render a value for a text column: json/jsonb and array values (dicts and lists) as JSON, anything else
+    (UUID, interval, ...) with str().
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str)
+    return str(value)
+
+
+def arrow_batch(rows, schema):
+    """
+    Convert a list of row tuples to an Arrow RecordBatch with the given schema.
+    """
+    arrays = []
+    for index, field in enumerate(schema):
+        values = [row[index] for row in rows]
+        if pa.types.is_string(field.type):
+            values = [to_text(value) for value in values]
+        elif pa.types.is_decimal(field.type):
+            values = [value if value is None or isinstance(value, decimal.Decimal) else decimal.Decimal(value)
+                      for value in values]
+        elif pa.types.is_timestamp(field.type) and field.type.tz is not None:
+            values = [value.astimezone(datetime.timezone.utc) if value is not None else None for value in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+@contextmanager
+def record_batch_writer(destination, schema, file_format="parquet", compression="zstd"):
+    """
+    Yield a writer with a write_batch(batch) method for a Parquet or Arrow IPC file.
+
+    Args:
+        destination (str or file): Path, or a writable binary file-like object.
+        schema (pyarrow.Schema): Schema shared by every batch.
+        file_format (str, optional): "parquet" or "arrow". Defaults to "parquet".
+        compression (str, optional): Parquet: None, "snappy", "gzip" or "zstd". Arrow: None, "lz4" or
+                                     "zstd". Defaults to "zstd".
+    """
+    if file_format == "parquet":
+        writer = pq.ParquetWriter(destination, schema, compression=compression or "none")
+    elif file_format == "arrow":
+        if compression not in (None, "lz4", "zstd"):
+            raise ValueError(f"Arrow files support lz4 or zstd compression, not '{compression}'")
+        writer = pa.ipc.new_file(destination, schema, options=pa.ipc.IpcWriteOptions(compression=compression))
+    else:
+        raise ValueError(f"Unsupported file format '{file_format}'; use 'parquet' or 'arrow'")
+
+    try:
+        yield writer
+    finally:
+        writer.close()
@@ -1,24 +1,421 @@
-from user_module import User
-import pandas as pd
-import random
+"""Generates synthetic users, checking_accounts, checking_details and checking_balances rows for load testing.
 
-first_names = pd.read_csv("~/Downloads/baby-names.csv")
-last_names_df = pd.read_csv("~/Downloads/surnames.csv")
+Usage:
+    python generate_accounts.py --users 1000000 --offset 0 --output-dir shards/
+    python generate_accounts.py --users 1000000 --database bank --user evanmeeks --password 1234
 
-last_names = last_names_df.iloc[:, 0].tolist()
+Rows are sampled with NumPy a whole shard at a time and shards are generated in parallel processes. Each
+shard is seeded from (--seed, --offset, shard number), so the output is identical whatever --processes is.
+Account numbers, SSNs, emails and phone numbers are unique by construction: each is derived from the user's
+global row number (--offset plus the row's position in the run) through a bijection, so no uniqueness check
+or retry is ever needed.
 
-for index, row in first_names.iterrows():
+Runs must not reuse row numbers. When loading a database the offset is read from it: generation starts above
+the highest account number in checking_accounts and above every number the AccountNumberAllocator's
+sequence has issued, and the sequence is moved past the generated range so the allocator never issues one
+of its numbers later. CSV output has no database to ask, so --offset is required; give each run the row
+after the last one of the previous run (--offset plus --users).
+"""
+import argparse
+import csv
+import datetime
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import psycopg2
+from account_numbers import FIRST_ACCOUNT_NUMBER, MAX_ACCOUNT_NUMBER, SEQUENCE_LOCK_QUERY
 
-    first_name = row['name']
-    last_name = str(random.choice(last_names)).title()
-    full_name = first_name + " " + last_name
-    gender = row['sex']
-    social = random.randint(111111111, 999999999)
-    birthday = f"{random.randint(1, 12)}/{random.randint(1, 28)}/{random.randint(1923,2005)}"
+TABLE_COLUMNS = {
+    "users": ["user_id", "first_name", "last_name", "gender", "date_of_birth", "phone_number", "phone_type", "ssn",
+              "email", "street_number", "street_name", "city", "state", "zip_code"],
+    "checking_accounts": ["checking_id", "account_number", "account_status", "overdraft_limit", "last_transaction",
+                          "user_id"],
+    "checking_details": ["user_id", "checking_account_id", "account_number", "transaction_amount", "transaction_type",
+                         "transaction_date", "account_balance"],
+    "checking_balances": ["checking_account_id", "account_balance", "last_transaction"],
+}
 
-    if gender == 'boy':
-        gender = 'Male'
+# SSNs are 111-11-1111 through 999-99-9999, as in the original generator; row n maps to
+# SSN_FIRST + (n * SSN_STRIDE) % SSN_SPACE, a bijection because the stride is coprime to the space
+SSN_FIRST = 111111111
+SSN_SPACE = 999999999 - SSN_FIRST + 1
+SSN_STRIDE = 472882049
 
-    else:
-        gender = 'Female'
-    User(full_name, social, birthday, gender)
\ No newline at end of file
+# Ten-digit phone numbers with a leading digit of 2-9, spread the same way
+PHONE_FIRST = 2000000000
+PHONE_SPACE = 8000000000
+PHONE_STRIDE = 5915587277
+
+MAX_USERS = min(SSN_SPACE, MAX_ACCOUNT_NUMBER - FIRST_ACCOUNT_NUMBER + 1)
+
+# State of the AccountNumberAllocator's sequence; last_value is NULL until its first nextval()
+SEQUENCE_STATE_QUERY = "SELECT last_value, increment_by, max_value FROM pg_sequences WHERE sequencename = %s;"
+# A sequence created for check-digit numbers stores the number without its digit, so it stops a digit short
+CHECK_DIGIT_MAX_VALUE = (MAX_ACCOUNT_NUMBER - 9) // 10
+
+DEFAULT_FIRST_NAMES = [
+    ("James", "Male"), ("John", "Male"), ("Robert", "Male"), ("Michael", "Male"), ("William", "Male"),
+    ("David", "Male"), ("Richard", "Male"), ("Joseph", "Male"), ("Thomas", "Male"), ("Charles", "Male"),
+    ("Daniel", "Male"), ("Matthew", "Male"), ("Anthony", "Male"), ("Mark", "Male"), ("Steven", "Male"),
+    ("Mary", "Female"), ("Patricia", "Female"), ("Jennifer", "Female"), ("Linda", "Female"),
+    ("Elizabeth", "Female"), ("Barbara", "Female"), ("Susan", "Female"), ("Jessica", "Female"),
+    ("Sarah", "Female"), ("Karen", "Female"), ("Lisa", "Female"), ("Nancy", "Female"), ("Betty", "Female"),
+    ("Margaret", "Female"), ("Sandra", "Female"),
+]
+DEFAULT_LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson",
+]
+STREET_NAMES = ["Main St", "Oak Ave", "Maple Dr", "Cedar Ln", "Pine St", "Elm St", "Washington Ave", "Lake Rd",
+                "Hill St", "Park Ave", "Sunset Blvd", "River Rd", "Church St", "Highland Ave", "Mill Rd"]
+CITIES = [("Springfield", "IL", 62701), ("Columbus", "OH", 43004), ("Austin", "TX", 73301),
+          ("Denver", "CO", 80014), ("Portland", "OR", 97035), ("Nashville", "TN", 37011),
+          ("Madison", "WI", 53701), ("Raleigh", "NC", 27513), ("Phoenix", "AZ", 85001),
+          ("Richmond", "VA", 23173), ("Boise", "ID", 83701), ("Tampa", "FL", 33601)]
+EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "icloud.com", "aol.com"]
+PHONE_TYPES = ["Cell", "Home", "Work"]
+OVERDRAFT_LIMITS = ["", "100", "250", "500"]
+
+
+def load_first_names(path):
+    """
+    Read first names from a baby-names CSV with 'name' and 'sex' ('boy'/'girl') columns.
+    """
+    with open(os.path.expanduser(path), newline="") as f:
+        return [(row["name"].replace(",", ""), "Male" if row["sex"] == "boy" else "Female")
+                for row in csv.DictReader(f)]
+
+
+def load_last_names(path):
+    """
+    Read surnames from the first column of a CSV with a header row.
+    """
+    with open(os.path.expanduser(path), newline="") as f:
+        rows = csv.reader(f)
+        next(rows)
+        return [str(row[0]).replace(",", "").title() for row in rows if row]
+
+
+def uuids(rng, count):
+    """
+    Build count random version 4 UUIDs, as bytes strings, without a Python-level loop.
+    """
+    raw = rng.integers(0, 256, size=(count, 16), dtype=np.uint8)
+    raw[:, 6] = raw[:, 6] & 0x0F | 0x40
+    raw[:, 8] = raw[:, 8] & 0x3F | 0x80
+    hex_digits = np.frombuffer(raw.tobytes().hex().encode(), dtype="S1").reshape(count, 32)
+    dashed = np.full((count, 36), b"-", dtype="S1")
+    dashed[:, [i for i in range(36) if i not in (8, 13, 18, 23)]] = hex_digits
+    return dashed.view("S36").ravel()
+
+
+def encoded(values):
+    """
+    Convert numbers or str values to a bytes string array; bytes take a quarter of the memory of str arrays.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "U":
+        return np.char.encode(values, "utf-8")
+    return values.astype("S")
+
+
+def zero_padded(values, width):
+    return np.char.zfill(encoded(values), width)
+
+
+def concat(*parts):
+    result = parts[0]
+    for part in parts[1:]:
+        result = np.char.add(result, part)
+    return result
+
+
+def csv_text(columns):
+    """
+    Join equally long bytes string arrays into CSV text, one row per line. Values must not contain commas or
+    quotes. The joins run in C, so there is no per-row Python code.
+    """
+    if len(columns[0]) == 0:
+        return b""
+    return b"\n".join(map(b",".join, zip(*[column.tolist() for column in columns]))) + b"\n"
+
+
+def reserve_rows(connection, users, sequence_name="checking_account_number_seq"):
+    """
+    Find the first row number no earlier load or allocated account has used, and reserve users rows from it.
+
+    Row n gets account number FIRST_ACCOUNT_NUMBER + n, so the offset starts above the highest account number
+    in checking_accounts and above the last block the allocator's sequence has handed out. If the sequence
+    exists it is then moved past the reserved range. A sequence that does not exist yet is created by the
+    allocator on first use above the highest account number, which covers the loaded rows.
+
+    Args:
+        connection (connection): Connection to the database being loaded. Committed before returning.
+        users (int): Rows to reserve.
+        sequence_name (str, optional): The AccountNumberAllocator's sequence.
+                                       Defaults to "checking_account_number_seq".
+
+    Returns:
+        int: Global row number of the first reserved row.
+
+    Raises:
+        ValueError: Fewer than users row numbers are left.
+    """
+    cursor = connection.cursor()
+    # The allocator takes the same lock before it creates the sequence
+    cursor.execute(SEQUENCE_LOCK_QUERY, (sequence_name,))
+    cursor.execute("SELECT COALESCE(MAX(account_number), 0) FROM checking_accounts;")
+    highest = cursor.fetchone()[0]
+
+    cursor.execute(SEQUENCE_STATE_QUERY, (sequence_name,))
+    state = cursor.fetchone()
+    scale = 10 if state is not None and state[2] == CHECK_DIGIT_MAX_VALUE else 1
+    if state is not None and state[0] is not None:
+        # Every number of the last reserved block may be issued, check digits included
+        highest = max(highest, (state[0] + state[1]) * scale - 1)
+
+    offset = max(highest + 1, FIRST_ACCOUNT_NUMBER) - FIRST_ACCOUNT_NUMBER
+    if offset + users > MAX_USERS:
+        connection.rollback()
+        raise ValueError(f"only {max(MAX_USERS - offset, 0)} rows are left after row {offset}")
+    if state is not None:
+        next_value = (FIRST_ACCOUNT_NUMBER + offset + users - 1) // scale + 1
+        if next_value > state[2]:
+            # Nothing is left for the allocator; its next reservation reports the sequence as exhausted
+            cursor.execute("SELECT setval(%s, %s, true);", (sequence_name, state[2]))
+        else:
+            cursor.execute("SELECT setval(%s, %s, false);", (sequence_name, next_value))
+    connection.commit()
+    cursor.close()
+    return offset
+
+
+def generate_shard(shard, options):
+    """
+    Generate every row for one shard of users.
+
+    Args:
+        shard (int): Shard number. Users offset + shard * shard_size onward belong to it.
+        options (dict): Generation settings built by main().
+
+    Returns:
+        dict: CSV bytes (without header) per table name.
+    """
+    # The offset is part of the seed so a second run does not repeat the first one's UUIDs
+    rng = np.random.default_rng([options["seed"], options["offset"], shard])
+    first = options["offset"] + shard * options["shard_size"]
+    count = min(options["shard_size"], options["users"] - shard * options["shard_size"])
+    row_numbers = np.arange(first, first + count, dtype=np.int64)
+
+    first_names = encoded([name for name, _ in options["first_names"]])
+    genders = encoded([gender for _, gender in options["first_names"]])
+    last_names = encoded(options["last_names"])
+
+    first_name_index = rng.integers(0, len(first_names), count)
+    user_first_names = first_names[first_name_index]
+    user_last_names = last_names[rng.integers(0, len(last_names), count)]
+
+    ssn = SSN_FIRST + row_numbers * SSN_STRIDE % SSN_SPACE
+    phone = PHONE_FIRST + row_numbers * PHONE_STRIDE % PHONE_SPACE
+    birth_dates = np.datetime64("1923-01-01") + rng.integers(0, 83 * 365, count).astype("timedelta64[D]")
+    city_index = rng.integers(0, len(CITIES), count)
+
+    user_ids = uuids(rng, count)
+    users = [
+        user_ids,
+        user_first_names,
+        user_last_names,
+        genders[first_name_index],
+        encoded(birth_dates),
+        concat(encoded(phone // 10 ** 7), b"-", zero_padded(phone // 10 ** 4 % 1000, 3), b"-",
+               zero_padded(phone % 10 ** 4, 4)),
+        encoded(PHONE_TYPES)[rng.integers(0, len(PHONE_TYPES), count)],
+        concat(encoded(ssn // 10 ** 6), b"-", zero_padded(ssn // 10 ** 4 % 100, 2), b"-",
+               zero_padded(ssn % 10 ** 4, 4)),
+        # The row number in the local part is what makes every email unique
+        concat(np.char.lower(user_first_names), b".", np.char.lower(user_last_names), encoded(row_numbers), b"@",
+               encoded(EMAIL_DOMAINS)[rng.integers(0, len(EMAIL_DOMAINS), count)]),
+        encoded(rng.integers(1, 9999, count)),
+        encoded(STREET_NAMES)[rng.integers(0, len(STREET_NAMES), count)],
+        encoded([city for city, _, _ in CITIES])[city_index],
+        encoded([state for _, state, _ in CITIES])[city_index],
+        zero_padded(np.array([zip_code for _, _, zip_code in CITIES])[city_index] + rng.integers(0, 50, count), 5),
+    ]
+
+    # One checking account per user, numbered by row so numbers never collide across shards or runs
+    account_ids = uuids(rng, count)
+    account_numbers = encoded(FIRST_ACCOUNT_NUMBER + row_numbers)
+
+    # Transactions: a Poisson count per account, dates sorted within each account so running balances
+    # follow posting order
+    per_account = rng.poisson(options["transactions_per_account"], count)
+    total = int(per_account.sum())
+    owner = np.repeat(np.arange(count), per_account)
+    days = rng.integers(0, options["history_days"], total)
+    order = np.lexsort((days, owner))
+    owner, days = owner[order], days[order]
+
+    withdrawals = rng.random(total) < 0.6
+    amounts = np.where(withdrawals, -rng.integers(5, 800, total), rng.integers(100, 5000, total))
+    running = np.cumsum(amounts)
+    ends = np.cumsum(per_account)
+    before_account = np.concatenate([[0], running])[ends - per_account]
+    balances = running - np.repeat(before_account, per_account)
+    dates = np.datetime64(options["end_date"]) - np.int64(options["history_days"] - 1) + days.astype("timedelta64[D]")
+
+    final_balances = np.zeros(count, dtype=np.int64)
+    last_transaction = np.full(count, b"", dtype="S10")
+    has_transactions = per_account > 0
+    final_balances[has_transactions] = balances[ends[has_transactions] - 1]
+    last_transaction[has_transactions] = encoded(dates[ends[has_transactions] - 1])
+
+    accounts = [
+        account_ids,
+        account_numbers,
+        np.full(count, b"Active"),
+        encoded(OVERDRAFT_LIMITS)[rng.integers(0, len(OVERDRAFT_LIMITS), count)],
+        last_transaction,
+        user_ids,
+    ]
+    details = [
+        user_ids[owner],
+        account_ids[owner],
+        account_numbers[owner],
+        encoded(amounts),
+        np.where(withdrawals, b"Withdraw", b"Deposit"),
+        encoded(dates),
+        encoded(balances),
+    ]
+    checking_balances = [account_ids, encoded(final_balances), last_transaction]
+
+    return {
+        "users": csv_text(users),
+        "checking_accounts": csv_text(accounts),
+        "checking_details": csv_text(details),
+        "checking_balances": csv_text(checking_balances),
+    }
+
+
+def run_shard(shard, options):
+    """
+    Generate one shard and write it to CSV files or COPY it into the database.
+
+    Returns:
+        dict: Row count per table.
+    """
+    tables = generate_shard(shard, options)
+    counts = {table_name: text.count(b"\n") for table_name, text in tables.items()}
+
+    if options["output_dir"]:
+        for table_name, text in tables.items():
+            path = os.path.join(options["output_dir"], f"{table_name}_{shard:05d}.csv")
+            with open(path, "wb") as f:
+                f.write(",".join(TABLE_COLUMNS[table_name]).encode() + b"\n")
+                f.write(text)
+        return counts
+
+    # Tables are copied in foreign key order; the shard is self-contained, so it commits on its own
+    connection = psycopg2.connect(**options["connection"])
+    try:
+        cursor = connection.cursor()
+        for table_name, text in tables.items():
+            cursor.copy_expert(f"COPY {table_name} ({', '.join(TABLE_COLUMNS[table_name])}) FROM STDIN "
+                               f"WITH (FORMAT csv)", io.BytesIO(text))
+        connection.commit()
+        cursor.close()
+    finally:
+        connection.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic banking data for load testing.")
+    parser.add_argument("--users", type=int, required=True, help="Number of users (one checking account each).")
+    parser.add_argument("--transactions-per-account", type=float, default=12.0,
+                        help="Mean checking_details rows per account. Defaults to 12.")
+    parser.add_argument("--history-days", type=int, default=365,
+                        help="Transactions are spread over this many days. Defaults to 365.")
+    parser.add_argument("--end-date", default=datetime.date.today().isoformat(),
+                        help="Date of the newest transactions (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--offset", type=int,
+                        help="Global row number of the first user; runs must not overlap. Required with "
+                             "--output-dir. Defaults to the first free row in the database when loading one.")
+    parser.add_argument("--sequence", default="checking_account_number_seq",
+                        help="The account number allocator's sequence, moved past the loaded accounts. "
+                             "Defaults to checking_account_number_seq.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed. Defaults to 0.")
+    parser.add_argument("--shard-size", type=int, default=50000,
+                        help="Users per shard; memory use grows with it. Defaults to 50000.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(),
+                        help="Worker processes. Defaults to the number of CPUs.")
+    parser.add_argument("--first-names", help="Baby names CSV with 'name' and 'sex' columns.")
+    parser.add_argument("--last-names", help="Surnames CSV; the first column is used.")
+    parser.add_argument("--output-dir", help="Write CSV shards here instead of loading a database.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", default="5432")
+    parser.add_argument("--database")
+    parser.add_argument("--user")
+    parser.add_argument("--password")
+    args = parser.parse_args()
+
+    if not 0 < args.users <= MAX_USERS:
+        parser.error(f"--users must be between 1 and {MAX_USERS}")
+    if not args.output_dir and not args.database:
+        parser.error("pass --output-dir or --database")
+    if args.output_dir and args.offset is None:
+        parser.error("--output-dir needs --offset: the row after the last one of any earlier run, or 0")
+    if args.offset is not None and args.offset < 0:
+        parser.error("--offset must not be negative")
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    connection_settings = {"host": args.host, "port": args.port, "database": args.database, "user": args.user,
+                           "password": args.password}
+    offset = args.offset
+    if offset is None:
+        connection = psycopg2.connect(**connection_settings)
+        try:
+            offset = reserve_rows(connection, args.users, args.sequence)
+        except ValueError as e:
+            parser.error(str(e))
+        finally:
+            connection.close()
+        print(f"Starting at row {offset} (account number {FIRST_ACCOUNT_NUMBER + offset})")
+    if offset + args.users > MAX_USERS:
+        parser.error(f"--offset plus --users must not exceed {MAX_USERS}")
+
+    options = {
+        "users": args.users,
+        "offset": offset,
+        "transactions_per_account": args.transactions_per_account,
+        "history_days": args.history_days,
+        "end_date": args.end_date,
+        "seed": args.seed,
+        "shard_size": args.shard_size,
+        "first_names": load_first_names(args.first_names) if args.first_names else DEFAULT_FIRST_NAMES,
+        "last_names": load_last_names(args.last_names) if args.last_names else DEFAULT_LAST_NAMES,
+        "output_dir": args.output_dir,
+        "connection": connection_settings,
+    }
+
+    started = time.perf_counter()
+    totals = dict.fromkeys(TABLE_COLUMNS, 0)
+    shards = range(-(-args.users // args.shard_size))
+    with ProcessPoolExecutor(max_workers=args.processes) as executor:
+        futures = [executor.submit(run_shard, shard, options) for shard in shards]
+        for done, future in enumerate(as_completed(futures), start=1):
+            for table_name, count in future.result().items():
+                totals[table_name] += count
+            print(f"Shard {done}/{len(futures)} done ({totals['users']} users so far)")
+
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    print(", ".join(f"{count} {table_name}" for table_name, count in totals.items()))
+    print(f"{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/sec)")
+
+
+if __name__ == "__main__":
+    main()
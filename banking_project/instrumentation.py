@@ -0,0 +1,281 @@
+import functools
+import logging
+import re
+import threading
+import time
+from collections import deque
+from psycopg2 import extensions
+
+slow_query_log = logging.getLogger("banking_project.slow_queries")
+
+# Statements recorded once max_statements distinct keys exist are aggregated under this key
+OVERFLOW_STATEMENT = "(other statements)"
+
+STRING_LITERAL = re.compile(r"(?:\b[EeBbXxUu]&?)?'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.])")
+PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+VALUES_LIST = re.compile(r"\bVALUES\s*(\((?:[^()]|\([^()]*\))*\))(?:\s*,\s*\((?:[^()]|\([^()]*\))*\))+",
+                         re.IGNORECASE)
+# A named cursor's query reaches the server as DECLARE "name" CURSOR ... FOR <query>; EXPLAIN needs the query
+DECLARE_CURSOR = re.compile(r'^\s*DECLARE\s+(?:"(?:[^"]|"")*"|\w+)\s+(?:BINARY\s+)?(?:(?:ASENSITIVE|INSENSITIVE)\s+)?'
+                            r'(?:(?:NO\s+)?SCROLL\s+)?CURSOR\s+(?:(?:WITH|WITHOUT)\s+HOLD\s+)?FOR\s+', re.IGNORECASE)
+
+
+class LatencyHistogram:
+    # Geometric bucket bounds from 50 microseconds to ~2 minutes, ~10% apart; memory stays constant
+    BOUNDS = [0.00005 * 1.1 ** i for i in range(155)]
+
+    def __init__(self):
+        """
+        Fixed-size latency histogram. Percentiles are reported as the upper bound of the bucket they fall
+        in, so they are accurate to within one bucket (about 10%).
+        """
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        low, high = 0, len(self.BOUNDS)
+        while low < high:
+            middle = (low + high) // 2
+            if self.BOUNDS[middle] < seconds:
+                low = middle + 1
+            else:
+                high = middle
+        self.counts[low] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        target = self.count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return min(self.BOUNDS[index], self.max) if index < len(self.BOUNDS) else self.max
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Instrumentation:
+    def __init__(self, slow_query_threshold=0.5, explain_slow_queries=False, slow_query_history=100,
+                 max_statements=1000):
+        """
+        Collect latency and row-count statistics for postgres methods, SQL statements and pool checkouts.
+
+        Args:
+            slow_query_threshold (float, optional): Statements slower than this many seconds are logged to
+                                                    the 'banking_project.slow_queries' logger. Defaults to 0.5.
+            explain_slow_queries (bool, optional): Capture EXPLAIN (ANALYZE, BUFFERS) for slow SELECT
+                                                   statements, including the SELECT a server-side cursor
+                                                   (stream_query) is declared for. This runs the query a
+                                                   second time. Defaults to False.
+            slow_query_history (int, optional): Number of recent slow queries kept for stats().
+                                                Defaults to 100.
+            max_statements (int, optional): Distinct statement keys tracked. Further statements are
+                                            aggregated under OVERFLOW_STATEMENT, so memory stays bounded.
+                                            Defaults to 1000.
+        """
+        self.slow_query_threshold = slow_query_threshold
+        self.explain_slow_queries = explain_slow_queries
+        self.slow_queries = deque(maxlen=slow_query_history)
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._statements = {}
+        self._rows = {}
+        self._connection_wait = LatencyHistogram()
+
+    def record_method(self, name, seconds):
+        with self._lock:
+            self._methods.setdefault(name, LatencyHistogram()).record(seconds)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self._connection_wait.record(seconds)
+
+    def record_statement(self, cursor, query, seconds, bound_query=None):
+        statement = normalize_statement(query)
+        rows = cursor.rowcount if cursor.rowcount > 0 else 0
+        with self._lock:
+            key = statement
+            if key not in self._statements and len(self._statements) >= self.max_statements:
+                key = OVERFLOW_STATEMENT
+            self._statements.setdefault(key, LatencyHistogram()).record(seconds)
+            self._rows[key] = self._rows.get(key, 0) + rows
+
+        if seconds >= self.slow_query_threshold:
+            self._log_slow_query(cursor, bound_query or query, statement, seconds, rows)
+
+    def stats(self):
+        """
+        Return a snapshot of everything recorded so far.
+
+        Returns:
+            dict: 'methods' and 'statements' map names to latency summaries (count, mean, p50, p90, p99,
+                  max in seconds; statements also include total rows), 'connection_wait' summarizes pool
+                  checkout waits and 'slow_queries' lists the most recent slow statements.
+        """
+        with self._lock:
+            statements = {}
+            for statement, histogram in self._statements.items():
+                statements[statement] = dict(histogram.summary(), rows=self._rows.get(statement, 0))
+            return {
+                "methods": {name: histogram.summary() for name, histogram in self._methods.items()},
+                "statements": statements,
+                "connection_wait": self._connection_wait.summary(),
+                "slow_queries": list(self.slow_queries),
+            }
+
+    def reset(self):
+        """
+        Discard every recorded measurement.
+        """
+        with self._lock:
+            self._methods.clear()
+            self._statements.clear()
+            self._rows.clear()
+            self._connection_wait = LatencyHistogram()
+            self.slow_queries.clear()
+
+    def _log_slow_query(self, cursor, query, statement, seconds, rows):
+        entry = {"statement": statement, "seconds": seconds, "rows": rows, "plan": None}
+        if self.explain_slow_queries and DECLARE_CURSOR.sub("", statement, count=1).upper().startswith("SELECT"):
+            entry["plan"] = explain(cursor, query)
+
+        with self._lock:
+            self.slow_queries.append(entry)
+        slow_query_log.warning("Slow query (%.3fs, %d rows): %s%s", seconds, rows, statement,
+                               f"\n{entry['plan']}" if entry["plan"] else "")
+
+
+def normalize_statement(query):
+    """
+    Collapse a statement to a stable, bounded key for aggregation.
+
+    String and numeric literals become ?, lists of them become "?, ..." and multi-row VALUES lists keep
+    only their first row, so statements that differ only in inlined values (execute_values, mogrified
+    COPY, ad-hoc query() SQL) share one key.
+    """
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    query = STRING_LITERAL.sub("?", str(query))
+    query = NUMBER_LITERAL.sub("?", query)
+    query = PLACEHOLDER_LIST.sub("?, ...", query)
+    query = VALUES_LIST.sub(r"VALUES \1, ...", query)
+    return re.sub(r"\s+", " ", query).strip()[:300]
+
+
+def explain(cursor, query):
+    """
+    Run EXPLAIN (ANALYZE, BUFFERS) for an already executed query, inside a savepoint so a failure cannot
+    abort the caller's transaction. A DECLARE ... CURSOR statement is explained as the query it declares.
+    Returns None if the plan could not be captured.
+    """
+    connection = cursor.connection
+    if connection.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+        return None
+    if isinstance(query, bytes):
+        query = query.decode()
+    query = DECLARE_CURSOR.sub("", query, count=1)
+
+    plan_cursor = connection.cursor(cursor_factory=extensions.cursor)
+    in_transaction = connection.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+    try:
+        if in_transaction:
+            plan_cursor.execute("SAVEPOINT explain_slow_query;")
+        plan_cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {query}")
+        plan = "\n".join(row[0] for row in plan_cursor.fetchall())
+        if in_transaction:
+            plan_cursor.execute("RELEASE SAVEPOINT explain_slow_query;")
+        return plan
+    except Exception:
+        if in_transaction:
+            plan_cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query;")
+        return None
+    finally:
+        plan_cursor.close()
+
+
+class InstrumentedCursor(extensions.cursor):
+    """
+    A psycopg2 cursor that reports the latency and row count of every statement it runs.
+    """
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, time.perf_counter() - started, self.query)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record(sql, time.perf_counter() - started)
+
+    def _record(self, query, seconds, bound_query=None):
+        # Statements are keyed on their text before parameters are bound, so repeated calls aggregate
+        instrumentation = getattr(self.connection, "instrumentation", None)
+        if instrumentation is not None:
+            instrumentation.record_statement(self, query, seconds, bound_query)
+
+
+def connection_factory(instrumentation):
+    """
+    Build a psycopg2 connection class whose cursors report to the given Instrumentation.
+
+    Args:
+        instrumentation (Instrumentation): Where statement timings are recorded.
+
+    Returns:
+        type: A connection class to pass as psycopg2.connect(connection_factory=...).
+    """
+
+    class InstrumentedConnection(extensions.connection):
+        def cursor(self, *args, **kwargs):
+            kwargs.setdefault("cursor_factory", InstrumentedCursor)
+            return super().cursor(*args, **kwargs)
+
+    InstrumentedConnection.instrumentation = instrumentation
+    return InstrumentedConnection
+
+
+def timed(method):
+    """
+    Decorator for postgres methods: records the call's latency when the instance has instrumentation on.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.instrumentation is None:
+            return method(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.instrumentation.record_method(method.__name__, time.perf_counter() - started)
+
+    return wrapper
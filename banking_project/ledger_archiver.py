@@ -0,0 +1,210 @@
+import datetime
+import re
+import time
+import psycopg2
+from psycopg2 import errors
+from migrations import next_month
+
+ARCHIVE_CHECKPOINT = "checking_details_archive"
+FIRST_KEY = "0001-01-01|00000000-0000-0000-0000-000000000000"
+
+LEDGER_COLUMNS = "checking_details_id, user_id, checking_account_id, account_number, transaction_amount, " \
+                 "transaction_type, transaction_date, account_balance, memo"
+MONTHLY_PARTITION = re.compile(r"^checking_details_y(\d{4})m(\d{2})$")
+
+
+class LedgerArchiver:
+    def __init__(self, db, retention_days=730, chunk_size=5000, pause=0.5, lock_timeout=2.0,
+                 drop_empty_partitions=True):
+        """
+        Move 'checking_details' rows older than a retention window into 'checking_details_archive'.
+
+        Rows are moved oldest first in small chunks; each chunk deletes its rows from the ledger and inserts
+        them into the archive in one short transaction, so a row is always in exactly one of the two tables
+        and postgres.get_statement() reads both. Rows that another transaction has locked are skipped
+        rather than waited for. After each chunk the last (transaction_date, checking_details_id) moved is
+        checkpointed in 'migration_checkpoints', so an interrupted run resumes where it stopped instead of
+        rescanning the rows it already removed. The checkpoint is cleared once a run reaches the cutoff,
+        and the next run starts from the oldest row again.
+
+        Needs migration 10 (the archive table and a (transaction_date, checking_details_id) ledger index).
+
+        Args:
+            db (postgres): A connected postgres instance.
+            retention_days (int, optional): Days of history kept in the ledger. Defaults to 730.
+            chunk_size (int, optional): Rows moved per transaction. Defaults to 5000.
+            pause (float, optional): Seconds to sleep between chunks. Defaults to 0.5.
+            lock_timeout (float, optional): Seconds a chunk may wait for a lock before it gives up.
+                                            Defaults to 2.
+            drop_empty_partitions (bool, optional): When the ledger is partitioned, drop monthly partitions
+                                                    that lie wholly before the cutoff once they are empty.
+                                                    Defaults to True.
+        """
+        self.db = db
+        self.retention_days = retention_days
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.lock_timeout = lock_timeout
+        self.drop_empty_partitions = drop_empty_partitions
+
+    def cutoff(self):
+        """
+        Return the first transaction_date kept in the ledger.
+        """
+        return datetime.date.today() - datetime.timedelta(days=self.retention_days)
+
+    def run(self, max_chunks=None, max_seconds=None):
+        """
+        Archive rows older than the cutoff, resuming from the checkpoint.
+
+        Args:
+            max_chunks (int, optional): Stop after this many chunks. Defaults to None (no limit).
+            max_seconds (float, optional): Stop starting new chunks after this many seconds, e.g. to fit a
+                                           maintenance window. Defaults to None (no limit).
+
+        Returns:
+            int: Rows moved by this run, or None if the run failed.
+        """
+        cutoff = self.cutoff()
+        started = time.monotonic()
+        moved = 0
+        chunks = 0
+        try:
+            with self.db._checkout() as connection:
+                cursor = connection.cursor()
+                last_key, rows_archived = self._load_checkpoint(cursor)
+                connection.commit()
+
+                while True:
+                    if max_chunks is not None and chunks >= max_chunks:
+                        break
+                    if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                        break
+
+                    chunk_last_key, chunk_rows = self._move_chunk(cursor, cutoff, last_key)
+                    chunks += 1
+                    if not chunk_rows:
+                        # Reached the cutoff: start from the oldest row next time
+                        cursor.execute("DELETE FROM migration_checkpoints WHERE name = %s;", (ARCHIVE_CHECKPOINT,))
+                        connection.commit()
+                        if self.drop_empty_partitions:
+                            self._drop_empty_partitions(cursor, cutoff)
+                        break
+
+                    last_key, rows_archived = chunk_last_key, rows_archived + chunk_rows
+                    moved += chunk_rows
+                    self._save_checkpoint(cursor, last_key, rows_archived)
+                    connection.commit()
+                    self.db._note_write()
+                    print(f"Archived {moved} rows (through {last_key.split('|')[0]})...")
+
+                    if self.pause:
+                        time.sleep(self.pause)
+
+                cursor.close()
+            print(f"Archived {moved} checking_details rows older than {cutoff}.")
+            return moved
+        except psycopg2.Error as e:
+            print(f"Error archiving checking_details: {e}")
+
+    def status(self):
+        """
+        Return archival progress.
+
+        Returns:
+            dict: 'cutoff', the checkpointed 'last_date' (None when no run is in progress), 'rows_archived'
+                  by the run in progress and 'pending' rows older than the cutoff still in the ledger.
+        """
+        with self.db._checkout() as connection:
+            cursor = connection.cursor()
+            last_key, rows_archived = self._load_checkpoint(cursor)
+            cursor.execute("SELECT COUNT(*) FROM checking_details WHERE transaction_date < %s;", (self.cutoff(),))
+            pending = cursor.fetchone()[0]
+            connection.commit()
+            cursor.close()
+
+        last_date = last_key.split("|")[0]
+        return {"cutoff": self.cutoff(), "last_date": None if last_key == FIRST_KEY else last_date,
+                "rows_archived": rows_archived, "pending": pending}
+
+    def _move_chunk(self, cursor, cutoff, last_key):
+        last_date, last_id = last_key.split("|")
+        cursor.execute("SET LOCAL lock_timeout = %s;", (f"{int(self.lock_timeout * 1000)}ms",))
+        cursor.execute(f"""
+            WITH chunk AS (
+                SELECT checking_details_id, transaction_date FROM checking_details
+                WHERE transaction_date < %(cutoff)s
+                  AND (transaction_date, checking_details_id) > (%(last_date)s::date, %(last_id)s::uuid)
+                ORDER BY transaction_date, checking_details_id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            ),
+            moved AS (
+                DELETE FROM checking_details d USING chunk c
+                WHERE d.checking_details_id = c.checking_details_id AND d.transaction_date = c.transaction_date
+                RETURNING d.*
+            ),
+            archived AS (
+                INSERT INTO checking_details_archive ({LEDGER_COLUMNS})
+                SELECT {LEDGER_COLUMNS} FROM moved
+                ON CONFLICT (checking_details_id) DO NOTHING
+            )
+            SELECT transaction_date, checking_details_id, (SELECT COUNT(*) FROM moved)
+            FROM chunk
+            ORDER BY transaction_date DESC, checking_details_id DESC
+            LIMIT 1;
+        """, {"cutoff": cutoff, "last_date": last_date, "last_id": last_id, "limit": self.chunk_size})
+        row = cursor.fetchone()
+        if row is None:
+            return last_key, 0
+        return f"{row[0]}|{row[1]}", row[2]
+
+    def _drop_empty_partitions(self, cursor, cutoff):
+        connection = cursor.connection
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'checking_details'::regclass;")
+        if cursor.fetchone()[0] != "p":
+            connection.commit()
+            return
+
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'checking_details'::regclass;
+        """)
+        partitions = [row[0] for row in cursor.fetchall()]
+        connection.commit()
+
+        for partition_name in sorted(partitions):
+            match = MONTHLY_PARTITION.match(partition_name)
+            if match is None:
+                continue
+            month = datetime.date(int(match.group(1)), int(match.group(2)), 1)
+            if next_month(month) > cutoff:
+                continue
+
+            # Dropping a partition briefly locks the parent; give up rather than queue behind readers
+            try:
+                cursor.execute("SET LOCAL lock_timeout = %s;", (f"{int(self.lock_timeout * 1000)}ms",))
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {partition_name});")
+                if not cursor.fetchone()[0]:
+                    cursor.execute(f"DROP TABLE {partition_name};")
+                    print(f"Dropped empty partition {partition_name}.")
+                connection.commit()
+            except errors.LockNotAvailable:
+                connection.rollback()
+                print(f"Skipped partition {partition_name}: it is in use. It will be retried on the next run.")
+
+    @staticmethod
+    def _load_checkpoint(cursor):
+        cursor.execute("SELECT last_key, rows_copied FROM migration_checkpoints WHERE name = %s;",
+                       (ARCHIVE_CHECKPOINT,))
+        row = cursor.fetchone()
+        return row if row is not None else (FIRST_KEY, 0)
+
+    @staticmethod
+    def _save_checkpoint(cursor, last_key, rows_archived):
+        cursor.execute("""
+            INSERT INTO migration_checkpoints (name, last_key, rows_copied) VALUES (%s, %s, %s)
+            ON CONFLICT (name) DO UPDATE SET last_key = EXCLUDED.last_key, rows_copied = EXCLUDED.rows_copied,
+                                             updated_at = CURRENT_TIMESTAMP;
+        """, (ARCHIVE_CHECKPOINT, last_key, rows_archived))
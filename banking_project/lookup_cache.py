@@ -0,0 +1,201 @@
+import json
+import select
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+
+# Channel the migrations' row triggers notify when a users or checking_accounts row changes
+CACHE_CHANNEL = "banking_lookup_cache"
+
+MISSING = object()
+
+
+class LookupCache:
+    def __init__(self, max_entries=10000, ttl=60.0):
+        """
+        A thread-safe LRU cache with a time-to-live, for user and account rows.
+
+        Entries carry tags such as ("user", user_id) so one change can drop every entry derived from the
+        same row, whichever key (email, ssn, ...) it was cached under.
+
+        Args:
+            max_entries (int, optional): Entries kept before the least recently used is evicted.
+                                         Defaults to 10000.
+            ttl (float, optional): Seconds an entry is served before it is read again from the database.
+                                   Bounds staleness if a change notification is ever missed. Defaults to 60.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+        self._version = 0
+
+    @property
+    def version(self):
+        """
+        Counter bumped by every invalidation. Pass the value read before a database lookup to put(), so a
+        row that changed while it was being read is not cached.
+        """
+        return self._version
+
+    def get(self, key):
+        """
+        Return the cached value for key, or MISSING.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return MISSING
+
+            value, expires_at, _ = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value, tags=(), version=None):
+        with self._lock:
+            if version is not None and version != self._version:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def invalidate(self, tag):
+        """
+        Drop every entry carrying tag.
+        """
+        with self._lock:
+            self._version += 1
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+                self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._invalidations += len(self._entries)
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Size, hits, misses, hit rate, LRU evictions, TTL expirations and invalidations.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class CacheListener:
+    def __init__(self, cache, retry_interval=5.0, **connect_kwargs):
+        """
+        Keep a LookupCache coherent with changes made by other processes, using LISTEN/NOTIFY.
+
+        A background thread holds its own connection listening on CACHE_CHANNEL. Each notification drops
+        the entries for the changed user or account. While the listener is not connected it cannot know
+        what changed, so the whole cache is cleared whenever it (re)connects.
+
+        Args:
+            cache (LookupCache): Cache to invalidate.
+            retry_interval (float, optional): Seconds between reconnect attempts. Defaults to 5.
+            **connect_kwargs: Keyword arguments passed to psycopg2.connect().
+        """
+        self.cache = cache
+        self.retry_interval = retry_interval
+        self.connect_kwargs = connect_kwargs
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._notifications = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="lookup-cache-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        return {"connected": self.connected.is_set(), "notifications": self._notifications}
+
+    def _run(self):
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(**self.connect_kwargs)
+                connection.autocommit = True
+                cursor = connection.cursor()
+                cursor.execute(f"LISTEN {CACHE_CHANNEL};")
+                cursor.close()
+                self.cache.clear()
+                self.connected.set()
+
+                while not self._stopped.is_set():
+                    if select.select([connection], [], [], 1.0)[0]:
+                        connection.poll()
+                        while connection.notifies:
+                            self._handle(connection.notifies.pop(0).payload)
+            except psycopg2.Error:
+                pass
+            finally:
+                self.connected.clear()
+                if connection is not None:
+                    connection.close()
+            # Changes may have been missed while disconnected
+            self.cache.clear()
+            self._stopped.wait(self.retry_interval)
+
+    def _handle(self, payload):
+        self._notifications += 1
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            self.cache.clear()
+            return
+        if change.get("checking_id"):
+            self.cache.invalidate(("account", change["checking_id"]))
+        if change.get("user_id"):
+            self.cache.invalidate(("user", change["user_id"]))
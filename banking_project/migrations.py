@@ -0,0 +1,512 @@
+import datetime
+import time
+import psycopg2
+from lookup_cache import CACHE_CHANNEL
+
+BACKFILL_CHECKPOINT = "checking_details_partition_backfill"
+
+
+class Migration:
+    def __init__(self, version, description, apply, transactional=True):
+        """
+        A single, versioned schema change.
+
+        Args:
+            version (int): Unique, increasing version number.
+            description (str): Short description recorded in 'schema_migrations'.
+            apply (str or callable): SQL to execute, or a function called with (runner, cursor).
+            transactional (bool, optional): Run inside a transaction. Set to False for statements such as
+                                            CREATE INDEX CONCURRENTLY that cannot. Defaults to True.
+        """
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.transactional = transactional
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return datetime.date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def create_monthly_partitions(cursor, table_name, first_month, last_month):
+    """
+    Create one range partition per month of transaction_date, skipping months that already exist.
+
+    Args:
+        cursor (cursor): Cursor to run the DDL on.
+        table_name (str): Partitioned parent table; partitions are named <table_name>_yYYYYmMM.
+        first_month (date): Any day in the first month to create.
+        last_month (date): Any day in the last month to create.
+    """
+    month = month_start(first_month)
+    while month <= last_month:
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table_name}_y{month.year}m{month.month:02d}
+            PARTITION OF {table_name} FOR VALUES FROM ('{month}') TO ('{next_month(month)}');
+        """)
+        month = next_month(month)
+
+
+def create_partitioned_ledger(runner, cursor):
+    cursor.execute("""
+        CREATE TABLE checking_details_partitioned (
+            LIKE checking_details INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+            PRIMARY KEY (checking_details_id, transaction_date),
+            FOREIGN KEY (user_id) REFERENCES users(user_id),
+            FOREIGN KEY (checking_account_id) REFERENCES checking_accounts(checking_id)
+        ) PARTITION BY RANGE (transaction_date);
+
+        CREATE INDEX checking_details_partitioned_account_date_idx
+            ON checking_details_partitioned (checking_account_id, transaction_date);
+        CREATE INDEX checking_details_partitioned_user_date_idx
+            ON checking_details_partitioned (user_id, transaction_date);
+        CREATE TABLE checking_details_partitioned_default PARTITION OF checking_details_partitioned DEFAULT;
+    """)
+
+    cursor.execute("SELECT MIN(transaction_date) FROM checking_details;")
+    first_month = cursor.fetchone()[0] or datetime.date.today()
+    create_monthly_partitions(cursor, "checking_details_partitioned", first_month,
+                              next_month(next_month(next_month(datetime.date.today()))))
+
+    # Mirror every write on the live table while the backfill runs, so the swap needs no catch-up pass
+    cursor.execute("""
+        CREATE FUNCTION checking_details_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM checking_details_partitioned WHERE checking_details_id = OLD.checking_details_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO checking_details_partitioned SELECT NEW.* ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+
+        CREATE TRIGGER checking_details_mirror
+            AFTER INSERT OR UPDATE OR DELETE ON checking_details
+            FOR EACH ROW EXECUTE FUNCTION checking_details_mirror();
+    """)
+
+
+def backfill_partitioned_ledger(runner, cursor):
+    runner.backfill(cursor.connection)
+
+
+def swap_partitioned_ledger(runner, cursor):
+    cursor.execute("""
+        LOCK TABLE checking_details IN ACCESS EXCLUSIVE MODE;
+        DROP TRIGGER checking_details_mirror ON checking_details;
+        DROP FUNCTION checking_details_mirror();
+        ALTER TABLE checking_details RENAME TO checking_details_legacy;
+        ALTER TABLE checking_details_partitioned RENAME TO checking_details;
+        ALTER TABLE checking_details_partitioned_default RENAME TO checking_details_default;
+    """)
+
+    # The legacy copy must not block deletes of users and accounts; drop_legacy_ledger() removes it
+    cursor.execute("""
+        SELECT conname FROM pg_constraint
+        WHERE conrelid = 'checking_details_legacy'::regclass AND contype = 'f';
+    """)
+    for (constraint_name,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE checking_details_legacy DROP CONSTRAINT "{constraint_name}";')
+
+    # Monthly partitions keep the name they were created with; rename them to match the new parent
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'checking_details'::regclass AND c.relname LIKE 'checking_details_partitioned_y%';
+    """)
+    for (partition_name,) in cursor.fetchall():
+        new_name = partition_name.replace("checking_details_partitioned_", "checking_details_")
+        cursor.execute(f"ALTER TABLE {partition_name} RENAME TO {new_name};")
+
+
+def create_index_concurrently(cursor, index_name, table_name, columns):
+    """
+    CREATE INDEX CONCURRENTLY, rebuilding an index of the same name left invalid by an earlier failed
+    attempt (IF NOT EXISTS alone would keep it). The cursor's connection must be in autocommit mode.
+    """
+    cursor.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s);", (index_name,))
+    row = cursor.fetchone()
+    if row is not None and not row[0]:
+        print(f"Rebuilding invalid index {index_name}...")
+        cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name};")
+    cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} ON {table_name} {columns};")
+
+
+def create_ledger_index(cursor, index_name, table_name, columns):
+    """
+    Build an index without blocking writes, on a plain or a range-partitioned table.
+
+    Partitioned tables cannot be indexed concurrently, so each partition's index is built concurrently
+    and attached to an index created on the parent alone, which becomes valid once every partition is
+    attached. The cursor's connection must be in autocommit mode.
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass;", (table_name,))
+    if cursor.fetchone()[0] != "p":
+        create_index_concurrently(cursor, index_name, table_name, columns)
+        return
+
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON ONLY {table_name} {columns};")
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass;
+    """, (table_name,))
+    suffix = index_name[len(table_name):] if index_name.startswith(table_name) else f"_{index_name}"
+    for (partition_name,) in cursor.fetchall():
+        create_index_concurrently(cursor, f"{partition_name}{suffix}", partition_name, columns)
+        cursor.execute(f"ALTER INDEX {index_name} ATTACH PARTITION {partition_name}{suffix};")
+
+
+def concurrent_index(index_name, table_name, columns):
+    """
+    Return a non-transactional migration function that builds one index with create_ledger_index().
+    """
+    def apply(runner, cursor):
+        cursor.connection.autocommit = True
+        create_ledger_index(cursor, index_name, table_name, columns)
+    return apply
+
+
+def index_ledger_keyset(runner, cursor):
+    # Statement pages seek this index to the row after the previous page
+    cursor.connection.autocommit = True
+    create_ledger_index(cursor, "checking_details_account_date_id_idx", "checking_details",
+                        "(checking_account_id, transaction_date, checking_details_id)")
+
+
+def create_ledger_archive(runner, cursor):
+    cursor.connection.autocommit = True
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS checking_details_archive (
+            checking_details_id UUID NOT NULL PRIMARY KEY,
+            user_id UUID,
+            checking_account_id UUID,
+            account_number INT NOT NULL,
+            transaction_amount INT,
+            transaction_type VARCHAR(8),
+            transaction_date DATE NOT NULL,
+            account_balance INT NOT NULL DEFAULT 0,
+            memo VARCHAR(150),
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS checking_details_archive_account_date_id_idx
+            ON checking_details_archive (checking_account_id, transaction_date, checking_details_id);
+        CREATE INDEX IF NOT EXISTS checking_details_archive_user_idx ON checking_details_archive (user_id);
+    """)
+    # The archiver walks the ledger oldest first
+    create_ledger_index(cursor, "checking_details_date_id_idx", "checking_details",
+                        "(transaction_date, checking_details_id)")
+
+
+MIGRATIONS = [
+    Migration(1, "Create checking_balances", """
+        CREATE TABLE IF NOT EXISTS checking_balances (
+            checking_account_id UUID NOT NULL PRIMARY KEY REFERENCES checking_accounts(checking_id),
+            account_balance INT NOT NULL DEFAULT 0,
+            last_transaction DATE,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    Migration(2, "Index checking_accounts by user",
+              concurrent_index("checking_accounts_user_idx", "checking_accounts", "(user_id)"),
+              transactional=False),
+    Migration(3, "Index checking_details by account and date",
+              concurrent_index("checking_details_account_date_idx", "checking_details",
+                               "(checking_account_id, transaction_date)"),
+              transactional=False),
+    Migration(4, "Index checking_details by user and date",
+              concurrent_index("checking_details_user_date_idx", "checking_details", "(user_id, transaction_date)"),
+              transactional=False),
+    Migration(5, "Create monthly partitioned checking_details", create_partitioned_ledger),
+    Migration(6, "Backfill partitioned checking_details", backfill_partitioned_ledger, transactional=False),
+    Migration(7, "Swap in partitioned checking_details", swap_partitioned_ledger),
+    Migration(8, "Notify lookup caches of user and account changes", f"""
+        CREATE OR REPLACE FUNCTION notify_lookup_cache() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'users' THEN
+                PERFORM pg_notify('{CACHE_CHANNEL}', json_build_object('user_id', OLD.user_id)::text);
+            ELSE
+                PERFORM pg_notify('{CACHE_CHANNEL}', json_build_object('checking_id', OLD.checking_id)::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$;
+
+        DROP TRIGGER IF EXISTS users_lookup_cache_update ON users;
+        DROP TRIGGER IF EXISTS users_lookup_cache_delete ON users;
+        DROP TRIGGER IF EXISTS checking_accounts_lookup_cache_update ON checking_accounts;
+        DROP TRIGGER IF EXISTS checking_accounts_lookup_cache_delete ON checking_accounts;
+
+        -- Updates that leave the row unchanged (e.g. last_transaction kept by GREATEST) stay silent
+        CREATE TRIGGER users_lookup_cache_update AFTER UPDATE ON users
+            FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION notify_lookup_cache();
+        CREATE TRIGGER users_lookup_cache_delete AFTER DELETE ON users
+            FOR EACH ROW EXECUTE FUNCTION notify_lookup_cache();
+        CREATE TRIGGER checking_accounts_lookup_cache_update AFTER UPDATE ON checking_accounts
+            FOR EACH ROW WHEN (OLD.* IS DISTINCT FROM NEW.*) EXECUTE FUNCTION notify_lookup_cache();
+        CREATE TRIGGER checking_accounts_lookup_cache_delete AFTER DELETE ON checking_accounts
+            FOR EACH ROW EXECUTE FUNCTION notify_lookup_cache();
+    """),
+    Migration(9, "Index checking_details for keyset statement pages", index_ledger_keyset, transactional=False),
+    Migration(10, "Create checking_details_archive", create_ledger_archive, transactional=False),
+]
+
+
+class MigrationRunner:
+    def __init__(self, db, migrations=None, chunk_size=10000, pause=0.0):
+        """
+        Apply versioned schema migrations through a connected postgres instance.
+
+        Applied versions are recorded in 'schema_migrations', so running again only applies what is
+        pending. The ledger backfill copies rows in chunks, committing and checkpointing after each one,
+        so it can be throttled, interrupted and resumed without holding long locks.
+
+        Args:
+            db (postgres): A connected postgres instance.
+            migrations (list, optional): Migrations to manage. Defaults to MIGRATIONS.
+            chunk_size (int, optional): Rows copied per backfill transaction. Defaults to 10000.
+            pause (float, optional): Seconds to sleep between backfill chunks. Defaults to 0.
+        """
+        self.db = db
+        self.migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m.version)
+        self.chunk_size = chunk_size
+        self.pause = pause
+
+    def applied_versions(self):
+        """
+        Return the set of migration versions already applied.
+        """
+        with self.db._checkout() as connection:
+            cursor = connection.cursor()
+            self._ensure_tables(cursor)
+            cursor.execute("SELECT version FROM schema_migrations;")
+            versions = {row[0] for row in cursor.fetchall()}
+            connection.commit()
+            cursor.close()
+            return versions
+
+    def pending(self):
+        """
+        Return the migrations that have not been applied yet, in version order.
+        """
+        applied = self.applied_versions()
+        return [migration for migration in self.migrations if migration.version not in applied]
+
+    def run(self, target=None):
+        """
+        Apply pending migrations in order, up to and including target.
+
+        Args:
+            target (int, optional): Highest version to apply. Defaults to None (apply everything).
+
+        Returns:
+            list: Versions applied by this run.
+        """
+        applied = []
+        try:
+            for migration in self.pending():
+                if target is not None and migration.version > target:
+                    break
+
+                print(f"Applying migration {migration.version}: {migration.description}...")
+                started = time.perf_counter()
+                self._apply(migration)
+                applied.append(migration.version)
+                print(f"Migration {migration.version} applied in {time.perf_counter() - started:.1f}s.")
+        except psycopg2.Error as e:
+            print(f"Error applying migration: {e}")
+        finally:
+            self.db.schema.invalidate()
+        return applied
+
+    def ensure_partitions(self, months_ahead=3):
+        """
+        Create monthly checking_details partitions through months_ahead months from now. Run periodically
+        so new months never land in the default partition.
+
+        Args:
+            months_ahead (int, optional): How many future months to keep partitions for. Defaults to 3.
+        """
+        last_month = datetime.date.today()
+        for _ in range(months_ahead):
+            last_month = next_month(last_month)
+
+        with self.db._checkout() as connection:
+            cursor = connection.cursor()
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'checking_details'::regclass;")
+            if cursor.fetchone()[0] != "p":
+                print("checking_details is not partitioned yet. Run the migrations first.")
+                connection.rollback()
+                return
+            create_monthly_partitions(cursor, "checking_details", datetime.date.today(), last_month)
+            connection.commit()
+            self.db._note_write()
+            cursor.close()
+        self.db.schema.invalidate()
+
+    def backfill(self, connection):
+        """
+        Copy checking_details into checking_details_partitioned in keyset-ordered chunks, resuming from the
+        last checkpoint. Rows already mirrored by the write trigger are left alone.
+
+        Each chunk locks its source rows FOR SHARE. A row updated or deleted while the chunk is read is
+        then either copied in its current version (or skipped if deleted) or left to the mirror trigger
+        once the chunk commits, so a stale version is never copied next to the trigger's.
+
+        Args:
+            connection (connection): Connection to copy through; one transaction is committed per chunk.
+        """
+        cursor = connection.cursor()
+        cursor.execute("SELECT last_key, rows_copied FROM migration_checkpoints WHERE name = %s;",
+                       (BACKFILL_CHECKPOINT,))
+        row = cursor.fetchone()
+        last_key, rows_copied = row if row is not None else ("00000000-0000-0000-0000-000000000000", 0)
+        connection.commit()
+
+        while True:
+            # The chunk's key range is fixed first, so rows deleted while it is locked cannot end the
+            # backfill early
+            cursor.execute("""
+                WITH bounds AS (
+                    SELECT (SELECT checking_details_id FROM (
+                                SELECT checking_details_id FROM checking_details
+                                WHERE checking_details_id > %(last_key)s
+                                ORDER BY checking_details_id
+                                LIMIT %(chunk_size)s
+                            ) keys ORDER BY checking_details_id DESC LIMIT 1) AS end_key
+                ),
+                chunk AS (
+                    SELECT d.* FROM checking_details d, bounds
+                    WHERE d.checking_details_id > %(last_key)s AND d.checking_details_id <= bounds.end_key
+                    FOR SHARE OF d
+                ),
+                copied AS (
+                    INSERT INTO checking_details_partitioned SELECT * FROM chunk ON CONFLICT DO NOTHING
+                )
+                SELECT end_key, (SELECT COUNT(*) FROM chunk) FROM bounds;
+            """, {"last_key": last_key, "chunk_size": self.chunk_size})
+            chunk_last_key, chunk_rows = cursor.fetchone()
+            if chunk_last_key is None:
+                connection.commit()
+                break
+
+            last_key, rows_copied = str(chunk_last_key), rows_copied + chunk_rows
+            cursor.execute("""
+                INSERT INTO migration_checkpoints (name, last_key, rows_copied) VALUES (%s, %s, %s)
+                ON CONFLICT (name) DO UPDATE SET last_key = EXCLUDED.last_key, rows_copied = EXCLUDED.rows_copied,
+                                                 updated_at = CURRENT_TIMESTAMP;
+            """, (BACKFILL_CHECKPOINT, last_key, rows_copied))
+            connection.commit()
+            print(f"Backfilled {rows_copied} rows...")
+
+            if self.pause:
+                time.sleep(self.pause)
+        cursor.close()
+
+    def drop_legacy_ledger(self, force=False):
+        """
+        Drop checking_details_legacy, the unpartitioned ledger left behind by migration 7, once every one of
+        its rows is accounted for in checking_details or checking_details_archive.
+
+        Kept out of run() so the old table stays available until it has been checked. Ledger rows deleted
+        on purpose since the swap (e.g. by delete_users()) count as missing; pass force=True to drop anyway.
+
+        Args:
+            force (bool, optional): Drop even if legacy rows are missing from the new tables. Defaults to False.
+
+        Returns:
+            bool: True if the table was dropped (or was already gone).
+        """
+        with self.db._checkout() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT to_regclass('checking_details_legacy'), "
+                               "to_regclass('checking_details_archive');")
+                legacy, archive = cursor.fetchone()
+                if legacy is None:
+                    connection.rollback()
+                    return True
+
+                archived = """
+                    AND NOT EXISTS (SELECT 1 FROM checking_details_archive a
+                                    WHERE a.checking_details_id = l.checking_details_id)
+                """ if archive is not None else ""
+                cursor.execute(f"""
+                    SELECT COUNT(*),
+                           SUM(CASE WHEN NOT EXISTS (SELECT 1 FROM checking_details d
+                                                     WHERE d.checking_details_id = l.checking_details_id)
+                                         {archived}
+                                    THEN 1 ELSE 0 END)
+                    FROM checking_details_legacy l;
+                """)
+                legacy_rows, missing = cursor.fetchone()
+                missing = missing or 0
+                print(f"checking_details_legacy: {legacy_rows} rows, {legacy_rows - missing} found in the new "
+                      f"ledger, {missing} missing.")
+                if missing and not force:
+                    print("Not dropping checking_details_legacy; pass force=True if the missing rows were "
+                          "deleted on purpose.")
+                    connection.rollback()
+                    return False
+
+                cursor.execute("DROP TABLE checking_details_legacy;")
+                connection.commit()
+                self.db._note_write()
+                print("Dropped checking_details_legacy.")
+                return True
+            except psycopg2.Error as e:
+                connection.rollback()
+                print(f"Error dropping checking_details_legacy: {e}")
+                return False
+            finally:
+                cursor.close()
+                self.db.schema.invalidate()
+
+    def _apply(self, migration):
+        with self.db._checkout() as connection:
+            cursor = connection.cursor()
+            self._ensure_tables(cursor)
+            connection.commit()
+
+            # Functions manage their own commits when they are not transactional (e.g. the backfill)
+            connection.autocommit = not migration.transactional and isinstance(migration.apply, str)
+            try:
+                if isinstance(migration.apply, str):
+                    cursor.execute(migration.apply)
+                else:
+                    migration.apply(self, cursor)
+
+                cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s);",
+                               (migration.version, migration.description))
+                if not connection.autocommit:
+                    connection.commit()
+                self.db._note_write()
+            except psycopg2.Error:
+                if not connection.autocommit:
+                    connection.rollback()
+                raise
+            finally:
+                connection.autocommit = False
+                cursor.close()
+
+    @staticmethod
+    def _ensure_tables(cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT NOT NULL PRIMARY KEY,
+                description VARCHAR(150) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+            CREATE TABLE IF NOT EXISTS migration_checkpoints (
+                name VARCHAR(100) NOT NULL PRIMARY KEY,
+                last_key TEXT NOT NULL,
+                rows_copied BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
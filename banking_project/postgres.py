@@ -1,9 +1,44 @@
-import random
+import base64
+import csv
+import datetime
+import io
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import extensions, extras
 from tabulate import tabulate
+from account_numbers import AccountNumberAllocator
+from connection_pool import ConnectionPool
+from exporter import arrow_batch, arrow_schema, copy_source, open_sink, record_batch_writer, select_query
+from replica_router import CURRENT_LSN_QUERY, ReplicaRouter, parse_lsn
+from instrumentation import Instrumentation, connection_factory, timed
+from lookup_cache import MISSING, CacheListener, LookupCache
+from schema_cache import SchemaCache
+from schema_planner import SchemaChangePlan
+from statement_cache import StatementCache
+from unit_of_work import GroupCommitter, UnitOfWork
+
+# Column order shared by new_customer() arguments and the bulk ingest path
+CUSTOMER_COLUMNS = ["first_name", "last_name", "email", "date_of_birth", "phone_number", "phone_type", "ssn",
+                    "gender", "street_number", "street_name", "city", "state", "zip_code"]
+REQUIRED_CUSTOMER_COLUMNS = ["first_name", "last_name", "email", "date_of_birth", "phone_number", "phone_type",
+                             "ssn", "gender"]
+
+# Header layout of data.csv
+CSV_COLUMN_MAP = {"First Name": "first_name", "Last Name": "last_name", "Birthday": "date_of_birth",
+                  "Gender": "gender", "SSN": "ssn", "Email": "email", "Phone Number": "phone_number",
+                  "Phone Type": "phone_type"}
 
 class postgres:
-    def __init__(self, host, database, user, password, port="5432"):
+    def __init__(self, host, database, user, password, port="5432", pooled=False,
+                 min_connections=1, max_connections=10, health_check_interval=30.0, statement_cache_size=100,
+                 account_number_block_size=100, account_number_check_digit=False, instrument=False,
+                 slow_query_threshold=0.5, explain_slow_queries=False, replicas=None, pin_reads_after_write=True,
+                 max_replica_lag=None, replica_retry_interval=30.0, group_commit_window=None,
+                 group_commit_size=50, cache_lookups=False, cache_size=10000, cache_ttl=60.0, cache_listen=True):
         """
         Initialize a PostgreSQL database connection.
 
@@ -13,6 +48,46 @@ class postgres:
             user (str): Username for the database connection.
             password (str): Password for the database connection.
             port (str, optional): Port number for the database connection. Defaults to "5432".
+            pooled (bool, optional): Serve each method call from a thread-safe connection pool instead of
+                                     a single shared connection. Defaults to False.
+            min_connections (int, optional): Warm connections kept open in pooled mode. Defaults to 1.
+            max_connections (int, optional): Upper bound on open connections in pooled mode. Defaults to 10.
+            health_check_interval (float, optional): Seconds a pooled connection may sit idle before it is
+                                                     checked for staleness on checkout. Defaults to 30.
+            statement_cache_size (int, optional): Maximum number of prepared statements kept on each
+                                                  connection for the hot write paths. Defaults to 100.
+            account_number_block_size (int, optional): Account numbers reserved from the database sequence per
+                                                       round trip. Defaults to 100.
+            account_number_check_digit (bool, optional): Issue account numbers with a trailing Luhn check
+                                                         digit. Defaults to False.
+            instrument (bool, optional): Record per-method and per-statement latency, rows and connection
+                                         wait time, reported by stats(). Defaults to False.
+            slow_query_threshold (float, optional): With instrument on, statements slower than this many
+                                                    seconds are logged as slow queries. Defaults to 0.5.
+            explain_slow_queries (bool, optional): With instrument on, capture EXPLAIN (ANALYZE, BUFFERS) for
+                                                   slow SELECT statements. Defaults to False.
+            replicas (list, optional): Streaming replica endpoints ("host", "host:port" or (host, port)).
+                                       Read-only methods (query, stream_query, the export and schema display
+                                       methods, get_balance) are spread across them; everything else goes to
+                                       host. Defaults to None (all work on host).
+            pin_reads_after_write (bool, optional): After a thread commits a write, send that thread's reads to
+                                                    the primary until a replica has replayed it, so callers
+                                                    always see their own writes. Defaults to True.
+            max_replica_lag (float, optional): Skip replicas lagging more than this many seconds.
+                                               Defaults to None (no limit).
+            replica_retry_interval (float, optional): Seconds before a failed replica is tried again.
+                                                      Defaults to 30.
+            group_commit_window (float, optional): In pooled mode, let transaction() blocks from concurrent
+                                                   callers that start within this many seconds share one
+                                                   commit. Defaults to None (every block commits alone).
+            group_commit_size (int, optional): Maximum transaction() blocks per group commit. Defaults to 50.
+            cache_lookups (bool, optional): Serve get_user() and get_account() from an in-process LRU cache.
+                                            Defaults to False.
+            cache_size (int, optional): Maximum cached rows. Defaults to 10000.
+            cache_ttl (float, optional): Seconds a cached row is served before it is read again.
+                                         Defaults to 60.
+            cache_listen (bool, optional): Drop cached rows when the database reports a change over
+                                           LISTEN/NOTIFY (needs migration 8). Defaults to True.
         """
         self.host = host
         self.database = database
@@ -20,49 +95,612 @@ class postgres:
         self.password = password
         self.port = port
         self.connection = None
+        self.pooled = pooled
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.pool = None
+        self._cursor_ids = itertools.count(1)
+        self.statements = StatementCache(statement_cache_size)
+        self.schema = SchemaCache()
+        self.account_numbers = AccountNumberAllocator(block_size=account_number_block_size,
+                                                      check_digit=account_number_check_digit)
+        self.replica_endpoints = replicas
+        self.pin_reads_after_write = pin_reads_after_write
+        self.max_replica_lag = max_replica_lag
+        self.replica_retry_interval = replica_retry_interval
+        self.replicas = None
+        self.group_commit_window = group_commit_window
+        self.group_commit_size = group_commit_size
+        self.group_commit = None
+        self._local = threading.local()
+        self.cache = LookupCache(cache_size, cache_ttl) if cache_lookups else None
+        self.cache_listen = cache_listen
+        self.cache_listener = None
+        self.instrumentation = None
+        if instrument:
+            self.instrumentation = Instrumentation(slow_query_threshold=slow_query_threshold,
+                                                   explain_slow_queries=explain_slow_queries)
 
     def connect(self):
         """
         Establish a connection to the PostgreSQL server.
         """
         try:
-            self.connection = psycopg2.connect(
-                host=self.host,
-                database=self.database,
-                user=self.user,
-                password=self.password,
-                port=self.port
-            )
+            connect_kwargs = {}
+            if self.instrumentation is not None:
+                connect_kwargs["connection_factory"] = connection_factory(self.instrumentation)
+
+            if self.pooled:
+                self.pool = ConnectionPool(
+                    self.min_connections,
+                    self.max_connections,
+                    health_check_interval=self.health_check_interval,
+                    host=self.host,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password,
+                    port=self.port,
+                    **connect_kwargs
+                )
+            else:
+                self.connection = psycopg2.connect(
+                    host=self.host,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password,
+                    port=self.port,
+                    **connect_kwargs
+                )
+
+            if self.replica_endpoints:
+                self.replicas = ReplicaRouter(
+                    self.replica_endpoints,
+                    default_port=self.port,
+                    min_connections=self.min_connections if self.pooled else 1,
+                    max_connections=self.max_connections if self.pooled else 1,
+                    health_check_interval=self.health_check_interval,
+                    max_lag=self.max_replica_lag,
+                    retry_interval=self.replica_retry_interval,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password,
+                    **connect_kwargs
+                )
+                self.replicas.open()
+
+            if self.group_commit_window is not None:
+                if not self.pooled:
+                    print("Group commit needs pooled=True; transactions will commit individually.")
+                else:
+                    self.group_commit = GroupCommitter(self.pool.getconn, self.pool.putconn,
+                                                       window=self.group_commit_window,
+                                                       max_size=self.group_commit_size,
+                                                       on_commit=self._record_write if self._pins_reads() else None)
+
+            if self.cache is not None and self.cache_listen:
+                self.cache_listener = CacheListener(self.cache, host=self.host, database=self.database,
+                                                    user=self.user, password=self.password, port=self.port)
+                self.cache_listener.start()
             print("Connection to PostgreSQL successful!")
         except psycopg2.Error as e:
             print(f"Error connecting to PostgreSQL: {e}")
 
-    def query(self, query):
+    def _is_connected(self):
+        if self.pool is not None:
+            return not self.pool.closed
+        return self.connection is not None and not self.connection.closed
+
+    @contextmanager
+    def _checkout(self, read_only=False):
+        """
+        Yield a connection for the duration of one method call.
+
+        In pooled mode the connection is checked out of the pool and returned (rolled back if a
+        transaction was left open) when the block exits; otherwise the shared connection is used, and
+        rolled back if the block raises or leaves its transaction aborted.
+        With replicas configured, read_only work is served by a replica when one is healthy and
+        current enough, and the end of a block that committed a write records the primary's WAL position
+        so the same thread's later reads can wait for it to replicate. Inside a transaction() block every
+        checkout yields the block's connection.
+        """
+        unit_of_work = self._unit_of_work()
+        if unit_of_work is not None:
+            with unit_of_work.checkout() as connection:
+                yield connection
+            return
+
+        if read_only and self.replicas is not None:
+            started = time.perf_counter()
+            acquired = self.replicas.acquire(getattr(self._local, "write_lsn", None)
+                                             if self.pin_reads_after_write else None)
+            if acquired is not None:
+                replica, connection = acquired
+                if self.instrumentation is not None:
+                    self.instrumentation.record_wait(time.perf_counter() - started)
+                failed = False
+                try:
+                    yield connection
+                except psycopg2.OperationalError:
+                    failed = True
+                    raise
+                finally:
+                    self.replicas.release(replica, connection, failed)
+                return
+
+        if self.pool is None:
+            try:
+                yield self.connection
+            except BaseException:
+                # As putconn() does in pooled mode: never leave the shared connection in a failed transaction
+                self._rollback_failed(self.connection)
+                raise
+            if self.connection.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+                # The method caught its own error without rolling back
+                self._rollback_failed(self.connection)
+            elif not read_only:
+                self._end_write(self.connection)
+            return
+
+        started = time.perf_counter()
+        connection = self.pool.getconn()
+        if self.instrumentation is not None:
+            self.instrumentation.record_wait(time.perf_counter() - started)
+        try:
+            yield connection
+            if not read_only:
+                self._end_write(connection)
+        finally:
+            self.pool.putconn(connection)
+
+    @staticmethod
+    def _rollback_failed(connection):
+        if connection.closed:
+            return
+        try:
+            connection.rollback()
+        except psycopg2.Error:
+            pass
+
+    def _read_checkout(self):
+        return self._checkout(read_only=True)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a sequence of postgres method calls as one database transaction with a single commit.
+
+        Inside the block every method shares one connection and their commits are deferred to the end of
+        the block. If a method fails, or the block raises, everything done in the block is rolled back.
+        Blocks nested in the same thread join the outer one. With group_commit_window set, blocks from
+        concurrent callers may also share their commit. A failed method is still undone on its own, but a
+        block that fails after earlier methods in it succeeded rolls back every block in its group.
+
+        Example:
+            with bank.transaction() as tx:
+                user_id = bank.new_customer(...)
+                bank.create_new_checking_account(user_id)
+            if tx.committed:
+                ...
+
+        Yields:
+            UnitOfWork: Its 'committed' attribute is True once the block's work is durable, False if it
+                        was rolled back ('error' then holds the cause when known).
+        """
+        if self._unit_of_work() is not None:
+            yield self._unit_of_work()
+            return
+
+        if not self._is_connected():
+            raise psycopg2.InterfaceError("Connection not established. Call connect() first.")
+
+        if self.group_commit is not None:
+            with self.group_commit.member() as unit_of_work:
+                self._local.unit_of_work = unit_of_work
+                try:
+                    yield unit_of_work
+                finally:
+                    self._local.unit_of_work = None
+            # The group's commit recorded its WAL position (commit_result) on whichever thread ran it
+            if unit_of_work.committed and unit_of_work.commit_result is not None:
+                self._pin_reads(unit_of_work.commit_result)
+            self._report_transaction(unit_of_work)
+            return
+
+        with self._checkout() as connection:
+            unit_of_work = UnitOfWork(connection, "unit_of_work")
+            unit_of_work.begin()
+            self._local.unit_of_work = unit_of_work
+            try:
+                yield unit_of_work
+            except BaseException as e:
+                unit_of_work.error = unit_of_work.error or e
+                unit_of_work.committed = False
+                connection.rollback()
+                raise
+            finally:
+                self._local.unit_of_work = None
+
+            if unit_of_work.should_roll_back():
+                unit_of_work.committed = False
+                connection.rollback()
+            else:
+                try:
+                    self._commit(connection)
+                    unit_of_work.committed = True
+                except psycopg2.Error as e:
+                    unit_of_work.committed = False
+                    unit_of_work.error = e
+                    connection.rollback()
+        self._report_transaction(unit_of_work)
+
+    def _unit_of_work(self):
+        return getattr(self._local, "unit_of_work", None)
+
+    @staticmethod
+    def _report_transaction(unit_of_work):
+        if not unit_of_work.committed:
+            print(f"Transaction rolled back{f': {unit_of_work.error}' if unit_of_work.error else '.'}")
+
+    def _commit(self, connection):
+        # Inside a transaction() block the commit happens once, when the block ends
+        if self._unit_of_work() is None:
+            connection.commit()
+            self._note_write()
+
+    def _note_write(self):
+        """
+        Mark the current thread as having committed a write, so the end of its checkout records the WAL
+        position its reads must wait for. Code that commits on a checked out connection itself (rather than
+        through a postgres method) calls this after committing a write.
+        """
+        self._local.wrote = True
+
+    def _take_write(self):
+        wrote = getattr(self._local, "wrote", False)
+        self._local.wrote = False
+        return wrote
+
+    def _pins_reads(self):
+        return self.replicas is not None and self.pin_reads_after_write
+
+    def _pin_reads(self, lsn):
+        current = getattr(self._local, "write_lsn", None)
+        if current is None or lsn > current:
+            self._local.write_lsn = lsn
+
+    def _end_write(self, connection):
+        # Blocks that only read or touched the catalog (e.g. schema.load_table) commit nothing and skip the
+        # round trip, as does everything when there are no replicas to wait for
+        if self._take_write() and self._pins_reads():
+            lsn = self._record_write(connection)
+            if lsn is not None:
+                self._pin_reads(lsn)
+
+    def _rollback(self, connection):
+        unit_of_work = self._unit_of_work()
+        if unit_of_work is None:
+            connection.rollback()
+        else:
+            unit_of_work.fail()
+
+    def _end_read(self, connection):
+        # Read-only methods end their snapshot with a rollback, except inside a transaction() block
+        if self._unit_of_work() is None:
+            connection.rollback()
+
+    @staticmethod
+    def _record_write(connection):
+        # Return the primary's WAL position after a commit, or None if the connection is not idle
+        if connection.closed or connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return None
+
+        # Autocommit keeps this to a single round trip on an idle connection
+        connection.autocommit = True
+        try:
+            cursor = connection.cursor()
+            cursor.execute(CURRENT_LSN_QUERY)
+            lsn = parse_lsn(cursor.fetchone()[0])
+            cursor.close()
+        finally:
+            connection.autocommit = False
+        return lsn
+
+    def pool_stats(self):
+        """
+        Return connection pool statistics.
+
+        Returns:
+            dict: The pool's usage snapshot, or None when not running in pooled mode.
+        """
+        if self.pool is None:
+            return None
+        return self.pool.stats()
+
+    def cache_stats(self):
+        """
+        Return lookup cache statistics.
+
+        Returns:
+            dict: Hit/miss/eviction/invalidation counters and whether the change listener is connected, or
+                  None when the cache is off.
+        """
+        if self.cache is None:
+            return None
+        stats = self.cache.stats()
+        if self.cache_listener is not None:
+            stats["listener"] = self.cache_listener.stats()
+        return stats
+
+    def group_commit_stats(self):
+        """
+        Return group commit statistics.
+
+        Returns:
+            dict: Groups, commits, members and members per commit, or None when group commit is off.
+        """
+        if self.group_commit is None:
+            return None
+        return self.group_commit.stats()
+
+    def replica_stats(self):
+        """
+        Return read routing statistics.
+
+        Returns:
+            dict: Per-replica health, lag and read counts plus reads that fell back to the primary, or None
+                  when no replicas are configured.
+        """
+        if self.replicas is None:
+            return None
+        return self.replicas.stats()
+
+    def stats(self):
+        """
+        Return an instrumentation snapshot: per-method and per-statement latency (p50/p90/p99), rows,
+        connection wait time and recent slow queries, plus pool and statement cache counters.
+
+        Returns:
+            dict: The snapshot, or None when the instance was created without instrument=True.
+        """
+        if self.instrumentation is None:
+            return None
+        return dict(self.instrumentation.stats(), pool=self.pool_stats(),
+                    statement_cache=self.statement_cache_stats())
+
+    def show_stats(self, top=20):
+        """
+        Print the slowest methods and statements (by p99) recorded by the instrumentation layer.
+
+        Args:
+            top (int, optional): Number of statements to list. Defaults to 20.
+        """
+        snapshot = self.stats()
+        if snapshot is None:
+            print("Instrumentation is off. Create the instance with instrument=True.")
+            return
+
+        headers = ["Name", "Calls", "p50 (ms)", "p99 (ms)", "Max (ms)"]
+
+        def row(name, summary):
+            return [name, summary["count"], f"{summary['p50'] * 1000:.2f}", f"{summary['p99'] * 1000:.2f}",
+                    f"{summary['max'] * 1000:.2f}"]
+
+        methods = sorted(snapshot["methods"].items(), key=lambda item: item[1]["p99"], reverse=True)
+        print(tabulate([row(name, summary) for name, summary in methods], headers=headers, tablefmt="grid"))
+
+        statements = sorted(snapshot["statements"].items(), key=lambda item: item[1]["p99"], reverse=True)[:top]
+        print(tabulate([row(name[:80], summary) + [summary["rows"]] for name, summary in statements],
+                       headers=headers + ["Rows"], tablefmt="grid"))
+
+        wait = snapshot["connection_wait"]
+        print(f"Connection wait: p50 {wait['p50'] * 1000:.2f} ms, p99 {wait['p99'] * 1000:.2f} ms "
+              f"over {wait['count']} checkouts. {len(snapshot['slow_queries'])} slow queries logged.")
+
+    def statement_cache_stats(self):
+        """
+        Return prepared statement cache statistics.
+
+        Returns:
+            dict: Hit/miss/eviction counters for the prepared statement cache.
+        """
+        return self.statements.stats()
+
+    @timed
+    def query(self, query, max_rows=None):
         """
         Execute a SQL query on the connected PostgreSQL database and print the results in a table format.
 
         Args:
             query (str): SQL query to be executed.
+            max_rows (int, optional): Only fetch and format the first max_rows rows, using a server-side
+                                      cursor so the rest of the result set never leaves the server.
+                                      Defaults to None (print every row).
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
+            with self._checkout(read_only=True) as connection:
+                if max_rows is None:
+                    cursor = connection.cursor()
+                    cursor.execute(query)
+                    results = cursor.fetchall()
+                else:
+                    cursor = connection.cursor(name=self._cursor_name())
+                    cursor.execute(query)
+                    results = cursor.fetchmany(max_rows + 1)
+
+                headers = [desc[0] for desc in cursor.description]
+                truncated = max_rows is not None and len(results) > max_rows
+                table = tabulate(results[:max_rows] if truncated else results, headers=headers, tablefmt="grid")
+                print(table)
+                if truncated:
+                    print(f"Showing the first {max_rows} rows.")
+
+                cursor.close()
+                if max_rows is not None:
+                    self._end_read(connection)
+        except psycopg2.Error as e:
+            print(f"Error executing query: {e}")
 
-            cursor.execute(query)
+    def stream_query(self, query, params=None, itersize=2000, as_columns=False):
+        """
+        Execute a SQL query and lazily yield its results from a server-side (named) cursor.
 
-            results = cursor.fetchall()
+        Rows are pulled from the server itersize at a time, so memory stays flat regardless of the size of
+        the result set. In pooled mode the connection stays checked out until the generator is exhausted
+        or closed.
 
-            headers = [desc[0] for desc in cursor.description]
-            table = tabulate(results, headers=headers, tablefmt="grid")
-            print(table)
+        Args:
+            query (str): SQL query to be executed.
+            params (tuple or dict, optional): Parameters bound to the query. Defaults to None.
+            itersize (int, optional): Number of rows fetched per network round trip. Defaults to 2000.
+            as_columns (bool, optional): Yield one dict of {column_name: [values]} per itersize batch
+                                         instead of individual row tuples. Defaults to False.
 
-            cursor.close()
+        Yields:
+            tuple or dict: A result row, or a column batch when as_columns is True.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            with self._checkout(read_only=True) as connection:
+                cursor = connection.cursor(name=self._cursor_name())
+                cursor.itersize = itersize
+                try:
+                    cursor.execute(query, params)
+
+                    if not as_columns:
+                        yield from cursor
+                    else:
+                        while True:
+                            rows = cursor.fetchmany(itersize)
+                            if not rows:
+                                break
+                            headers = [desc[0] for desc in cursor.description]
+                            yield {header: list(values) for header, values in zip(headers, zip(*rows))}
+                finally:
+                    if not cursor.closed:
+                        cursor.close()
+                    self._end_read(connection)
         except psycopg2.Error as e:
-            print(f"Error executing query: {e}")
+            print(f"Error streaming query: {e}")
+
+    def _cursor_name(self):
+        return f"stream_{next(self._cursor_ids)}"
+
+    @timed
+    def export_csv(self, source, destination, params=None, header=True, compression=None):
+        """
+        Stream a table or query result to CSV with COPY ... TO STDOUT.
+
+        Data is written to destination as the server sends it, so memory use does not depend on the size of
+        the result and the export runs as fast as the server and disk allow.
+
+        Args:
+            source (str): Table name, or a SELECT statement.
+            destination (str or file): Output path, or a writable binary file-like object (left open).
+            params (tuple or dict, optional): Parameters bound to a SELECT source. Defaults to None.
+            header (bool, optional): Write a header row. Defaults to True.
+            compression (str, optional): None, "gzip" or "zstd". Defaults to None, or to the compression
+                                         implied by a .gz/.zst destination path.
+
+        Returns:
+            dict: Export report with 'rows', 'seconds' and 'rows_per_second', or None if the export failed.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            started = time.perf_counter()
+            with self._checkout(read_only=True) as connection:
+                cursor = connection.cursor()
+                try:
+                    query = f"""
+                        COPY {copy_source(cursor, source, params)} TO STDOUT
+                        WITH (FORMAT csv, HEADER {'true' if header else 'false'});
+                    """
+                    with open_sink(destination, compression) as sink:
+                        cursor.copy_expert(query, sink)
+                    rows = cursor.rowcount
+                finally:
+                    cursor.close()
+                    self._end_read(connection)
+
+            return self._export_report(rows, time.perf_counter() - started)
+        except psycopg2.Error as e:
+            print(f"Error exporting to CSV: {e}")
+
+    @timed
+    def export_parquet(self, source, destination, params=None, batch_size=50000, compression="zstd"):
+        """
+        Stream a table or query result to a Parquet file in bounded record batches.
+
+        Rows are pulled from a server-side cursor batch_size at a time and each batch is written as its own
+        row group, so memory use is bounded by one batch. Column types come from the result's PostgreSQL
+        types (numeric columns with a declared precision become decimals; types without an Arrow
+        equivalent, such as UUID, are written as text; json, jsonb and array values as JSON text).
+
+        Args:
+            source (str): Table name, or a SELECT statement.
+            destination (str or file): Output path, or a writable binary file-like object.
+            params (tuple or dict, optional): Parameters bound to a SELECT source. Defaults to None.
+            batch_size (int, optional): Rows per record batch. Defaults to 50000.
+            compression (str, optional): Parquet codec: None, "snappy", "gzip" or "zstd". Defaults to "zstd".
+
+        Returns:
+            dict: Export report with 'rows', 'seconds' and 'rows_per_second', or None if the export failed.
+        """
+        return self._export_batches(source, destination, params, batch_size, "parquet", compression)
+
+    @timed
+    def export_arrow(self, source, destination, params=None, batch_size=50000, compression="zstd"):
+        """
+        Stream a table or query result to an Arrow IPC file in bounded record batches. See export_parquet().
+
+        Args:
+            compression (str, optional): None, "lz4" or "zstd". Defaults to "zstd".
+        """
+        return self._export_batches(source, destination, params, batch_size, "arrow", compression)
+
+    def _export_batches(self, source, destination, params, batch_size, file_format, compression):
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            started = time.perf_counter()
+            rows = 0
+            with self._checkout(read_only=True) as connection:
+                cursor = connection.cursor(name=self._cursor_name())
+                try:
+                    cursor.execute(select_query(source, params), params)
+                    batch = cursor.fetchmany(batch_size)
+                    schema = arrow_schema(cursor.description)
+
+                    with record_batch_writer(destination, schema, file_format, compression) as writer:
+                        while batch:
+                            writer.write_batch(arrow_batch(batch, schema))
+                            rows += len(batch)
+                            batch = cursor.fetchmany(batch_size)
+                finally:
+                    cursor.close()
+                    self._end_read(connection)
+
+            return self._export_report(rows, time.perf_counter() - started)
+        except psycopg2.Error as e:
+            print(f"Error exporting to {file_format}: {e}")
+
+    @staticmethod
+    def _export_report(rows, seconds):
+        return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds else 0.0}
 
+    @timed
     def add_table(self, table_name, table_definition):
         """
         Create a new table in the connected PostgreSQL database.
@@ -72,54 +710,67 @@ class postgres:
             table_definition (str): Definition of the new table's columns and data types.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
+            with self._checkout() as connection:
+                cursor = connection.cursor()
 
-            query = f"CREATE TABLE IF NOT EXISTS {table_name} ({table_definition});"
+                query = f"CREATE TABLE IF NOT EXISTS {table_name} ({table_definition});"
 
-            cursor.execute(query)
+                cursor.execute(query)
 
-            self.connection.commit()
-            print(f"Table '{table_name}' created successfully!")
+                self._commit(connection)
+                self.schema.invalidate()
+                print(f"Table '{table_name}' created successfully!")
 
-            cursor.close()
+                cursor.close()
         except psycopg2.Error as e:
             print(f"Error adding table: {e}")
 
-    def add_columns(self, table_name, column_data):
+    @timed
+    def add_columns(self, table_name, column_data, dry_run=False):
         """
         Add new columns to a table in the connected PostgreSQL database.
 
+        All columns are added by one combined ALTER TABLE statement in a single transaction, so the table
+        is locked once. Columns whose default forces a full table rewrite are reported before running.
+
         Args:
             table_name (str): Name of the table to which the columns will be added.
             column_data (list): List of tuples containing column name and data type pairs.
                                 Example: [('column1', 'VARCHAR'), ('column2', 'INTEGER'), ...]
+            dry_run (bool, optional): Only print the plan without executing it. Defaults to False.
+
+        Returns:
+            SchemaChangePlan: The planned changes, or None if no connection is established.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
-
+            plan = SchemaChangePlan(table_name, self.schema.load_table(self._checkout, table_name))
             for column_name, column_type in column_data:
-                query = f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type};"
-                cursor.execute(query)
+                plan.add_column(column_name, column_type)
 
-            self.connection.commit()
-            print(f"Columns added successfully to table '{table_name}'.")
-
-            cursor.close()
+            self._apply_schema_plan(plan, dry_run)
+            if not dry_run:
+                print(f"Columns added successfully to table '{table_name}'.")
+            return plan
         except psycopg2.Error as e:
             print(f"Error adding columns: {e}")
 
-    def update_columns(self, table_name, column_name_mapping):
+    @timed
+    def update_columns(self, table_name, column_name_mapping, dry_run=False):
         """
         Update the names and data types of columns in a table in the connected PostgreSQL database.
 
+        Renames, type changes and NOT NULL constraints for every column are folded into one transaction
+        with a single combined ALTER TABLE, so the table is locked once and rewritten at most once.
+        Changes that are already in place are skipped, and the ones that force a rewrite are reported.
+
         Args:
             table_name (str): Name of the table in which the columns will be updated.
             column_name_mapping (dict): Dictionary containing the mapping of old column names to new column names
@@ -127,69 +778,73 @@ class postgres:
                                         Example: {'old_column_name1': ('new_column_name1', 'NEW_DATA_TYPE1'),
                                                   'old_column_name2': ('new_column_name2', 'NEW_DATA_TYPE2'),
                                                   ...}
+            dry_run (bool, optional): Only print the plan without executing it. Defaults to False.
 
         Returns:
-            None: This method has no return value.
+            SchemaChangePlan: The planned changes, or None if no connection is established.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
-
+            plan = SchemaChangePlan(table_name, self.schema.load_table(self._checkout, table_name))
             for old_column_name, (new_column_name, new_data_type) in column_name_mapping.items():
-                try:
-                    # Rename column name
-                    rename_query = f"ALTER TABLE {table_name} RENAME COLUMN {old_column_name} TO {new_column_name};"
-                    cursor.execute(rename_query)
-                except psycopg2.Error as e:
-                    # Suppress the error and continue if column name change fails
-                    print(f"Error renaming column '{old_column_name}' to '{new_column_name}': {e}")
-
-                # Update column data type for the renamed column
-                update_query = f"ALTER TABLE {table_name} ALTER COLUMN {new_column_name} TYPE {new_data_type};"
-                cursor.execute(update_query)
-
-                # Add NOT NULL constraint to the renamed column
-                not_null_query = f"ALTER TABLE {table_name} ALTER COLUMN {new_column_name} SET NOT NULL;"
-                cursor.execute(not_null_query)
-
-            self.connection.commit()
-            print(f"Columns in table '{table_name}' updated successfully.")
-
-            cursor.close()
+                plan.rename_column(old_column_name, new_column_name)
+                plan.alter_column_type(new_column_name, new_data_type)
+                plan.set_not_null(new_column_name)
+
+            self._apply_schema_plan(plan, dry_run)
+            if not dry_run:
+                print(f"Columns in table '{table_name}' updated successfully.")
+            return plan
         except psycopg2.Error as e:
             print(f"Error updating columns: {e}")
 
+    def _apply_schema_plan(self, plan, dry_run):
+        if dry_run or plan.rewrites:
+            print(plan.describe())
+        if dry_run or plan.is_empty():
+            return
+
+        with self._checkout() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(plan.sql())
+                self._commit(connection)
+            except psycopg2.Error:
+                self._rollback(connection)
+                raise
+            finally:
+                self.schema.invalidate()
+                # Statements prepared against the old table shape (e.g. the SELECT * lookups) must be replanned
+                self.statements.invalidate()
+                if self.cache is not None:
+                    self.cache.clear()
+                cursor.close()
+
+    @timed
     def show_tables(self):
         """
         Show a list of tables in the connected PostgreSQL database.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
-
-            query = "SELECT table_name FROM information_schema.tables WHERE table_schema='public';"
-
-            cursor.execute(query)
-
-            results = cursor.fetchall()
+            results = sorted(self.schema.tables(self._read_checkout))
 
             if len(results) == 0:
                 print("No tables found in the 'public' schema.")
             else:
                 print("Tables in the 'public' schema:")
-                for row in results:
-                    print(row[0])
-
-            cursor.close()
+                for table_name in results:
+                    print(table_name)
         except psycopg2.Error as e:
             print(f"Error showing tables: {e}")
 
+    @timed
     def show_table_schema(self, table_name):
         """
         Show the schema of a specific table in the connected PostgreSQL database.
@@ -198,40 +853,16 @@ class postgres:
             table_name (str): Name of the table to display the schema for.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
-
-            query = f"""
-                SELECT column_name, data_type, character_maximum_length, is_nullable
-                FROM information_schema.columns
-                WHERE table_name = %s;
-            """
-
-            cursor.execute(query, (table_name,))
-
-            columns = cursor.fetchall()
-
-            primary_key_query = f"""
-                SELECT column_name
-                FROM information_schema.table_constraints tc
-                JOIN information_schema.key_column_usage ku
-                  ON tc.constraint_name = ku.constraint_name
-                WHERE tc.table_name = %s AND tc.constraint_type = 'PRIMARY KEY';
-            """
-
-            cursor.execute(primary_key_query, (table_name,))
-            primary_key = cursor.fetchone()
+            columns = self.schema.tables(self._read_checkout).get(table_name, [])
 
             rows = []
-            for column in columns:
-                column_name, data_type, max_length, is_nullable = column
-                is_primary_key = "Yes" if primary_key and column_name == primary_key[0] else "No"
-                rows.append([column_name, data_type, str(max_length), is_nullable, is_primary_key])
-
-            cursor.close()
+            for column_name, data_type, max_length, is_nullable, is_primary_key in columns:
+                rows.append([column_name, data_type, str(max_length), "YES" if is_nullable else "NO",
+                             "Yes" if is_primary_key else "No"])
 
             headers = ["Column Name", "Data Type", "Max Length", "OPTIONAL", "Primary Key"]
             table = tabulate(rows, headers=headers, tablefmt="grid")
@@ -241,6 +872,28 @@ class postgres:
         except psycopg2.Error as e:
             print(f"Error showing table schema: {e}")
 
+    @timed
+    def get_table_schema(self, table_name):
+        """
+        Return the cached schema of a table without printing it.
+
+        Args:
+            table_name (str): Name of the table to look up.
+
+        Returns:
+            list: Tuples of (column_name, data_type, max_length, is_nullable, is_primary_key), or None if
+                  the table does not exist or no connection is established.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            return self.schema.tables(self._read_checkout).get(table_name)
+        except psycopg2.Error as e:
+            print(f"Error reading table schema: {e}")
+
+    @timed
     def new_customer(self, first_name, last_name, email,
                      date_of_birth, phone_number, phone_type, ssn, gender,
                      street_number, street_name, city, state, zip_code):
@@ -263,34 +916,194 @@ class postgres:
             zip_code (str): Zip code of the customer's address.
 
         Returns:
-            None: This method has no return value.
+            str: The new customer's user_id, or None if the record could not be created.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
+            with self._checkout() as connection:
+                cursor = connection.cursor()
+
+                # Example INSERT query for creating a new record in the "Users" table
+                query = """
+                    INSERT INTO users (user_id,first_name, last_name, 
+                    email, date_of_birth, phone_number, phone_type, ssn, 
+                    gender, street_number, street_name, city, state, zip_code)
+                    VALUES (uuid_generate_v4(), $1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
+                    RETURNING user_id;
+                """
+
+                # Execute the prepared INSERT with the provided values
+                self.statements.execute(cursor, "new_customer", query,
+                                        (first_name, last_name, email, date_of_birth, phone_number, phone_type,
+                                         ssn, gender, street_number, street_name, city, state, zip_code))
+                user_id = cursor.fetchone()[0]
+
+                self._commit(connection)
+                print("New customer record created successfully!")
+
+                cursor.close()
+                return str(user_id)
+        except psycopg2.Error as e:
+            print(f"Error creating new customer record: {e}")
 
-            # Example INSERT query for creating a new record in the "Users" table
-            query = """
-                INSERT INTO users (user_id,first_name, last_name, 
-                email, date_of_birth, phone_number, phone_type, ssn, 
-                gender, street_number, street_name, city, state, zip_code)
-                VALUES (uuid_generate_v4(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
-            """
+    @timed
+    def bulk_new_customers(self, customers, chunk_size=5000):
+        """
+        Stream many customer records into the "Users" table using COPY FROM STDIN.
 
-            # Execute the INSERT query with the provided values
-            cursor.execute(query, (first_name, last_name, email, date_of_birth, phone_number, phone_type,
-                                   ssn, gender, street_number, street_name, city, state, zip_code))
+        Records are consumed lazily and sent in chunks of at most chunk_size rows, one transaction per
+        chunk, so memory stays bounded no matter how many customers are ingested. user_id values are
+        generated server-side with uuid_generate_v4().
 
-            self.connection.commit()
-            print("New customer record created successfully!")
+        Args:
+            customers (iterable): Customer records, either dicts keyed by users column name or tuples in
+                                  the same order as new_customer()'s arguments.
+            chunk_size (int, optional): Maximum number of rows sent per COPY. Defaults to 5000.
 
-            cursor.close()
+        Returns:
+            dict: Ingest report with 'inserted', 'rejected' (list of (record_number, record, reason)),
+                  'seconds' and 'rows_per_second'. None if no connection is established.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            report = {"inserted": 0, "rejected": [], "seconds": 0.0, "rows_per_second": 0.0}
+            started = time.perf_counter()
+
+            with self._checkout() as connection:
+                cursor = connection.cursor()
+
+                cursor.execute("""
+                    CREATE TEMP TABLE IF NOT EXISTS users_ingest (LIKE users INCLUDING DEFAULTS, record_number BIGINT)
+                    ON COMMIT DELETE ROWS;
+                """)
+                cursor.execute("ALTER TABLE users_ingest ALTER COLUMN user_id SET DEFAULT uuid_generate_v4();")
+                self._commit(connection)
+
+                chunk = []
+                for record_number, record in enumerate(customers, start=1):
+                    row = dict(zip(CUSTOMER_COLUMNS, record)) if isinstance(record, (tuple, list)) else record
+                    problem = self._validate_customer(row)
+                    if problem:
+                        report["rejected"].append((record_number, record, problem))
+                        continue
+
+                    chunk.append((record_number, record, row))
+                    if len(chunk) >= chunk_size:
+                        report["inserted"] += self._copy_customers(cursor, chunk, report["rejected"])
+                        self._commit(connection)
+                        chunk = []
+
+                if chunk:
+                    report["inserted"] += self._copy_customers(cursor, chunk, report["rejected"])
+                    self._commit(connection)
+
+                cursor.close()
+
+            report["seconds"] = time.perf_counter() - started
+            if report["seconds"] > 0:
+                report["rows_per_second"] = report["inserted"] / report["seconds"]
+
+            print(f"{report['inserted']} customer records ingested, {len(report['rejected'])} rejected "
+                  f"({report['rows_per_second']:.0f} rows/sec).")
+            return report
         except psycopg2.Error as e:
-            print(f"Error creating new customer record: {e}")
+            print(f"Error ingesting customer records: {e}")
+
+    @timed
+    def bulk_new_customers_from_csv(self, csv_path, column_map=None, chunk_size=5000):
+        """
+        Stream a CSV file of customers into the "Users" table. See bulk_new_customers().
+
+        With the default column map the header row must include First Name, Last Name, Birthday, Gender,
+        SSN, Email, Phone Number and Phone Type, as in data.csv; every one is a NOT NULL users column.
+        A file missing any of them is refused before a row is read.
+
+        Args:
+            csv_path (str): Path to a CSV file with a header row.
+            column_map (dict, optional): Mapping of CSV header to users column name. Headers that are not
+                                         mapped are ignored. Defaults to the layout of data.csv.
+            chunk_size (int, optional): Maximum number of rows sent per COPY. Defaults to 5000.
 
+        Returns:
+            dict: Ingest report, as returned by bulk_new_customers().
+        """
+        column_map = column_map if column_map is not None else CSV_COLUMN_MAP
+
+        with open(csv_path, newline="") as f:
+            reader = csv.DictReader(f)
+            mapped = {column_map[header] for header in reader.fieldnames or [] if header in column_map}
+            missing = [column for column in REQUIRED_CUSTOMER_COLUMNS if column not in mapped]
+            if missing:
+                headers = {column: header for header, column in column_map.items()}
+                print(f"Error ingesting customer records: {csv_path} has no column for "
+                      f"{', '.join(headers.get(column, column) for column in missing)}.")
+                return
+            customers = ({column_map[header]: value for header, value in line.items() if header in column_map}
+                         for line in reader)
+            return self.bulk_new_customers(customers, chunk_size=chunk_size)
+
+    @staticmethod
+    def _validate_customer(row):
+        missing = [column for column in REQUIRED_CUSTOMER_COLUMNS if not row.get(column)]
+        if missing:
+            return f"missing required columns: {', '.join(missing)}"
+        if row["gender"] not in ("Male", "Female"):
+            return f"invalid gender '{row['gender']}'"
+        return None
+
+    def _copy_customers(self, cursor, chunk, rejected):
+        """
+        COPY one chunk into the staging table and move it into "Users", skipping rows that collide with
+        an existing ssn, email or phone number. A chunk that fails on bad data is split in half until the
+        offending rows are isolated and rejected.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for record_number, _, row in chunk:
+            writer.writerow([row.get(column) for column in CUSTOMER_COLUMNS] + [record_number])
+        buffer.seek(0)
+
+        cursor.execute("SAVEPOINT ingest_chunk;")
+        try:
+            cursor.copy_expert(
+                f"COPY users_ingest ({', '.join(CUSTOMER_COLUMNS)}, record_number) FROM STDIN WITH (FORMAT csv);",
+                buffer
+            )
+            cursor.execute(f"""
+                WITH inserted AS (
+                    INSERT INTO users (user_id, {', '.join(CUSTOMER_COLUMNS)})
+                    SELECT user_id, {', '.join(CUSTOMER_COLUMNS)} FROM users_ingest
+                    ON CONFLICT DO NOTHING
+                    RETURNING user_id
+                )
+                SELECT s.record_number FROM users_ingest s
+                WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.user_id = s.user_id);
+            """)
+            duplicates = {record_number for (record_number,) in cursor.fetchall()}
+            cursor.execute("TRUNCATE users_ingest;")
+            cursor.execute("RELEASE SAVEPOINT ingest_chunk;")
+        except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT ingest_chunk;")
+            if len(chunk) == 1:
+                record_number, record, _ = chunk[0]
+                rejected.append((record_number, record, str(e).strip()))
+                return 0
+            middle = len(chunk) // 2
+            return (self._copy_customers(cursor, chunk[:middle], rejected)
+                    + self._copy_customers(cursor, chunk[middle:], rejected))
+
+        for record_number, record, _ in chunk:
+            if record_number in duplicates:
+                rejected.append((record_number, record, "duplicate ssn, email or phone number"))
+        return len(chunk) - len(duplicates)
+
+    @timed
     def create_new_checking_account(self, user_id, overdraft_limit=None):
         """
         Create a new checking account in the 'checking_accounts' table.
@@ -300,75 +1113,654 @@ class postgres:
             overdraft_limit (int, optional): The overdraft limit for the checking account. Defaults to None.
 
         Returns:
-            None: This method has no return value.
+            int: The account number issued to the new account, or None if it could not be created.
         """
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
+            with self._checkout() as connection:
+                cursor = connection.cursor()
 
-            # If the overdraft_limit is not provided, set it to NULL
-            overdraft_limit = overdraft_limit if overdraft_limit is not None else 'NULL'
+                account_number = self.account_numbers.allocate(connection)[0]
 
-            account_number = random.randint(111111111, 999999999)
+                # Create the SQL query; a missing overdraft_limit is bound as NULL
+                query = """
+                    INSERT INTO checking_accounts (checking_id, account_number, account_status, overdraft_limit, user_id)
+                    VALUES (uuid_generate_v4(), $1, 'Active', $2, $3);
+                """
+
+                # Execute the prepared query with the provided values
+                self.statements.execute(cursor, "create_new_checking_account", query,
+                                        (account_number, overdraft_limit, user_id))
+
+                # Commit the changes to the database
+                self._commit(connection)
+                print("New checking account created successfully!")
+
+                cursor.close()
+                return account_number
+        except psycopg2.Error as e:
+            print(f"Error creating checking account: {e}")
+
+    @timed
+    def create_new_checking_accounts(self, user_ids, overdraft_limit=None, page_size=1000):
+        """
+        Open a checking account for each of many users in one transaction.
+
+        Account numbers for the whole batch are reserved up front in a single round trip, and rows are
+        inserted page_size at a time with multi-row INSERT statements.
+
+        Args:
+            user_ids (list): The user IDs to open accounts for.
+            overdraft_limit (int, optional): The overdraft limit applied to every new account. Defaults to None.
+            page_size (int, optional): Rows per INSERT statement. Defaults to 1000.
+
+        Returns:
+            list: The issued account numbers, in the same order as user_ids.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            with self._checkout() as connection:
+                cursor = connection.cursor()
+
+                account_numbers = self.account_numbers.allocate(connection, len(user_ids))
+
+                query = """
+                    INSERT INTO checking_accounts (checking_id, account_number, account_status, overdraft_limit, user_id)
+                    VALUES %s;
+                """
+                extras.execute_values(cursor, query,
+                                      [(number, overdraft_limit, user_id)
+                                       for number, user_id in zip(account_numbers, user_ids)],
+                                      template="(uuid_generate_v4(), %s, 'Active', %s, %s)", page_size=page_size)
+
+                self._commit(connection)
+                print(f"{len(account_numbers)} checking accounts created successfully!")
+
+                cursor.close()
+                return account_numbers
+        except psycopg2.Error as e:
+            print(f"Error creating checking accounts: {e}")
+
+    @timed
+    def post_transactions(self, transactions):
+        """
+        Post a batch of transactions to checking accounts and keep each account's running balance current.
+
+        Every affected row in 'checking_balances' is locked (in a fixed order, so concurrent batches cannot
+        deadlock), advanced by the batch total and used to stamp each new 'checking_details' row with its
+        running balance, all in one statement and one transaction. An account's first posting seeds its
+        balance from the sum of its existing history, archived rows included.
+
+        Args:
+            transactions (list): Tuples of (checking_account_id, transaction_amount, transaction_type) with
+                                 optional trailing memo and transaction_date. Amounts are signed: deposits
+                                 positive, withdrawals negative. transaction_date defaults to today.
+
+        Returns:
+            dict: New balance per checking_account_id, or None if the batch could not be posted.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            columns = [[], [], [], [], []]
+            for transaction in transactions:
+                transaction = tuple(transaction) + (None,) * (5 - len(transaction))
+                columns[0].append(str(transaction[0]))
+                for index in range(1, 5):
+                    columns[index].append(transaction[index])
+
+            with self._checkout() as connection:
+                cursor = connection.cursor()
+
+                query = """
+                    INSERT INTO checking_balances (checking_account_id, account_balance)
+                    SELECT a.checking_id,
+                           (SELECT COALESCE(SUM(transaction_amount), 0) FROM checking_details
+                            WHERE checking_account_id = a.checking_id)
+                           + (SELECT COALESCE(SUM(transaction_amount), 0) FROM checking_details_archive
+                              WHERE checking_account_id = a.checking_id)
+                    FROM checking_accounts a
+                    WHERE a.checking_id = ANY(%(accounts)s::uuid[])
+                      AND NOT EXISTS (SELECT 1 FROM checking_balances b WHERE b.checking_account_id = a.checking_id)
+                    ON CONFLICT DO NOTHING;
+
+                    WITH input AS (
+                        SELECT * FROM unnest(%(accounts)s::uuid[], %(amounts)s::int[], %(types)s::varchar[],
+                                             %(memos)s::varchar[], %(dates)s::date[])
+                                 WITH ORDINALITY AS t(account_id, amount, transaction_type, memo, transaction_date, n)
+                    ),
+                    locked AS (
+                        SELECT checking_account_id FROM checking_balances
+                        WHERE checking_account_id IN (SELECT account_id FROM input)
+                        ORDER BY checking_account_id
+                        FOR UPDATE
+                    ),
+                    totals AS (
+                        SELECT i.account_id, SUM(i.amount) AS total,
+                               MAX(COALESCE(i.transaction_date, CURRENT_DATE)) AS last_transaction
+                        FROM input i JOIN locked l ON l.checking_account_id = i.account_id
+                        GROUP BY i.account_id
+                    ),
+                    balances AS (
+                        UPDATE checking_balances b
+                        SET account_balance = b.account_balance + t.total,
+                            last_transaction = GREATEST(b.last_transaction, t.last_transaction),
+                            updated_at = CURRENT_TIMESTAMP
+                        FROM totals t
+                        WHERE b.checking_account_id = t.account_id
+                        RETURNING b.checking_account_id, b.account_balance, b.account_balance - t.total AS opening_balance
+                    ),
+                    accounts AS (
+                        UPDATE checking_accounts a
+                        SET last_transaction = GREATEST(a.last_transaction, t.last_transaction)
+                        FROM totals t
+                        WHERE a.checking_id = t.account_id
+                        RETURNING a.checking_id, a.account_number, a.user_id
+                    ),
+                    details AS (
+                        INSERT INTO checking_details (user_id, checking_account_id, account_number, transaction_amount,
+                                                      transaction_type, transaction_date, account_balance, memo)
+                        SELECT a.user_id, i.account_id, a.account_number, i.amount, i.transaction_type,
+                               COALESCE(i.transaction_date, CURRENT_DATE),
+                               b.opening_balance + SUM(i.amount) OVER (PARTITION BY i.account_id ORDER BY i.n),
+                               i.memo
+                        FROM input i
+                        JOIN balances b ON b.checking_account_id = i.account_id
+                        JOIN accounts a ON a.checking_id = i.account_id
+                    )
+                    SELECT checking_account_id, account_balance FROM balances;
+                """
+
+                cursor.execute(query, {"accounts": columns[0], "amounts": columns[1], "types": columns[2],
+                                       "memos": columns[3], "dates": columns[4]})
+                balances = {str(account_id): balance for account_id, balance in cursor.fetchall()}
+
+                unknown = set(columns[0]) - set(balances)
+                if unknown:
+                    self._rollback(connection)
+                    print(f"Error posting transactions: unknown checking accounts {', '.join(sorted(unknown))}")
+                    cursor.close()
+                    return
+
+                self._commit(connection)
+                # last_transaction may have moved on the accounts' rows
+                for account_id in balances:
+                    self._invalidate("account", account_id)
+                print(f"{len(columns[0])} transactions posted to {len(balances)} accounts.")
+
+                cursor.close()
+                return balances
+        except psycopg2.Error as e:
+            print(f"Error posting transactions: {e}")
+
+    @timed
+    def post_transaction(self, checking_account_id, transaction_amount, transaction_type, memo=None,
+                         transaction_date=None):
+        """
+        Post a single transaction. See post_transactions().
 
-            # Create the SQL query
+        Args:
+            checking_account_id (str): The checking_id of the account.
+            transaction_amount (int): Signed amount: positive for deposits, negative for withdrawals.
+            transaction_type (str): Short transaction type, e.g. 'Deposit' or 'Withdraw'.
+            memo (str, optional): Free-form memo. Defaults to None.
+            transaction_date (str, optional): Date of the transaction in the format 'YYYY-MM-DD'. Defaults to today.
+
+        Returns:
+            int: The account's new balance, or None if the transaction could not be posted.
+        """
+        balances = self.post_transactions([(checking_account_id, transaction_amount, transaction_type, memo,
+                                            transaction_date)])
+        if balances is not None:
+            return balances[str(checking_account_id)]
+
+    @timed
+    def get_balance(self, checking_account_id):
+        """
+        Return the current balance of a checking account with a single primary-key lookup.
+
+        Accounts that have never been posted to through post_transactions() fall back to summing their
+        'checking_details' history.
+
+        Args:
+            checking_account_id (str): The checking_id of the account.
+
+        Returns:
+            int: The current balance.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            with self._checkout(read_only=True) as connection:
+                cursor = connection.cursor()
+
+                query = """
+                    SELECT COALESCE(
+                        (SELECT account_balance FROM checking_balances WHERE checking_account_id = $1),
+                        (SELECT COALESCE(SUM(transaction_amount), 0) FROM checking_details WHERE checking_account_id = $1)
+                        + (SELECT COALESCE(SUM(transaction_amount), 0) FROM checking_details_archive
+                           WHERE checking_account_id = $1)
+                    );
+                """
+                self.statements.execute(cursor, "get_balance", query, (str(checking_account_id),))
+                balance = cursor.fetchone()[0]
+
+                cursor.close()
+                return balance
+        except psycopg2.Error as e:
+            print(f"Error reading balance: {e}")
+
+    @timed
+    def get_statement(self, checking_account_id, start_date=None, end_date=None, page_size=100, cursor=None):
+        """
+        Return one page of an account statement: transactions in (transaction_date, checking_details_id)
+        order with the running balance after each one.
+
+        Pages are read by keyset, seeking the ('checking_account_id', 'transaction_date',
+        'checking_details_id') index to the row after the previous page, and the balance carried into a
+        page travels in the cursor token. Later pages therefore cost the same as the first, however deep
+        the caller pages. Rows moved to 'checking_details_archive' by LedgerArchiver are included.
+
+        Args:
+            checking_account_id (str): The checking_id of the account.
+            start_date (date, optional): First transaction date included. Defaults to None (account opening).
+            end_date (date, optional): Last transaction date included. Defaults to None (no limit).
+            page_size (int, optional): Transactions per page. Defaults to 100.
+            cursor (str, optional): The 'next_cursor' of the previous page. Defaults to None (first page).
+
+        Returns:
+            dict: 'transactions' (list of dicts with a 'running_balance'), 'opening_balance' and
+                  'closing_balance' of the page, and 'next_cursor', or None on the last page.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            checking_account_id = str(checking_account_id)
+            start_date = start_date.isoformat() if isinstance(start_date, datetime.date) else start_date
+            end_date = end_date.isoformat() if isinstance(end_date, datetime.date) else end_date
+            position = None
+            if cursor is not None:
+                position = self._decode_statement_cursor(cursor)
+                if position is None or position["account"] != checking_account_id or \
+                        position["start"] != start_date or position["end"] != end_date:
+                    print("Statement cursor does not belong to this account and date range.")
+                    return
+
+            params = [checking_account_id]
+            conditions = ["checking_account_id = $1"]
+            if start_date is not None:
+                params.append(start_date)
+                conditions.append(f"transaction_date >= ${len(params)}::date")
+            if end_date is not None:
+                params.append(end_date)
+                conditions.append(f"transaction_date <= ${len(params)}::date")
+            if position is not None:
+                params.extend([position["date"], position["id"]])
+                conditions.append(f"(transaction_date, checking_details_id) > (${len(params) - 1}::date, "
+                                  f"${len(params)}::uuid)")
+            params.extend([position["balance"] if position is not None else 0, page_size + 1])
+
+            # One prepared statement per combination of filters, so each keeps a plan that seeks the index
+            variant = "".join("1" if value is not None else "0" for value in (start_date, end_date, position))
             query = f"""
-                INSERT INTO checking_accounts (checking_id, account_number, account_status, overdraft_limit, user_id)
-                VALUES (uuid_generate_v4(), %s, 'Active', {overdraft_limit}, %s);
+                SELECT checking_details_id, transaction_date, transaction_type, transaction_amount, memo,
+                       ${len(params) - 1}::bigint + SUM(transaction_amount) OVER (
+                           ORDER BY transaction_date, checking_details_id ROWS UNBOUNDED PRECEDING
+                       ) AS running_balance
+                FROM (
+                    SELECT checking_account_id, checking_details_id, transaction_date, transaction_type,
+                           transaction_amount, memo
+                    FROM checking_details
+                    UNION ALL
+                    SELECT checking_account_id, checking_details_id, transaction_date, transaction_type,
+                           transaction_amount, memo
+                    FROM checking_details_archive
+                ) ledger
+                WHERE {" AND ".join(conditions)}
+                ORDER BY transaction_date, checking_details_id
+                LIMIT ${len(params)};
             """
 
-            # Execute the query with the provided values
-            cursor.execute(query, (account_number, user_id))
+            with self._checkout(read_only=True) as connection:
+                db_cursor = connection.cursor()
+
+                if position is None and start_date is not None:
+                    # Only the first page sums the history before the statement; later pages carry it
+                    self.statements.execute(db_cursor, "get_statement_opening", """
+                        SELECT COALESCE(SUM(transaction_amount), 0) FROM (
+                            SELECT transaction_amount FROM checking_details
+                            WHERE checking_account_id = $1 AND transaction_date < $2::date
+                            UNION ALL
+                            SELECT transaction_amount FROM checking_details_archive
+                            WHERE checking_account_id = $1 AND transaction_date < $2::date
+                        ) history;
+                    """, (checking_account_id, start_date))
+                    params[-2] = db_cursor.fetchone()[0]
+
+                self.statements.execute(db_cursor, f"get_statement_{variant}", query, tuple(params))
+                rows = db_cursor.fetchall()
+                headers = [desc[0] for desc in db_cursor.description]
+                db_cursor.close()
+                self._end_read(connection)
+
+            opening_balance = params[-2]
+            transactions = [dict(zip(headers, row)) for row in rows[:page_size]]
+            next_cursor = None
+            if len(rows) > page_size:
+                last = transactions[-1]
+                next_cursor = self._encode_statement_cursor({
+                    "account": checking_account_id, "start": start_date, "end": end_date,
+                    "date": last["transaction_date"].isoformat(), "id": str(last["checking_details_id"]),
+                    "balance": int(last["running_balance"]),
+                })
+
+            return {
+                "checking_account_id": checking_account_id,
+                "transactions": transactions,
+                "opening_balance": int(opening_balance),
+                "closing_balance": int(transactions[-1]["running_balance"]) if transactions else int(opening_balance),
+                "next_cursor": next_cursor,
+            }
+        except psycopg2.Error as e:
+            print(f"Error reading statement: {e}")
 
-            # Commit the changes to the database
-            self.connection.commit()
-            print("New checking account created successfully!")
+    @staticmethod
+    def _encode_statement_cursor(position):
+        payload = json.dumps(position, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
 
-            cursor.close()
+    @staticmethod
+    def _decode_statement_cursor(token):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            if not {"account", "start", "end", "date", "id", "balance"} <= position.keys():
+                return None
+            datetime.date.fromisoformat(position["date"])
+            int(position["balance"])
+            return position
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return None
+
+    @timed
+    def get_user(self, user_id=None, email=None, ssn=None, phone_number=None):
+        """
+        Look up one customer by exactly one of its unique keys.
+
+        With cache_lookups on, repeated lookups are answered from memory until the row changes, is evicted
+        or its TTL runs out.
+
+        Args:
+            user_id (str, optional): The user's ID.
+            email (str, optional): The user's email address.
+            ssn (str, optional): The user's Social Security Number.
+            phone_number (str, optional): The user's phone number.
+
+        Returns:
+            dict: The 'users' row keyed by column name, or None if there is no such user.
+        """
+        keys = {column: value for column, value in
+                (("user_id", user_id), ("email", email), ("ssn", ssn), ("phone_number", phone_number))
+                if value is not None}
+        if len(keys) != 1:
+            print("Pass exactly one of user_id, email, ssn or phone_number.")
+            return
+        (column, value), = keys.items()
+        return self._lookup("users", column, value)
+
+    @timed
+    def get_account(self, account_number):
+        """
+        Look up one checking account by account number. Cached like get_user().
+
+        Args:
+            account_number (int): The account number.
+
+        Returns:
+            dict: The 'checking_accounts' row keyed by column name, or None if there is no such account.
+        """
+        return self._lookup("checking_accounts", "account_number", account_number)
+
+    def _lookup(self, table_name, column, value):
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
+
+            # Inside a transaction() block the caller may have changed the row, so always read it
+            use_cache = self.cache is not None and self._unit_of_work() is None
+            cache_key = (table_name, column, str(value))
+            if use_cache:
+                cached = self.cache.get(cache_key)
+                if cached is not MISSING:
+                    return dict(cached)
+                version = self.cache.version
+
+            with self._checkout(read_only=True) as connection:
+                cursor = connection.cursor()
+                self.statements.execute(cursor, f"get_{table_name}_by_{column}",
+                                        f"SELECT * FROM {table_name} WHERE {column} = $1;", (value,))
+                row = cursor.fetchone()
+                headers = [desc[0] for desc in cursor.description]
+                cursor.close()
+                self._end_read(connection)
+
+            if row is None:
+                return None
+            record = dict(zip(headers, row))
+            if use_cache:
+                tags = [("user", str(record["user_id"]))]
+                if table_name == "checking_accounts":
+                    tags.append(("account", str(record["checking_id"])))
+                self.cache.put(cache_key, record, tags, version)
+            return dict(record)
         except psycopg2.Error as e:
-            print(f"Error creating checking account: {e}")
+            print(f"Error looking up {table_name}: {e}")
 
+    def _invalidate(self, kind, key):
+        if self.cache is not None:
+            self.cache.invalidate((kind, str(key)))
+
+    @timed
     def delete_user(self, user_id):
         """
-        Delete a user from the 'users' table based on their user ID.
+        Delete a user, together with their checking accounts, balances and ledger rows.
+
+        Args:
+            user_id (str): The user ID of the user to be deleted.
+        """
+        result = self._delete_users([user_id], 1)
+        if result is None:
+            return
+        if result["users"]:
+            print(f"User with ID {user_id} deleted successfully.")
+        else:
+            print(f"User with ID {user_id} not found.")
+
+    @timed
+    def delete_users(self, user_ids, chunk_size=1000):
+        """
+        Delete many users and everything that references them, in one transaction.
+
+        Each chunk of user IDs is removed by a single statement that deletes the users' 'checking_details'
+        (live and archived), 'checking_balances' and 'checking_accounts' rows and then the 'users' rows,
+        binding the IDs as one array parameter. Foreign keys are checked at the end of the statement, once
+        every dependent row is gone.
 
         Args:
-            user_id (int): The user ID of the user to be deleted.
+            user_ids (list): The user IDs to delete. IDs with no matching user are skipped.
+            chunk_size (int, optional): User IDs per statement. Defaults to 1000.
+
+        Returns:
+            dict: 'users' (list of deleted user IDs), and counts of deleted 'accounts', 'balances' and
+                  'transactions', or None if nothing was deleted because of an error.
         """
+        result = self._delete_users(user_ids, chunk_size)
+        if result is not None:
+            print(f"{len(result['users'])} users deleted with {result['accounts']} checking accounts and "
+                  f"{result['transactions']} transactions.")
+        return result
+
+    def _delete_users(self, user_ids, chunk_size):
         try:
-            if self.connection is None or self.connection.closed:
+            if not self._is_connected():
                 print("Connection not established. Call connect() first.")
                 return
 
-            cursor = self.connection.cursor()
+            user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+            result = {"users": [], "accounts": 0, "balances": 0, "transactions": 0}
+            account_ids = []
+
+            with self._checkout() as connection:
+                cursor = connection.cursor()
+
+                query = """
+                    WITH users_locked AS (
+                        SELECT user_id FROM users WHERE user_id = ANY(%(users)s::uuid[])
+                        ORDER BY user_id
+                        FOR UPDATE
+                    ),
+                    accounts AS (
+                        SELECT checking_id FROM checking_accounts
+                        WHERE user_id IN (SELECT user_id FROM users_locked)
+                    ),
+                    details AS (
+                        DELETE FROM checking_details
+                        WHERE user_id IN (SELECT user_id FROM users_locked)
+                           OR checking_account_id IN (SELECT checking_id FROM accounts)
+                        RETURNING 1
+                    ),
+                    archived_details AS (
+                        DELETE FROM checking_details_archive
+                        WHERE user_id IN (SELECT user_id FROM users_locked)
+                           OR checking_account_id IN (SELECT checking_id FROM accounts)
+                        RETURNING 1
+                    ),
+                    balances AS (
+                        DELETE FROM checking_balances
+                        WHERE checking_account_id IN (SELECT checking_id FROM accounts)
+                        RETURNING 1
+                    ),
+                    deleted_accounts AS (
+                        DELETE FROM checking_accounts
+                        WHERE checking_id IN (SELECT checking_id FROM accounts)
+                        RETURNING checking_id
+                    ),
+                    deleted_users AS (
+                        DELETE FROM users
+                        WHERE user_id IN (SELECT user_id FROM users_locked)
+                        RETURNING user_id
+                    )
+                    SELECT ARRAY(SELECT user_id::text FROM deleted_users),
+                           ARRAY(SELECT checking_id::text FROM deleted_accounts),
+                           (SELECT COUNT(*) FROM balances),
+                           (SELECT COUNT(*) FROM details) + (SELECT COUNT(*) FROM archived_details);
+                """
+
+                for offset in range(0, len(user_ids), chunk_size):
+                    cursor.execute(query, {"users": user_ids[offset:offset + chunk_size]})
+                    users, accounts, balances, transactions = cursor.fetchone()
+                    result["users"].extend(users)
+                    account_ids.extend(accounts)
+                    result["balances"] += balances
+                    result["transactions"] += transactions
+
+                self._commit(connection)
+                result["accounts"] = len(account_ids)
+                for user_id in result["users"]:
+                    self._invalidate("user", user_id)
+                for account_id in account_ids:
+                    self._invalidate("account", account_id)
+
+                cursor.close()
+                return result
+        except psycopg2.Error as e:
+            print(f"Error deleting users: {e}")
 
-            # Check if the user with the given ID exists in the 'users' table
-            check_query = f"SELECT * FROM users WHERE id = %s;"
-            cursor.execute(check_query, (user_id,))
-            user_data = cursor.fetchone()
+    @timed
+    def close_users(self, user_ids, chunk_size=1000):
+        """
+        Close many users and all of their checking accounts in one transaction, keeping their history.
 
-            if user_data is None:
-                print(f"User with ID {user_id} not found.")
-                return
+        Each chunk of user IDs is closed by a single statement that marks the users' 'checking_accounts'
+        rows 'Closed' and the 'users' rows 'closed'.
 
-            # Execute the DELETE query
-            delete_query = f"DELETE FROM users WHERE id = %s;"
-            cursor.execute(delete_query, (user_id,))
-            self.connection.commit()
+        Args:
+            user_ids (list): The user IDs to close. IDs with no matching user are skipped.
+            chunk_size (int, optional): User IDs per statement. Defaults to 1000.
 
-            print(f"User with ID {user_id} deleted successfully.")
+        Returns:
+            dict: 'users' (list of closed user IDs) and 'accounts' (list of closed checking account IDs), or
+                  None if nothing was closed because of an error.
+        """
+        try:
+            if not self._is_connected():
+                print("Connection not established. Call connect() first.")
+                return
 
-            cursor.close()
+            user_ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+            result = {"users": [], "accounts": []}
+
+            with self._checkout() as connection:
+                cursor = connection.cursor()
+
+                query = """
+                    WITH closed_users AS (
+                        UPDATE users SET account_status = 'closed'
+                        WHERE user_id = ANY(%(users)s::uuid[])
+                        RETURNING user_id
+                    ),
+                    closed_accounts AS (
+                        UPDATE checking_accounts SET account_status = 'Closed'
+                        WHERE user_id = ANY(%(users)s::uuid[]) AND account_status <> 'Closed'
+                        RETURNING checking_id
+                    )
+                    SELECT ARRAY(SELECT user_id::text FROM closed_users),
+                           ARRAY(SELECT checking_id::text FROM closed_accounts);
+                """
+
+                for offset in range(0, len(user_ids), chunk_size):
+                    cursor.execute(query, {"users": user_ids[offset:offset + chunk_size]})
+                    users, accounts = cursor.fetchone()
+                    result["users"].extend(users)
+                    result["accounts"].extend(accounts)
+
+                self._commit(connection)
+                for user_id in result["users"]:
+                    self._invalidate("user", user_id)
+                for account_id in result["accounts"]:
+                    self._invalidate("account", account_id)
+                print(f"{len(result['users'])} users closed with {len(result['accounts'])} checking accounts.")
+
+                cursor.close()
+                return result
         except psycopg2.Error as e:
-            print(f"Error deleting user: {e}")
+            print(f"Error closing users: {e}")
 
     def close_connection(self):
         """
-        Close the connection to the PostgreSQL server.
+        Close the connection to the PostgreSQL server, or every pooled connection in pooled mode.
         """
+        if self.pool is not None and not self.pool.closed:
+            self.pool.closeall()
+            print("Connection pool closed.")
         if self.connection is not None and not self.connection.closed:
             self.connection.close()
             print("Connection closed.")
+        if self.replicas is not None:
+            self.replicas.closeall()
+            print("Replica connections closed.")
+        if self.cache_listener is not None:
+            self.cache_listener.stop()
+            self.cache_listener = None
@@ -0,0 +1,200 @@
+import itertools
+import threading
+import time
+import psycopg2
+from psycopg2 import pool
+from connection_pool import ConnectionPool
+
+# Replication lag in seconds; zero when the replica has replayed everything it received, so an idle
+# primary does not make a caught-up replica look stale
+REPLICA_STATUS_QUERY = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END,
+           pg_last_wal_replay_lsn();
+"""
+CURRENT_LSN_QUERY = "SELECT pg_current_wal_lsn();"
+
+
+def parse_lsn(lsn):
+    """
+    Convert a PostgreSQL LSN such as '0/16B3748' to an integer so positions can be compared.
+    """
+    if lsn is None:
+        return None
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def parse_endpoint(endpoint, default_port):
+    """
+    Accept "host", "host:port" or a (host, port) tuple.
+    """
+    if isinstance(endpoint, (tuple, list)):
+        return endpoint[0], str(endpoint[1])
+    host, _, port = endpoint.partition(":")
+    return host, port or default_port
+
+
+class Replica:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.pool = None
+        self.healthy = False
+        self.retry_at = 0.0
+        self.checked_at = 0.0
+        self.lag = None
+        self.replay_lsn = None
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaRouter:
+    def __init__(self, replicas, default_port="5432", min_connections=1, max_connections=10,
+                 health_check_interval=30.0, max_lag=None, status_interval=5.0, retry_interval=30.0,
+                 **connect_kwargs):
+        """
+        Route read-only work across streaming replicas.
+
+        Replicas are used round robin. One is skipped while it is down (until retry_interval has passed),
+        while its replication lag exceeds max_lag, or while it has not yet replayed a write the caller
+        needs to see. Lag and replay position are refreshed on the replica's own connection at most every
+        status_interval seconds, or sooner when a caller needs a newer position.
+
+        Args:
+            replicas (list): Replica endpoints as "host", "host:port" or (host, port).
+            default_port (str, optional): Port for endpoints that do not name one. Defaults to "5432".
+            min_connections (int, optional): Warm connections per replica. Defaults to 1.
+            max_connections (int, optional): Upper bound on connections per replica. Defaults to 10.
+            health_check_interval (float, optional): See ConnectionPool. Defaults to 30.
+            max_lag (float, optional): Seconds of replication lag above which a replica is skipped.
+                                       Defaults to None (no limit).
+            status_interval (float, optional): Seconds between lag checks per replica. Defaults to 5.
+            retry_interval (float, optional): Seconds before a failed replica is tried again. Defaults to 30.
+            **connect_kwargs: Keyword arguments passed to psycopg2.connect() (everything but host and port).
+        """
+        self.replicas = [Replica(*parse_endpoint(endpoint, default_port)) for endpoint in replicas]
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.health_check_interval = health_check_interval
+        self.max_lag = max_lag
+        self.status_interval = status_interval
+        self.retry_interval = retry_interval
+        self.connect_kwargs = connect_kwargs
+        self._lock = threading.Lock()
+        self._order = itertools.count()
+        self._primary_reads = 0
+
+    def open(self):
+        """
+        Open a pool for every replica. Replicas that cannot be reached are retried later.
+        """
+        for replica in self.replicas:
+            self._open(replica)
+
+    def acquire(self, min_lsn=None):
+        """
+        Check a connection out of the next usable replica.
+
+        Args:
+            min_lsn (int, optional): WAL position the replica must have replayed. Defaults to None.
+
+        Returns:
+            tuple: (replica, connection), or None when no replica is usable and the caller should read from
+                   the primary. Hand the connection back with release().
+        """
+        start = next(self._order)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if not replica.healthy and not self._open(replica):
+                continue
+
+            try:
+                connection = replica.pool.getconn()
+            except (psycopg2.Error, pool.PoolError):
+                self._mark_failed(replica)
+                continue
+
+            try:
+                if self._is_usable(replica, connection, min_lsn):
+                    with self._lock:
+                        replica.reads += 1
+                    return replica, connection
+                replica.pool.putconn(connection)
+            except psycopg2.Error:
+                replica.pool.putconn(connection, close=True)
+                self._mark_failed(replica)
+
+        with self._lock:
+            self._primary_reads += 1
+        return None
+
+    def release(self, replica, connection, failed=False):
+        """
+        Return a connection from acquire(). A failed connection is closed and its replica taken out of
+        rotation until retry_interval has passed.
+        """
+        replica.pool.putconn(connection, close=failed)
+        if failed:
+            self._mark_failed(replica)
+
+    def closeall(self):
+        for replica in self.replicas:
+            if replica.pool is not None and not replica.pool.closed:
+                replica.pool.closeall()
+            replica.healthy = False
+
+    def stats(self):
+        """
+        Return routing statistics.
+
+        Returns:
+            dict: 'replicas' lists each replica's host, port, health, last measured lag (seconds), reads
+                  served and failures; 'primary_reads' counts reads that fell back to the primary.
+        """
+        with self._lock:
+            return {
+                "replicas": [{"host": replica.host, "port": replica.port, "healthy": replica.healthy,
+                              "lag": replica.lag, "reads": replica.reads, "failures": replica.failures}
+                             for replica in self.replicas],
+                "primary_reads": self._primary_reads,
+            }
+
+    def _open(self, replica):
+        if time.monotonic() < replica.retry_at:
+            return False
+        try:
+            if replica.pool is not None and not replica.pool.closed:
+                replica.pool.closeall()
+            replica.pool = ConnectionPool(self.min_connections, self.max_connections,
+                                          health_check_interval=self.health_check_interval,
+                                          host=replica.host, port=replica.port, **self.connect_kwargs)
+            replica.healthy = True
+            replica.checked_at = 0.0
+            return True
+        except psycopg2.Error:
+            self._mark_failed(replica)
+            return False
+
+    def _is_usable(self, replica, connection, min_lsn):
+        now = time.monotonic()
+        behind = min_lsn is not None and (replica.replay_lsn is None or replica.replay_lsn < min_lsn)
+        if behind or now - replica.checked_at >= self.status_interval:
+            cursor = connection.cursor()
+            cursor.execute(REPLICA_STATUS_QUERY)
+            lag, replay_lsn = cursor.fetchone()
+            cursor.close()
+            connection.rollback()
+            replica.lag = float(lag)
+            replica.replay_lsn = parse_lsn(replay_lsn)
+            replica.checked_at = now
+
+        if self.max_lag is not None and replica.lag > self.max_lag:
+            return False
+        return min_lsn is None or (replica.replay_lsn is not None and replica.replay_lsn >= min_lsn)
+
+    def _mark_failed(self, replica):
+        with self._lock:
+            replica.healthy = False
+            replica.failures += 1
+            replica.retry_at = time.monotonic() + self.retry_interval
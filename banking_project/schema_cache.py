@@ -0,0 +1,106 @@
+import threading
+from psycopg2 import extensions
+
+# One round trip for every table, column, type, nullability and (composite) primary key in a schema
+CATALOG_COLUMNS = """
+    SELECT c.relname,
+           a.attname,
+           format_type(a.atttypid, NULL),
+           CASE WHEN a.atttypid IN ('bpchar'::regtype, 'varchar'::regtype) AND a.atttypmod > 0
+                THEN a.atttypmod - 4 END,
+           NOT a.attnotnull,
+           COALESCE(a.attnum = ANY(i.indkey), false)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    LEFT JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    LEFT JOIN pg_index i ON i.indrelid = c.oid AND i.indisprimary
+    WHERE n.nspname = %s AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+"""
+CATALOG_QUERY = CATALOG_COLUMNS + "ORDER BY c.relname, a.attnum;"
+# The same columns for one table, read fresh when planning DDL
+TABLE_QUERY = CATALOG_COLUMNS + "AND c.relname = %s ORDER BY a.attnum;"
+
+
+class SchemaCache:
+    def __init__(self, schema="public"):
+        """
+        Initialize an in-process cache of catalog metadata for one schema.
+
+        The cache is filled with a single pg_catalog query on first use and kept until invalidate() is
+        called, so repeated schema inspection costs no database round trips.
+
+        Args:
+            schema (str, optional): Name of the schema to cache. Defaults to "public".
+        """
+        self.schema = schema
+        self._tables = None
+        self._lock = threading.Lock()
+
+    def tables(self, checkout):
+        """
+        Return the cached table metadata, loading it from the catalog on a cache miss.
+
+        Args:
+            checkout (callable): Returns a context manager yielding a connection. Only called on a miss,
+                                 so cache hits never touch the database or the connection pool.
+
+        Returns:
+            dict: Table name mapped to a list of column tuples:
+                  (column_name, data_type, max_length, is_nullable, is_primary_key).
+        """
+        with self._lock:
+            if self._tables is None:
+                with checkout() as connection:
+                    self._tables = self._load(connection)
+            return self._tables
+
+    def load_table(self, checkout, table_name):
+        """
+        Read one table's columns straight from the catalog, bypassing (and not filling) the cache.
+
+        Used to plan DDL, where a stale cached entry (e.g. after ALTER TABLE from query() or another
+        process) would make a needed change look as if it were already in place.
+
+        Args:
+            checkout (callable): Returns a context manager yielding a connection to the primary.
+            table_name (str): Name of the table.
+
+        Returns:
+            list: Column tuples as returned by tables(), or None if the table does not exist.
+        """
+        with checkout() as connection:
+            was_idle = connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+            cursor = connection.cursor()
+            cursor.execute(TABLE_QUERY, (self.schema, table_name))
+            rows = cursor.fetchall()
+            cursor.close()
+            if was_idle:
+                connection.rollback()
+
+        if not rows:
+            return None
+        return [(column_name, *column) for _, column_name, *column in rows if column_name is not None]
+
+    def invalidate(self):
+        """
+        Drop the cached metadata so the next lookup reloads it from the catalog.
+        """
+        with self._lock:
+            self._tables = None
+
+    def _load(self, connection):
+        was_idle = connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        cursor = connection.cursor()
+        cursor.execute(CATALOG_QUERY, (self.schema,))
+
+        tables = {}
+        for table_name, column_name, data_type, max_length, is_nullable, is_primary_key in cursor.fetchall():
+            columns = tables.setdefault(table_name, [])
+            if column_name is not None:
+                columns.append((column_name, data_type, max_length, is_nullable, is_primary_key))
+
+        cursor.close()
+        # End the snapshot unless the caller already had a transaction open
+        if was_idle:
+            connection.rollback()
+        return tables
@@ -0,0 +1,184 @@
+import re
+
+# Spellings PostgreSQL accepts for the same type, normalized to the names pg_catalog reports
+TYPE_ALIASES = {
+    "varchar": "character varying",
+    "char": "character",
+    "bpchar": "character",
+    "int": "integer",
+    "int4": "integer",
+    "int2": "smallint",
+    "int8": "bigint",
+    "bool": "boolean",
+    "float4": "real",
+    "float8": "double precision",
+    "decimal": "numeric",
+    "timestamp": "timestamp without time zone",
+    "timestamptz": "timestamp with time zone",
+}
+
+# Type changes PostgreSQL performs as a catalog-only update (binary coercible), keyed (old, new)
+NO_REWRITE_TYPE_CHANGES = {
+    ("character varying", "character varying"),
+    ("character varying", "text"),
+    ("text", "character varying"),
+}
+
+# Column defaults that must be evaluated per row, forcing ADD COLUMN to rewrite the table
+VOLATILE_DEFAULT = re.compile(
+    r"\b(default\s+.*\b(uuid_generate_v\d|gen_random_uuid|random|clock_timestamp|timeofday|nextval)\s*\(|generated\b)",
+    re.IGNORECASE
+)
+
+
+def parse_type(type_definition):
+    """
+    Split a type definition into its normalized name and optional length modifier.
+
+    Args:
+        type_definition (str): A type such as 'VARCHAR(50)', 'character varying' or 'INTEGER'.
+
+    Returns:
+        tuple: (type_name, length) where length is None when no modifier is given.
+    """
+    match = re.match(r"^\s*([a-z][a-z0-9_ ]*?)\s*(?:\(\s*(\d+)\s*\))?\s*$", type_definition.lower())
+    if match is None:
+        return type_definition.strip().lower(), None
+    name = TYPE_ALIASES.get(match.group(1), match.group(1))
+    length = int(match.group(2)) if match.group(2) else None
+    return name, length
+
+
+class SchemaChangePlan:
+    def __init__(self, table_name, columns=None):
+        """
+        Collect schema changes for one table and fold them into as few statements as possible.
+
+        Renames are emitted as separate RENAME COLUMN statements (PostgreSQL does not allow them alongside
+        other actions); every other change is combined into a single ALTER TABLE, and the whole plan runs
+        in one transaction, so the table is locked once and rewritten at most once.
+
+        Args:
+            table_name (str): Name of the table the changes apply to.
+            columns (list, optional): Current column metadata, as returned by postgres.get_table_schema().
+                                      Used to skip no-op changes and to predict table rewrites. When None,
+                                      every change is applied and type changes are assumed to rewrite.
+        """
+        self.table_name = table_name
+        self.columns = {column[0]: column for column in columns} if columns is not None else None
+        self.renames = []
+        self.actions = []
+        self.rewrites = []
+        self.scans = []
+
+    def add_column(self, column_name, column_type):
+        """
+        Plan an ADD COLUMN. Volatile defaults and generated columns are flagged as table rewrites.
+
+        Args:
+            column_name (str): Name of the new column.
+            column_type (str): Type and any column constraints, e.g. 'VARCHAR(20) NOT NULL DEFAULT ''x'''.
+        """
+        self.actions.append(f"ADD COLUMN {column_name} {column_type}")
+        if VOLATILE_DEFAULT.search(column_type):
+            self.rewrites.append(f"ADD COLUMN {column_name} has a per-row default")
+
+    def rename_column(self, old_column_name, new_column_name):
+        """
+        Plan a RENAME COLUMN. Skipped when the names match or the rename has already been applied.
+
+        Args:
+            old_column_name (str): Current name of the column.
+            new_column_name (str): New name of the column.
+        """
+        if old_column_name == new_column_name:
+            return
+        if self.columns is not None and old_column_name not in self.columns and new_column_name in self.columns:
+            return
+
+        self.renames.append(f"ALTER TABLE {self.table_name} RENAME COLUMN {old_column_name} TO {new_column_name};")
+        if self.columns is not None and old_column_name in self.columns:
+            self.columns[new_column_name] = (new_column_name,) + tuple(self.columns.pop(old_column_name)[1:])
+
+    def alter_column_type(self, column_name, new_data_type):
+        """
+        Plan an ALTER COLUMN ... TYPE. Skipped when the column already has that type.
+
+        Args:
+            column_name (str): Name of the column (after any planned rename).
+            new_data_type (str): The column's new data type.
+        """
+        new_name, new_length = parse_type(new_data_type)
+        current = self.columns.get(column_name) if self.columns is not None else None
+
+        if current is not None:
+            old_name, old_length = current[1], current[2]
+            if (old_name, old_length) == (new_name, new_length):
+                return
+            if not self._type_change_is_free(old_name, old_length, new_name, new_length):
+                self.rewrites.append(f"{column_name}: {old_name} -> {new_data_type}")
+        else:
+            self.rewrites.append(f"{column_name}: -> {new_data_type}")
+
+        self.actions.append(f"ALTER COLUMN {column_name} TYPE {new_data_type}")
+
+    def set_not_null(self, column_name):
+        """
+        Plan an ALTER COLUMN ... SET NOT NULL. This scans the table to validate but never rewrites it.
+        Skipped when the column is already NOT NULL.
+
+        Args:
+            column_name (str): Name of the column (after any planned rename).
+        """
+        current = self.columns.get(column_name) if self.columns is not None else None
+        if current is not None and not current[3]:
+            return
+
+        self.actions.append(f"ALTER COLUMN {column_name} SET NOT NULL")
+        self.scans.append(f"{column_name}: SET NOT NULL")
+
+    def statements(self):
+        """
+        Return the planned statements in execution order.
+
+        Returns:
+            list: SQL statements; renames first, then one combined ALTER TABLE.
+        """
+        statements = list(self.renames)
+        if self.actions:
+            statements.append(f"ALTER TABLE {self.table_name} {', '.join(self.actions)};")
+        return statements
+
+    def sql(self):
+        """
+        Return the whole plan as one transaction-ready SQL string, sent to the server in one round trip.
+        """
+        return "\n".join(self.statements())
+
+    def is_empty(self):
+        return not self.renames and not self.actions
+
+    def describe(self):
+        """
+        Return a human readable summary of the statements and their cost.
+
+        Returns:
+            str: The planned SQL followed by any changes that force a table rewrite or full scan.
+        """
+        lines = [f"Planned changes for '{self.table_name}':"] + [f"  {s}" for s in self.statements()]
+        if self.rewrites:
+            lines.append("Forces a full table rewrite:")
+            lines += [f"  {r}" for r in self.rewrites]
+        if self.scans:
+            lines.append("Requires a full table scan:")
+            lines += [f"  {s}" for s in self.scans]
+        return "\n".join(lines)
+
+    @staticmethod
+    def _type_change_is_free(old_name, old_length, new_name, new_length):
+        if (old_name, new_name) not in NO_REWRITE_TYPE_CHANGES:
+            return False
+        if new_name == "text" or new_length is None:
+            return True
+        # Narrowing (or adding a limit to) a varchar has to check and rewrite every row
+        return old_name == new_name and old_length is not None and new_length >= old_length
@@ -0,0 +1,105 @@
+import threading
+import weakref
+from collections import OrderedDict
+from psycopg2 import errors
+
+
+class StatementCache:
+    def __init__(self, max_size=100):
+        """
+        Initialize a per-connection registry of server-side prepared statements.
+
+        Each connection gets its own least-recently-used set of PREPAREd statements. Registries are keyed
+        weakly on the connection object, so a reconnect (a new connection object) starts with an empty
+        registry and statements are transparently re-prepared on first use. After a schema change,
+        invalidate() makes every connection re-prepare its statements on their next use.
+
+        Args:
+            max_size (int, optional): Maximum number of statements kept prepared on each connection.
+                                      The least recently used statement is DEALLOCATEd beyond that.
+                                      Defaults to 100.
+        """
+        self.max_size = max_size
+        self._registries = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._generation = 0
+
+    def execute(self, cursor, key, sql, params=()):
+        """
+        Execute a statement through the cache: PREPARE it on this connection once, then EXECUTE it.
+
+        Args:
+            cursor (cursor): Cursor of the connection the statement runs on.
+            key (str): Identifier for the statement, e.g. the calling method's name. Must be a valid
+                       SQL identifier.
+            sql (str): Statement text using $1, $2, ... placeholders.
+            params (tuple, optional): Values bound to the placeholders. Defaults to ().
+        """
+        connection = cursor.connection
+        with self._lock:
+            registry = self._registries.setdefault(connection, OrderedDict())
+
+        name = f"stmt_{key}"
+        if registry.get(name) == (sql, self._generation):
+            registry.move_to_end(name)
+            with self._lock:
+                self._hits += 1
+        else:
+            self._prepare(cursor, registry, name, sql)
+
+        execute_query = f"EXECUTE {name}" + (f" ({', '.join(['%s'] * len(params))})" if params else "") + ";"
+        try:
+            cursor.execute(execute_query, params or None)
+        except errors.InvalidSqlStatementName:
+            # The server forgot the statement (e.g. DISCARD ALL); the transaction is aborted now, but the
+            # next call on this connection will prepare it again
+            registry.pop(name, None)
+            raise
+        except errors.FeatureNotSupported:
+            # "cached plan must not change result type": a table the statement reads changed shape. Keep
+            # the entry but mark it stale, so the next call DEALLOCATEs and prepares it again
+            registry[name] = (None, self._generation)
+            raise
+
+    def invalidate(self):
+        """
+        Mark every prepared statement on every connection as stale, e.g. after DDL on a table they read.
+        Each is DEALLOCATEd and prepared again the next time it is executed on its connection.
+        """
+        with self._lock:
+            self._generation += 1
+
+    def stats(self):
+        """
+        Return cache counters.
+
+        Returns:
+            dict: Hits, misses (statements prepared), evictions and the number of connections tracked.
+        """
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "connections": len(self._registries),
+            }
+
+    def _prepare(self, cursor, registry, name, sql):
+        if name in registry:
+            cursor.execute(f"DEALLOCATE {name};")
+            del registry[name]
+
+        while len(registry) >= self.max_size:
+            evicted, _ = registry.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {evicted};")
+            with self._lock:
+                self._evictions += 1
+
+        cursor.execute(f"PREPARE {name} AS {sql}")
+        registry[name] = (sql, self._generation)
+        with self._lock:
+            self._misses += 1
@@ -0,0 +1,123 @@
+import unittest
+
+from psycopg2 import extensions
+
+from account_numbers import (AccountNumberAllocator, AccountNumbersExhausted, MAX_ACCOUNT_NUMBER, NEXT_BLOCKS_QUERY,
+                             SEQUENCE_INCREMENT_QUERY, is_valid_account_number, luhn_check_digit)
+
+
+class FakeSequence:
+    """
+    Stands in for a connection to a database whose account number sequence already exists.
+    """
+    def __init__(self, start, increment):
+        self.value = start - increment
+        self.increment = increment
+        self.round_trips = 0
+        self.info = self
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, sequence):
+        self.connection = sequence
+        self.rows = []
+
+    def execute(self, query, params=None):
+        sequence = self.connection
+        if query == SEQUENCE_INCREMENT_QUERY:
+            self.rows = [(sequence.increment,)]
+        elif query == NEXT_BLOCKS_QUERY:
+            sequence.round_trips += 1
+            self.rows = []
+            for _ in range(params[1]):
+                sequence.value += sequence.increment
+                self.rows.append((sequence.value,))
+        else:
+            self.rows = []
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class LuhnTest(unittest.TestCase):
+    def test_known_check_digits(self):
+        # 7992739871 -> 3 is the standard worked example
+        self.assertEqual(luhn_check_digit(7992739871), 3)
+        self.assertEqual(luhn_check_digit(0), 0)
+        self.assertEqual(luhn_check_digit(111111111), 6)
+
+    def test_validation(self):
+        self.assertTrue(is_valid_account_number(79927398713))
+        self.assertFalse(is_valid_account_number(79927398710))
+        # A single mistyped digit or swapped neighbours is always caught
+        self.assertFalse(is_valid_account_number(79927398813))
+        self.assertFalse(is_valid_account_number(79927389713))
+
+
+class AccountNumberAllocatorTest(unittest.TestCase):
+    def test_numbers_come_from_reserved_blocks(self):
+        sequence = FakeSequence(start=1000, increment=10)
+        allocator = AccountNumberAllocator(block_size=10)
+
+        self.assertEqual(allocator.allocate(sequence, 3), [1000, 1001, 1002])
+        self.assertEqual(allocator.allocate(sequence, 7), list(range(1003, 1010)))
+        self.assertEqual(sequence.round_trips, 1)
+
+        self.assertEqual(allocator.allocate(sequence), [1010])
+        self.assertEqual(sequence.round_trips, 2)
+
+    def test_large_requests_reserve_every_block_in_one_round_trip(self):
+        sequence = FakeSequence(start=1000, increment=10)
+        allocator = AccountNumberAllocator(block_size=10)
+        allocator.allocate(sequence, 4)
+
+        numbers = allocator.allocate(sequence, 25)
+        self.assertEqual(numbers, list(range(1004, 1029)))
+        self.assertEqual(sequence.round_trips, 2)
+        self.assertEqual(allocator.allocate(sequence, 1), [1029])
+
+    def test_existing_sequence_increment_wins(self):
+        sequence = FakeSequence(start=500, increment=50)
+        allocator = AccountNumberAllocator(block_size=10)
+        allocator.allocate(sequence)
+
+        self.assertEqual(allocator.block_size, 50)
+        self.assertEqual(allocator.allocate(sequence, 49), list(range(501, 550)))
+        self.assertEqual(sequence.round_trips, 1)
+
+    def test_check_digit_format(self):
+        sequence = FakeSequence(start=11111111, increment=100)
+        allocator = AccountNumberAllocator(check_digit=True)
+
+        numbers = allocator.allocate(sequence, 5)
+        self.assertEqual([number // 10 for number in numbers], list(range(11111111, 11111116)))
+        self.assertTrue(all(is_valid_account_number(number) for number in numbers))
+
+    def test_numbers_stay_within_an_int_column(self):
+        sequence = FakeSequence(start=MAX_ACCOUNT_NUMBER - 9, increment=10)
+        allocator = AccountNumberAllocator(block_size=10)
+        self.assertEqual(allocator.allocate(sequence, 10), list(range(MAX_ACCOUNT_NUMBER - 9, MAX_ACCOUNT_NUMBER + 1)))
+
+        sequence = FakeSequence(start=(MAX_ACCOUNT_NUMBER - 9) // 10 - 9, increment=10)
+        allocator = AccountNumberAllocator(block_size=10, check_digit=True)
+        self.assertTrue(all(number <= MAX_ACCOUNT_NUMBER for number in allocator.allocate(sequence, 10)))
+
+    def test_running_out_of_numbers_raises(self):
+        sequence = FakeSequence(start=MAX_ACCOUNT_NUMBER - 4, increment=10)
+        allocator = AccountNumberAllocator(block_size=10)
+
+        with self.assertRaisesRegex(AccountNumbersExhausted, "exhausted.*5 of 10"):
+            allocator.allocate(sequence, 10)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+from unittest import mock
+
+import psycopg2
+
+import connection_pool
+from connection_pool import ConnectionPool
+
+
+class FakeConnection:
+    def __init__(self, alive=True):
+        self.alive = alive
+        self.closed = False
+        self.pings = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+    def rollback(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement):
+        self.connection.pings += 1
+        if not self.connection.alive:
+            raise psycopg2.OperationalError("server closed the connection unexpectedly")
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    """
+    Hands out idle connections most recently returned first, opening new ones from 'opened' when none is idle.
+    """
+    def __init__(self, min_connections, max_connections, **connect_kwargs):
+        self.idle = []
+        self.opened = []
+        self.closed = False
+
+    def getconn(self):
+        if self.idle:
+            return self.idle.pop()
+        connection = FakeConnection()
+        self.opened.append(connection)
+        return connection
+
+    def putconn(self, connection, close=False):
+        if close:
+            connection.close()
+        else:
+            self.idle.append(connection)
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(connection_pool.pool, "ThreadedConnectionPool", FakePool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = ConnectionPool(0, 3, health_check_interval=30.0, checkout_timeout=1.0)
+
+    def warm(self, *connections):
+        # Check the connections out and back in, so they count as recently used and skip the idle ping
+        for connection in connections:
+            self.pool._pool.idle.append(connection)
+        checked_out = [self.pool.getconn() for _ in connections]
+        for connection in reversed(checked_out):
+            self.pool.putconn(connection)
+
+    def test_recently_used_connection_is_not_pinged(self):
+        connection = FakeConnection()
+        self.warm(connection)
+        pings = connection.pings
+
+        self.assertIs(self.pool.getconn(), connection)
+        self.assertEqual(connection.pings, pings)
+
+    def test_connections_after_a_dead_one_are_pinged_even_if_recently_used(self):
+        healthy, dead, closed = FakeConnection(), FakeConnection(), FakeConnection()
+        self.warm(healthy, dead, closed)
+        dead.alive = False
+        closed.closed = True
+        pings = healthy.pings
+
+        self.assertIs(self.pool.getconn(), healthy)
+
+        # The closed connection was dropped without a ping, which forced one on the dead connection and
+        # then on the healthy one
+        self.assertEqual(healthy.pings, pings + 1)
+        self.assertTrue(dead.closed)
+        self.assertEqual(self.pool.stats()["discarded"], 2)
+        self.assertEqual(self.pool.stats()["in_use"], 1)
+
+    def test_gives_up_when_no_connection_passes(self):
+        self.pool._pool.getconn = lambda: FakeConnection(alive=False)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            self.pool.getconn()
+
+        self.assertEqual(self.pool.stats()["discarded"], 4)
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+        # The failed checkout gave its slot back, so all three can still be checked out
+        self.pool._pool.getconn = FakeConnection
+        for _ in range(3):
+            self.pool.getconn()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import datetime
+import decimal
+import unittest
+from collections import namedtuple
+
+from exporter import arrow_batch, arrow_schema, copy_source, infer_compression, pa, select_query
+
+# The cursor.description attributes arrow_schema() reads
+Column = namedtuple("Column", "name type_code precision scale")
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class ArrowSchemaTest(unittest.TestCase):
+    def test_postgres_types_map_to_arrow_types(self):
+        schema = arrow_schema([
+            Column("flag", 16, None, None),
+            Column("big", 20, None, None),
+            Column("small", 21, None, None),
+            Column("number", 23, None, None),
+            Column("ratio", 700, None, None),
+            Column("precise", 701, None, None),
+            Column("blob", 17, None, None),
+            Column("day", 1082, None, None),
+            Column("at", 1114, None, None),
+            Column("at_tz", 1184, None, None),
+            Column("amount", 1700, 12, 2),
+        ])
+
+        self.assertEqual([field.type for field in schema], [
+            pa.bool_(), pa.int64(), pa.int16(), pa.int32(), pa.float32(), pa.float64(), pa.binary(),
+            pa.date32(), pa.timestamp("us"), pa.timestamp("us", tz="UTC"), pa.decimal128(12, 2),
+        ])
+        self.assertEqual(schema.names[0], "flag")
+
+    def test_unbounded_numeric_and_unknown_types_become_text(self):
+        schema = arrow_schema([
+            Column("amount", 1700, None, None),
+            Column("huge", 1700, 50, 0),
+            Column("user_id", 2950, None, None),
+        ])
+        self.assertEqual([field.type for field in schema], [pa.string()] * 3)
+
+
+@unittest.skipIf(pa is None, "pyarrow is not installed")
+class ArrowBatchTest(unittest.TestCase):
+    def test_values_are_converted_to_the_schema(self):
+        schema = arrow_schema([
+            Column("user_id", 2950, None, None),
+            Column("amount", 1700, 10, 2),
+            Column("at_tz", 1184, None, None),
+            Column("unbounded", 1700, None, None),
+        ])
+        eastern = datetime.timezone(datetime.timedelta(hours=-5))
+        rows = [
+            ("6b0c...", decimal.Decimal("12.50"), datetime.datetime(2023, 8, 1, 7, tzinfo=eastern),
+             decimal.Decimal("1.5")),
+            (None, None, None, None),
+        ]
+
+        batch = arrow_batch(rows, schema)
+
+        self.assertEqual(batch.num_rows, 2)
+        self.assertEqual(batch.column(0).to_pylist(), ["6b0c...", None])
+        self.assertEqual(batch.column(1).to_pylist(), [decimal.Decimal("12.50"), None])
+        self.assertEqual(batch.column(2).to_pylist()[0],
+                         datetime.datetime(2023, 8, 1, 12, tzinfo=datetime.timezone.utc))
+        self.assertEqual(batch.column(3).to_pylist(), ["1.5", None])
+
+    def test_json_and_array_values_are_written_as_json(self):
+        schema = arrow_schema([
+            Column("payload", 3802, None, None),
+            Column("tags", 1009, None, None),
+            Column("days", 1182, None, None),
+        ])
+        rows = [({"a": 1, "b": [True, None]}, ["x", "y"], [datetime.date(2023, 8, 1)])]
+
+        batch = arrow_batch(rows, schema)
+
+        self.assertEqual(batch.column(0).to_pylist(), ['{"a": 1, "b": [true, null]}'])
+        self.assertEqual(batch.column(1).to_pylist(), ['["x", "y"]'])
+        self.assertEqual(batch.column(2).to_pylist(), ['["2023-08-01"]'])
+
+    def test_all_null_batches_keep_the_schema(self):
+        schema = arrow_schema([Column("number", 23, None, None), Column("day", 1082, None, None)])
+        batch = arrow_batch([(None, None)], schema)
+
+        self.assertEqual(batch.schema, schema)
+
+
+class ExportHelpersTest(unittest.TestCase):
+    def test_select_query(self):
+        self.assertEqual(select_query("checking_details"), "SELECT * FROM checking_details")
+        self.assertEqual(select_query("public.users"), "SELECT * FROM public.users")
+        self.assertEqual(select_query("SELECT 1"), "SELECT 1")
+
+    def test_params_need_a_select_statement(self):
+        self.assertEqual(select_query("SELECT * FROM users WHERE user_id = %s", ("x",)),
+                         "SELECT * FROM users WHERE user_id = %s")
+        self.assertEqual(copy_source(None, "users"), "users")
+        with self.assertRaises(ValueError):
+            select_query("users", ("x",))
+        with self.assertRaises(ValueError):
+            copy_source(None, "users", {"user_id": "x"})
+
+    def test_compression_is_inferred_from_the_path(self):
+        self.assertEqual(infer_compression("ledger.csv.gz", None), "gzip")
+        self.assertEqual(infer_compression("ledger.csv.zst", None), "zstd")
+        self.assertIsNone(infer_compression("ledger.csv", None))
+        self.assertEqual(infer_compression("ledger.csv.gz", "zstd"), "zstd")
+
+
+if __name__ == "__main__":
+    unittest.main()
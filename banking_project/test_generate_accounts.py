@@ -0,0 +1,41 @@
+import csv
+import io
+import unittest
+
+import generate_accounts
+from account_numbers import FIRST_ACCOUNT_NUMBER
+
+
+def options(offset, users=5):
+    return {"users": users, "offset": offset, "transactions_per_account": 2.0, "history_days": 30,
+            "end_date": "2024-01-01", "seed": 0, "shard_size": 3, "first_names": generate_accounts.DEFAULT_FIRST_NAMES,
+            "last_names": generate_accounts.DEFAULT_LAST_NAMES}
+
+
+def rows(offset, table_name, users=5):
+    settings = options(offset, users)
+    text = b"".join(generate_accounts.generate_shard(shard, settings)[table_name]
+                    for shard in range(-(-users // settings["shard_size"])))
+    return list(csv.DictReader(io.StringIO(text.decode()), fieldnames=generate_accounts.TABLE_COLUMNS[table_name]))
+
+
+class GenerateShardTest(unittest.TestCase):
+    def test_rows_are_numbered_from_the_offset(self):
+        accounts = rows(10, "checking_accounts")
+
+        self.assertEqual([int(row["account_number"]) for row in accounts],
+                         list(range(FIRST_ACCOUNT_NUMBER + 10, FIRST_ACCOUNT_NUMBER + 15)))
+
+    def test_runs_with_different_offsets_do_not_collide(self):
+        first, second = rows(0, "users"), rows(5, "users")
+
+        for column in ("user_id", "ssn", "email", "phone_number"):
+            values = [row[column] for row in first + second]
+            self.assertEqual(len(set(values)), 10, column)
+        first_accounts, second_accounts = rows(0, "checking_accounts"), rows(5, "checking_accounts")
+        self.assertFalse({row["account_number"] for row in first_accounts} &
+                         {row["account_number"] for row in second_accounts})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+
+from psycopg2 import extensions
+
+from instrumentation import OVERFLOW_STATEMENT, Instrumentation, normalize_statement
+
+
+class FakeCursor:
+    rowcount = 1
+
+
+class PlanConnection:
+    """
+    An idle connection whose cursors answer EXPLAIN with a one-line plan and record what they ran.
+    """
+    def __init__(self):
+        self.info = self
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+        self.statements = []
+
+    def cursor(self, cursor_factory=None):
+        return self
+
+    def execute(self, statement):
+        self.statements.append(statement)
+
+    def fetchall(self):
+        return [("Seq Scan on users",)]
+
+    def close(self):
+        pass
+
+
+class PlannedCursor(FakeCursor):
+    def __init__(self):
+        self.connection = PlanConnection()
+
+
+class NormalizeStatementTest(unittest.TestCase):
+    def test_literals_become_placeholders(self):
+        self.assertEqual(
+            normalize_statement("SELECT * FROM users WHERE email = 'a@b.c' AND age > 21 LIMIT 10;"),
+            "SELECT * FROM users WHERE email = ? AND age > ? LIMIT ?;")
+        self.assertEqual(normalize_statement("SELECT 'it''s', E'\\n', -3.5, 1e10"), "SELECT ?, ...")
+
+    def test_statements_differing_only_in_values_share_a_key(self):
+        self.assertEqual(normalize_statement("SELECT * FROM t WHERE id IN (1, 2, 3)"),
+                         normalize_statement("SELECT * FROM t WHERE id IN (4, 5)"))
+        self.assertEqual(normalize_statement("SELECT * FROM t WHERE id IN (1, 2, 3)"),
+                         "SELECT * FROM t WHERE id IN (?, ...)")
+
+    def test_multi_row_values_keep_only_the_first_row(self):
+        query = "INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'), (3, 'z');"
+        self.assertEqual(normalize_statement(query), "INSERT INTO t (a, b) VALUES (?, ...), ...;")
+        self.assertEqual(normalize_statement("INSERT INTO t (id, a) VALUES (uuid_generate_v4(), 1), "
+                                             "(uuid_generate_v4(), 2)"),
+                         "INSERT INTO t (id, a) VALUES (uuid_generate_v4(), ?), ...")
+
+    def test_identifiers_and_parameters_are_kept(self):
+        self.assertEqual(normalize_statement("EXECUTE stmt_get_1 (%s);"), "EXECUTE stmt_get_1 (%s);")
+        self.assertEqual(normalize_statement("SELECT $1, t2.col3 FROM t2"), "SELECT $1, t2.col3 FROM t2")
+
+    def test_whitespace_bytes_and_length(self):
+        self.assertEqual(normalize_statement(b"SELECT\n   1\n"), "SELECT ?")
+        self.assertEqual(len(normalize_statement("SELECT " + "x, " * 500)), 300)
+
+
+class InstrumentationTest(unittest.TestCase):
+    def test_distinct_statements_are_capped(self):
+        instrumentation = Instrumentation(slow_query_threshold=60, max_statements=2)
+        for table in ("a", "b", "c", "d", "a"):
+            instrumentation.record_statement(FakeCursor(), f"SELECT * FROM {table} WHERE id = 1", 0.01)
+
+        statements = instrumentation.stats()["statements"]
+        self.assertEqual(set(statements), {"SELECT * FROM a WHERE id = ?", "SELECT * FROM b WHERE id = ?",
+                                           OVERFLOW_STATEMENT})
+        self.assertEqual(statements["SELECT * FROM a WHERE id = ?"]["count"], 2)
+        self.assertEqual(statements[OVERFLOW_STATEMENT]["count"], 2)
+        self.assertEqual(statements[OVERFLOW_STATEMENT]["rows"], 2)
+
+    def test_slow_statements_are_logged(self):
+        instrumentation = Instrumentation(slow_query_threshold=0.5)
+        instrumentation.record_statement(FakeCursor(), "SELECT 1", 0.1)
+        instrumentation.record_statement(FakeCursor(), "SELECT 2", 0.7)
+
+        slow_queries = instrumentation.stats()["slow_queries"]
+        self.assertEqual([(entry["statement"], entry["seconds"]) for entry in slow_queries], [("SELECT ?", 0.7)])
+
+    def test_slow_select_is_explained(self):
+        instrumentation = Instrumentation(slow_query_threshold=0.5, explain_slow_queries=True)
+        cursor = PlannedCursor()
+        instrumentation.record_statement(cursor, "SELECT * FROM users WHERE age > %s", 0.7,
+                                         b"SELECT * FROM users WHERE age > 21")
+        instrumentation.record_statement(cursor, "UPDATE users SET age = 22", 0.7)
+
+        self.assertEqual(cursor.connection.statements,
+                         ["EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM users WHERE age > 21"])
+        self.assertEqual([entry["plan"] for entry in instrumentation.stats()["slow_queries"]],
+                         ["Seq Scan on users", None])
+
+    def test_declared_cursor_is_explained_as_its_query(self):
+        instrumentation = Instrumentation(slow_query_threshold=0.5, explain_slow_queries=True)
+        cursor = PlannedCursor()
+        # What psycopg2 sends for a named cursor (stream_query), and what a caller may write by hand
+        instrumentation.record_statement(cursor, "SELECT * FROM users", 0.7,
+                                         b'DECLARE "stream_1" CURSOR WITHOUT HOLD FOR SELECT * FROM users')
+        instrumentation.record_statement(cursor, "declare c no scroll cursor with hold for\n  SELECT 1", 0.7)
+
+        self.assertEqual(cursor.connection.statements, ["EXPLAIN (ANALYZE, BUFFERS) SELECT * FROM users",
+                                                        "EXPLAIN (ANALYZE, BUFFERS) SELECT 1"])
+        self.assertEqual([entry["plan"] for entry in instrumentation.stats()["slow_queries"]],
+                         ["Seq Scan on users"] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
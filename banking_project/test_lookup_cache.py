@@ -0,0 +1,115 @@
+import json
+import unittest
+from unittest import mock
+
+from lookup_cache import CacheListener, LookupCache, MISSING
+
+
+class LookupCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("lookup_cache.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LookupCache(max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire_after_ttl(self):
+        cache = LookupCache(ttl=60)
+        cache.put("a", 1)
+
+        self.now += 59.9
+        self.assertEqual(cache.get("a"), 1)
+        self.now += 0.1
+        self.assertIs(cache.get("a"), MISSING)
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["expirations"], stats["entries"]), (1, 1, 1, 0))
+
+    def test_put_again_restarts_the_ttl(self):
+        cache = LookupCache(ttl=60)
+        cache.put("a", 1)
+        self.now += 50
+        cache.put("a", 2)
+        self.now += 50
+        self.assertEqual(cache.get("a"), 2)
+
+    def test_invalidating_a_tag_drops_every_key_for_that_row(self):
+        cache = LookupCache()
+        user = {"user_id": "u1"}
+        cache.put(("user", "u1"), user, tags=[("user", "u1")])
+        cache.put(("email", "a@b.c"), user, tags=[("user", "u1")])
+        cache.put(("account", 7), {"checking_id": 7}, tags=[("account", 7), ("user", "u1")])
+        cache.put(("user", "u2"), {"user_id": "u2"}, tags=[("user", "u2")])
+
+        cache.invalidate(("user", "u1"))
+
+        self.assertIs(cache.get(("user", "u1")), MISSING)
+        self.assertIs(cache.get(("email", "a@b.c")), MISSING)
+        self.assertIs(cache.get(("account", 7)), MISSING)
+        self.assertEqual(cache.get(("user", "u2")), {"user_id": "u2"})
+        self.assertEqual(cache.stats()["invalidations"], 3)
+
+    def test_evicted_keys_leave_no_tags_behind(self):
+        cache = LookupCache(max_entries=1)
+        cache.put("a", 1, tags=["t"])
+        cache.put("b", 2, tags=["t"])
+        cache.invalidate("t")
+
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+    def test_lookups_racing_an_invalidation_are_not_cached(self):
+        cache = LookupCache()
+        version = cache.version
+        cache.invalidate(("user", "u1"))
+        cache.put(("user", "u1"), {"user_id": "u1"}, tags=[("user", "u1")], version=version)
+
+        self.assertIs(cache.get(("user", "u1")), MISSING)
+
+        cache.put(("user", "u1"), {"user_id": "u1"}, tags=[("user", "u1")], version=cache.version)
+        self.assertEqual(cache.get(("user", "u1")), {"user_id": "u1"})
+
+    def test_clear(self):
+        cache = LookupCache()
+        cache.put("a", 1, tags=["t"])
+        cache.clear()
+
+        self.assertIs(cache.get("a"), MISSING)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+class CacheListenerTest(unittest.TestCase):
+    def test_notifications_invalidate_the_changed_rows(self):
+        cache = LookupCache()
+        cache.put(("account", 7), {}, tags=[("account", 7)])
+        cache.put(("user", "u1"), {}, tags=[("user", "u1")])
+        cache.put(("user", "u2"), {}, tags=[("user", "u2")])
+        listener = CacheListener(cache)
+
+        listener._handle(json.dumps({"checking_id": 7, "user_id": "u1"}))
+
+        self.assertIs(cache.get(("account", 7)), MISSING)
+        self.assertIs(cache.get(("user", "u1")), MISSING)
+        self.assertEqual(cache.get(("user", "u2")), {})
+
+    def test_unreadable_notification_clears_the_cache(self):
+        cache = LookupCache()
+        cache.put(("user", "u1"), {}, tags=[("user", "u1")])
+        CacheListener(cache)._handle("not json")
+
+        self.assertEqual(cache.stats()["entries"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+
+from postgres import postgres
+
+
+class StatementCursorTest(unittest.TestCase):
+    POSITION = {"account": "8d7c9a52-5a57-4c8e-9f0e-2b8c1f0c6a11", "start": "2023-01-01", "end": None,
+                "date": "2023-03-31", "id": "0b6f3c1e-8f55-4a0a-9a6b-6f1f0ec2b7d4", "balance": -1250}
+
+    def test_cursor_round_trip(self):
+        token = postgres._encode_statement_cursor(self.POSITION)
+
+        self.assertEqual(postgres._decode_statement_cursor(token), self.POSITION)
+        # Safe to pass in a URL as is
+        self.assertNotRegex(token, r"[=+/]")
+
+    def test_tampered_cursor_is_rejected(self):
+        token = postgres._encode_statement_cursor(self.POSITION)
+        bad_balance = postgres._encode_statement_cursor(dict(self.POSITION, balance="lots"))
+        bad_date = postgres._encode_statement_cursor(dict(self.POSITION, date="yesterday"))
+        missing_id = postgres._encode_statement_cursor({key: value for key, value in self.POSITION.items()
+                                                        if key != "id"})
+        not_an_object = postgres._encode_statement_cursor(["2023-03-31", 0])
+
+        for tampered in (token[:-5], token[:10] + "!" + token[11:], "not a cursor", "", bad_balance, bad_date,
+                         missing_id, not_an_object):
+            self.assertIsNone(postgres._decode_statement_cursor(tampered), tampered)
+
+    def test_cursor_for_another_account_is_refused_before_querying(self):
+        db = postgres("localhost", "bank", "user", "")
+        db.connection = mock.Mock(closed=False)
+        token = postgres._encode_statement_cursor(self.POSITION)
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.assertIsNone(db.get_statement("11111111-2222-4333-8444-555555555555", start_date="2023-01-01",
+                                               cursor=token))
+            self.assertIsNone(db.get_statement(self.POSITION["account"], start_date="2023-02-01", cursor=token))
+
+        self.assertIn("does not belong to this account", output.getvalue())
+        db.connection.cursor.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest import mock
+
+from replica_router import ReplicaRouter, parse_endpoint, parse_lsn
+
+
+class FakeConnection:
+    """
+    Answers the replica status query with its current (lag seconds, replay LSN).
+    """
+    def __init__(self, lag=0.0, replay_lsn="0/100"):
+        self.lag = lag
+        self.replay_lsn = replay_lsn
+        self.status_queries = 0
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement):
+        self.status_queries += 1
+
+    def fetchone(self):
+        return self.lag, self.replay_lsn
+
+    def close(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+
+    def getconn(self):
+        return self.connection
+
+    def putconn(self, connection, close=False):
+        pass
+
+
+class ParseTest(unittest.TestCase):
+    def test_parse_lsn(self):
+        self.assertEqual(parse_lsn("0/16B3748"), 0x16B3748)
+        self.assertEqual(parse_lsn("1/0"), 1 << 32)
+        self.assertGreater(parse_lsn("1/0"), parse_lsn("0/FFFFFFFF"))
+        self.assertIsNone(parse_lsn(None))
+
+    def test_parse_endpoint(self):
+        self.assertEqual(parse_endpoint("replica1", "5432"), ("replica1", "5432"))
+        self.assertEqual(parse_endpoint("replica1:6432", "5432"), ("replica1", "6432"))
+        self.assertEqual(parse_endpoint(("replica1", 6432), "5432"), ("replica1", "6432"))
+
+
+class ReplicaRouterTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("replica_router.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def router(self, *connections, **kwargs):
+        router = ReplicaRouter([f"replica{index}" for index in range(len(connections))], **kwargs)
+        for replica, connection in zip(router.replicas, connections):
+            replica.pool = FakePool(connection)
+            replica.healthy = True
+        return router
+
+    def test_lagging_replica_is_skipped(self):
+        lagging, current = FakeConnection(lag=12.5), FakeConnection(lag=0.5)
+        router = self.router(lagging, current, max_lag=10)
+
+        for _ in range(3):
+            self.assertIs(router.acquire()[1], current)
+        self.assertEqual(router.stats()["replicas"][0]["lag"], 12.5)
+
+        # A lag of exactly max_lag is still acceptable
+        lagging.lag = 10.0
+        self.now += 5
+        self.assertIn(lagging, [router.acquire()[1] for _ in range(2)])
+
+    def test_all_replicas_lagging_falls_back_to_the_primary(self):
+        router = self.router(FakeConnection(lag=30), max_lag=10)
+
+        self.assertIsNone(router.acquire())
+        self.assertEqual(router.stats()["primary_reads"], 1)
+
+    def test_replica_must_have_replayed_the_callers_write(self):
+        connection = FakeConnection(replay_lsn="0/100")
+        router = self.router(connection)
+
+        self.assertIsNotNone(router.acquire(min_lsn=0x100))
+        self.assertIsNone(router.acquire(min_lsn=0x101))
+
+        # A position newer than the last one seen is checked again at once, not after status_interval
+        connection.replay_lsn = "0/200"
+        self.assertIsNotNone(router.acquire(min_lsn=0x101))
+
+    def test_primary_reports_no_replay_position(self):
+        router = self.router(FakeConnection(replay_lsn=None))
+
+        self.assertIsNotNone(router.acquire())
+        self.assertIsNone(router.acquire(min_lsn=1))
+
+    def test_status_is_refreshed_every_status_interval(self):
+        connection = FakeConnection()
+        router = self.router(connection, status_interval=5)
+
+        router.acquire()
+        router.acquire(min_lsn=0x50)
+        self.assertEqual(connection.status_queries, 1)
+
+        self.now += 5
+        router.acquire()
+        self.assertEqual(connection.status_queries, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+
+from schema_planner import SchemaChangePlan, parse_type
+
+# (column_name, data_type, max_length, is_nullable, is_primary_key), as returned by get_table_schema()
+USERS_COLUMNS = [
+    ("user_id", "uuid", None, False, True),
+    ("first_name", "character varying", 50, True, False),
+    ("email", "character varying", 100, True, False),
+    ("age", "integer", None, True, False),
+    ("notes", "text", None, False, False),
+]
+
+
+class ParseTypeTest(unittest.TestCase):
+    def test_aliases_are_normalized(self):
+        self.assertEqual(parse_type("VARCHAR(50)"), ("character varying", 50))
+        self.assertEqual(parse_type("int"), ("integer", None))
+        self.assertEqual(parse_type("timestamptz"), ("timestamp with time zone", None))
+
+    def test_unparseable_type_is_returned_lowercased(self):
+        self.assertEqual(parse_type(" NUMERIC(10,2) "), ("numeric(10,2)", None))
+
+
+class SchemaChangePlanTest(unittest.TestCase):
+    def plan(self):
+        return SchemaChangePlan("users", USERS_COLUMNS)
+
+    def test_changes_fold_into_one_alter_table(self):
+        plan = self.plan()
+        plan.add_column("nickname", "VARCHAR(20)")
+        plan.alter_column_type("age", "BIGINT")
+        plan.set_not_null("email")
+
+        self.assertEqual(plan.statements(), [
+            "ALTER TABLE users ADD COLUMN nickname VARCHAR(20), ALTER COLUMN age TYPE BIGINT, "
+            "ALTER COLUMN email SET NOT NULL;"
+        ])
+        self.assertEqual(plan.rewrites, ["age: integer -> BIGINT"])
+        self.assertEqual(plan.scans, ["email: SET NOT NULL"])
+
+    def test_renames_run_first_and_later_changes_see_the_new_name(self):
+        plan = self.plan()
+        plan.rename_column("first_name", "given_name")
+        plan.alter_column_type("given_name", "VARCHAR(50)")
+
+        self.assertEqual(plan.statements(), ["ALTER TABLE users RENAME COLUMN first_name TO given_name;"])
+        self.assertEqual(plan.sql(), "ALTER TABLE users RENAME COLUMN first_name TO given_name;")
+
+    def test_changes_already_in_place_are_skipped(self):
+        plan = self.plan()
+        plan.rename_column("email", "email")
+        plan.rename_column("surname", "first_name")
+        plan.alter_column_type("age", "INT")
+        plan.alter_column_type("first_name", "varchar(50)")
+        plan.set_not_null("notes")
+
+        self.assertTrue(plan.is_empty())
+        self.assertEqual(plan.statements(), [])
+
+    def test_varchar_widening_and_text_are_free_but_narrowing_rewrites(self):
+        plan = self.plan()
+        plan.alter_column_type("first_name", "VARCHAR(100)")
+        plan.alter_column_type("email", "TEXT")
+        self.assertEqual(plan.rewrites, [])
+
+        plan = self.plan()
+        plan.alter_column_type("first_name", "VARCHAR(20)")
+        plan.alter_column_type("notes", "VARCHAR(10)")
+        self.assertEqual(plan.rewrites, ["first_name: character varying -> VARCHAR(20)",
+                                         "notes: text -> VARCHAR(10)"])
+
+    def test_volatile_defaults_force_a_rewrite(self):
+        plan = self.plan()
+        plan.add_column("created", "TIMESTAMP DEFAULT now()")
+        plan.add_column("token", "UUID DEFAULT uuid_generate_v4()")
+        plan.add_column("seq", "INTEGER DEFAULT nextval('users_seq')")
+
+        self.assertEqual(plan.rewrites, ["ADD COLUMN token has a per-row default",
+                                         "ADD COLUMN seq has a per-row default"])
+
+    def test_without_columns_every_change_is_applied(self):
+        plan = SchemaChangePlan("users")
+        plan.rename_column("a", "b")
+        plan.alter_column_type("b", "TEXT")
+        plan.set_not_null("b")
+
+        self.assertEqual(plan.statements(), [
+            "ALTER TABLE users RENAME COLUMN a TO b;",
+            "ALTER TABLE users ALTER COLUMN b TYPE TEXT, ALTER COLUMN b SET NOT NULL;",
+        ])
+        self.assertEqual(plan.rewrites, ["b: -> TEXT"])
+
+    def test_describe_lists_costs(self):
+        plan = self.plan()
+        plan.alter_column_type("age", "BIGINT")
+        plan.set_not_null("age")
+
+        self.assertEqual(plan.describe(), "\n".join([
+            "Planned changes for 'users':",
+            "  ALTER TABLE users ALTER COLUMN age TYPE BIGINT, ALTER COLUMN age SET NOT NULL;",
+            "Forces a full table rewrite:",
+            "  age: integer -> BIGINT",
+            "Requires a full table scan:",
+            "  age: SET NOT NULL",
+        ]))
+
+
+if __name__ == "__main__":
+    unittest.main()
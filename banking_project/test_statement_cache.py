@@ -0,0 +1,100 @@
+import unittest
+
+from psycopg2 import errors
+
+from statement_cache import StatementCache
+
+
+class FakeConnection:
+    pass
+
+
+class FakeCursor:
+    """
+    Records the statements sent to it. The next EXECUTE raises 'fail_next' when it is set.
+    """
+    def __init__(self, connection=None):
+        self.connection = connection or FakeConnection()
+        self.statements = []
+        self.fail_next = None
+
+    def execute(self, statement, params=None):
+        self.statements.append(statement)
+        if statement.startswith("EXECUTE") and self.fail_next is not None:
+            error, self.fail_next = self.fail_next, None
+            raise error
+
+    def sent(self):
+        statements, self.statements = self.statements, []
+        return [statement.split(" AS ")[0] for statement in statements]
+
+
+class StatementCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = StatementCache(max_size=2)
+        self.cursor = FakeCursor()
+
+    def run_statement(self, key, params=()):
+        self.cache.execute(self.cursor, key, f"SELECT '{key}'", params)
+
+    def test_statements_are_prepared_once_per_connection(self):
+        self.run_statement("a", (1,))
+        self.run_statement("a", (2,))
+
+        self.assertEqual(self.cursor.sent(), ["PREPARE stmt_a", "EXECUTE stmt_a (%s);", "EXECUTE stmt_a (%s);"])
+        other = FakeCursor()
+        self.cache.execute(other, "a", "SELECT 'a'")
+        self.assertEqual(other.sent(), ["PREPARE stmt_a", "EXECUTE stmt_a;"])
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_least_recently_used_statement_is_evicted(self):
+        self.run_statement("a")
+        self.run_statement("b")
+        self.run_statement("a")
+        self.cursor.sent()
+
+        self.run_statement("c")
+
+        self.assertEqual(self.cursor.sent(), ["DEALLOCATE stmt_b;", "PREPARE stmt_c", "EXECUTE stmt_c;"])
+        self.run_statement("a")
+        self.assertEqual(self.cursor.sent(), ["EXECUTE stmt_a;"])
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_statement_is_prepared_again_after_its_result_type_changed(self):
+        self.run_statement("a")
+        self.cursor.fail_next = errors.FeatureNotSupported("cached plan must not change result type")
+        with self.assertRaises(errors.FeatureNotSupported):
+            self.run_statement("a")
+        self.cursor.sent()
+
+        self.run_statement("a")
+
+        self.assertEqual(self.cursor.sent(), ["DEALLOCATE stmt_a;", "PREPARE stmt_a", "EXECUTE stmt_a;"])
+
+    def test_statement_the_server_forgot_is_prepared_again(self):
+        self.run_statement("a")
+        self.cursor.fail_next = errors.InvalidSqlStatementName("prepared statement does not exist")
+        with self.assertRaises(errors.InvalidSqlStatementName):
+            self.run_statement("a")
+        self.cursor.sent()
+
+        self.run_statement("a")
+
+        self.assertEqual(self.cursor.sent(), ["PREPARE stmt_a", "EXECUTE stmt_a;"])
+
+    def test_invalidate_makes_every_statement_stale(self):
+        self.run_statement("a")
+        self.run_statement("b")
+        self.cursor.sent()
+
+        self.cache.invalidate()
+        self.run_statement("b")
+        self.run_statement("b")
+
+        self.assertEqual(self.cursor.sent(), ["DEALLOCATE stmt_b;", "PREPARE stmt_b", "EXECUTE stmt_b;",
+                                              "EXECUTE stmt_b;"])
+
+
+if __name__ == "__main__":
+    unittest.main()
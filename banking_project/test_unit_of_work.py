@@ -0,0 +1,162 @@
+import threading
+import unittest
+
+import psycopg2
+from psycopg2 import extensions
+
+from unit_of_work import GroupCommitter
+
+
+class FakeConnection:
+    """
+    Records the statements, commits and rollbacks sent to it. Statements containing 'fail' raise.
+    """
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.info = self
+        self.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+        self._lock = threading.Lock()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement):
+        with self.connection._lock:
+            self.connection.statements.append(statement)
+        if "fail" in statement:
+            raise psycopg2.DataError(statement)
+
+    def close(self):
+        pass
+
+
+def run(member, statement):
+    # What a postgres method does inside a transaction() block
+    with member.checkout() as connection:
+        connection.cursor().execute(statement)
+
+
+class GroupCommitterTest(unittest.TestCase):
+    def setUp(self):
+        self.connection = FakeConnection()
+        self.released = []
+        self.committer = GroupCommitter(lambda: self.connection, self.released.append, window=0.2)
+
+    def run_members(self, *blocks):
+        results = [None] * len(blocks)
+        errors = []
+
+        def worker(index, block):
+            try:
+                with self.committer.member() as member:
+                    block(member)
+            except Exception as e:
+                errors.append(e)
+            results[index] = member
+
+        threads = [threading.Thread(target=worker, args=(index, block)) for index, block in enumerate(blocks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+            self.assertFalse(thread.is_alive(), "member blocked")
+        return results, errors
+
+    def test_members_overlap_and_share_one_commit(self):
+        # Both blocks wait inside the group for each other, which deadlocks if members run one at a time
+        inside = threading.Barrier(2, timeout=5)
+
+        def block(name):
+            def body(member):
+                run(member, f"INSERT {name} 1")
+                inside.wait()
+                run(member, f"INSERT {name} 2")
+            return body
+
+        (first, second), errors = self.run_members(block("a"), block("b"))
+
+        self.assertEqual(errors, [])
+        self.assertTrue(first.committed and second.committed)
+        self.assertEqual(self.connection.commits, 1)
+        self.assertEqual(self.released, [self.connection])
+        self.assertEqual(self.committer.stats()["members_per_commit"], 2)
+        # Each call ran inside its own savepoint, released as soon as it finished
+        inserts = [statement for statement in self.connection.statements if statement.startswith("INSERT")]
+        self.assertEqual(sorted(inserts), ["INSERT a 1", "INSERT a 2", "INSERT b 1", "INSERT b 2"])
+        for index, statement in enumerate(self.connection.statements):
+            if statement.startswith("INSERT"):
+                self.assertTrue(self.connection.statements[index - 1].startswith("SAVEPOINT"))
+                self.assertTrue(self.connection.statements[index + 1].startswith("RELEASE SAVEPOINT"))
+
+    def test_failed_call_is_undone_alone(self):
+        inside = threading.Barrier(2, timeout=5)
+
+        def failing(member):
+            inside.wait()
+            try:
+                run(member, "INSERT fail")
+            except psycopg2.Error:
+                pass
+
+        def succeeding(member):
+            inside.wait()
+            run(member, "INSERT ok")
+
+        (failed, committed), errors = self.run_members(failing, succeeding)
+
+        self.assertEqual(errors, [])
+        self.assertFalse(failed.committed)
+        self.assertIsInstance(failed.error, psycopg2.DataError)
+        self.assertTrue(committed.committed)
+        self.assertEqual(self.connection.commits, 1)
+        self.assertIn(f"ROLLBACK TO SAVEPOINT {failed.savepoint};", self.connection.statements)
+
+    def test_member_failing_after_merged_work_rolls_back_the_group(self):
+        inside = threading.Barrier(2, timeout=5)
+
+        def failing(member):
+            run(member, "INSERT customer")
+            inside.wait()
+            raise ValueError("account could not be opened")
+
+        def other(member):
+            run(member, "INSERT other")
+            inside.wait()
+
+        (failed, other_member), errors = self.run_members(failing, other)
+
+        self.assertEqual([str(error) for error in errors], ["account could not be opened"])
+        self.assertFalse(failed.committed)
+        self.assertFalse(other_member.committed)
+        self.assertIn("account could not be opened", str(other_member.error))
+        self.assertEqual((self.connection.commits, self.connection.rollbacks), (0, 1))
+
+    def test_nested_member_joins_the_outer_block(self):
+        def nested(member):
+            with self.committer.member() as inner:
+                self.assertIs(inner, member)
+                run(inner, "INSERT nested")
+
+        (member,), errors = self.run_members(nested)
+
+        self.assertEqual(errors, [])
+        self.assertTrue(member.committed)
+        self.assertEqual(self.connection.commits, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
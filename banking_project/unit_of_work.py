@@ -0,0 +1,301 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import extensions
+
+
+class UnitOfWork:
+    def __init__(self, connection, savepoint):
+        """
+        State of one postgres.transaction() block.
+
+        Every block runs under its own savepoint, so a postgres method that has to undo its work can roll
+        back to the start of the block without ending the surrounding database transaction.
+
+        Args:
+            connection (connection): Connection every method in the block runs on.
+            savepoint (str): Savepoint taken when the block starts.
+        """
+        self.connection = connection
+        self.savepoint = savepoint
+        self.failed = False
+        self.committed = None
+        self.error = None
+        self.commit_result = None
+
+    def begin(self):
+        cursor = self.connection.cursor()
+        cursor.execute(f"SAVEPOINT {self.savepoint};")
+        cursor.close()
+
+    @contextmanager
+    def checkout(self):
+        """
+        Yield the block's connection for one postgres method call.
+        """
+        yield self.connection
+
+    def fail(self, error=None):
+        """
+        Undo everything done in the block so far and mark it to be rolled back when it ends.
+        """
+        self.failed = True
+        self.error = self.error or error
+        cursor = self.connection.cursor()
+        cursor.execute(f"ROLLBACK TO SAVEPOINT {self.savepoint};")
+        cursor.close()
+
+    def should_roll_back(self):
+        # A method that caught its own error can leave the transaction aborted without calling fail()
+        return self.failed or \
+            self.connection.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR
+
+
+class GroupMember(UnitOfWork):
+    def __init__(self, group, savepoint):
+        """
+        State of one transaction() block inside a commit group.
+
+        Members share the group's connection but only hold it for the length of one postgres method call
+        (checkout()), so their blocks overlap and a member's own code never holds up the others. Each call
+        runs under its own savepoint, so a call that fails is undone alone. Work from calls that succeeded
+        is already part of the group's transaction: if the member fails after that (merged is True), the
+        whole group is rolled back.
+
+        Args:
+            group (CommitGroup): The group the member belongs to.
+            savepoint (str): Savepoint name used for each of the member's calls.
+        """
+        super().__init__(group.connection, savepoint)
+        self.group = group
+        self.merged = False
+        self._depth = 0
+        self._call_open = False
+
+    def begin(self):
+        # Savepoints are taken per call in checkout(); one held for the whole block would also cover
+        # calls made by the other members in the meantime
+        pass
+
+    @contextmanager
+    def checkout(self):
+        with self.group.statement_lock:
+            self._depth += 1
+            try:
+                # A postgres method called from inside another one shares the outer call's savepoint
+                if self._depth > 1:
+                    yield self.connection
+                    return
+
+                try:
+                    self._execute(f"SAVEPOINT {self.savepoint};")
+                except psycopg2.Error as e:
+                    self.failed = True
+                    self.error = self.error or e
+                    raise
+                self._call_open = True
+                try:
+                    yield self.connection
+                except BaseException as e:
+                    self._undo_call(e)
+                    raise
+                if self.connection.info.transaction_status == extensions.TRANSACTION_STATUS_INERROR:
+                    # The method caught its own error without calling fail()
+                    self._undo_call()
+                elif self._call_open:
+                    self._call_open = False
+                    self._execute(f"RELEASE SAVEPOINT {self.savepoint};")
+                    self.merged = True
+            finally:
+                self._depth -= 1
+
+    def fail(self, error=None):
+        """
+        Undo the current call and mark the member to be rolled back when it ends.
+        """
+        self._undo_call(error)
+
+    def should_roll_back(self):
+        # The connection's status belongs to the whole group, so only this member's own failures count
+        return self.failed
+
+    def _undo_call(self, error=None):
+        self.failed = True
+        self.error = self.error or error
+        if self._call_open:
+            self._call_open = False
+            try:
+                self._execute(f"ROLLBACK TO SAVEPOINT {self.savepoint};", f"RELEASE SAVEPOINT {self.savepoint};")
+            except psycopg2.Error as e:
+                # The group's transaction can no longer be trusted, so none of it may commit
+                self.group.error = self.group.error or e
+
+    def _execute(self, *statements):
+        cursor = self.connection.cursor()
+        try:
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            cursor.close()
+
+
+class CommitGroup:
+    def __init__(self, connection, deadline):
+        self.connection = connection
+        self.deadline = deadline
+        self.statement_lock = threading.RLock()
+        self.members = 0
+        self.pending = 0
+        self.closing = False
+        self.done = False
+        self.error = None
+        self.commit_result = None
+
+
+class GroupCommitter:
+    def __init__(self, acquire, release, window=0.005, max_size=50, on_commit=None):
+        """
+        Share one database transaction, and so one commit and one WAL flush, between the transaction()
+        blocks of concurrent callers.
+
+        The first caller opens a group on its own connection; callers that arrive within window seconds
+        (up to max_size of them) join it. Members hold the group's connection one postgres method call at a
+        time (see GroupMember), so their blocks overlap. A failed call is undone alone, but a member that
+        fails after some of its calls succeeded rolls back the whole group, as that work can no longer be
+        told apart from the others'. When the window has closed and every member has finished, the last
+        one out commits for the whole group and every member returns with the outcome of that commit.
+
+        Args:
+            acquire (callable): Returns a connection for a new group.
+            release (callable): Takes back a group's connection after it commits.
+            window (float, optional): Seconds a group stays open to new members. Defaults to 0.005.
+            max_size (int, optional): Maximum members per group. Defaults to 50.
+            on_commit (callable, optional): Called with the connection after each successful group commit.
+                                            Its return value is handed to every member as commit_result.
+        """
+        self.acquire = acquire
+        self.release = release
+        self.window = window
+        self.max_size = max_size
+        self.on_commit = on_commit
+        self._cond = threading.Condition()
+        self._group = None
+        self._savepoint_ids = itertools.count(1)
+        self._groups = 0
+        self._commits = 0
+        self._members = 0
+        self._local = threading.local()
+
+    @contextmanager
+    def member(self):
+        """
+        Join the open group (or open one) and yield a UnitOfWork for the caller's block.
+        """
+        # A block nested inside a member's own block joins it
+        current = getattr(self._local, "member", None)
+        if current is not None:
+            yield current
+            return
+
+        group = self._join()
+        unit_of_work = GroupMember(group, f"unit_of_work_{next(self._savepoint_ids)}")
+        self._local.member = unit_of_work
+        try:
+            try:
+                yield unit_of_work
+            except BaseException as e:
+                unit_of_work.failed = True
+                unit_of_work.error = unit_of_work.error or e
+                raise
+            finally:
+                self._local.member = None
+                self._end_member(unit_of_work)
+        finally:
+            self._leave(group)
+            unit_of_work.committed = group.error is None and not unit_of_work.failed
+            unit_of_work.error = unit_of_work.error or group.error
+            unit_of_work.commit_result = group.commit_result
+
+    def stats(self):
+        """
+        Return group commit statistics.
+
+        Returns:
+            dict: Groups opened, commits issued, members served and the average members per commit.
+        """
+        with self._cond:
+            return {
+                "groups": self._groups,
+                "commits": self._commits,
+                "members": self._members,
+                "members_per_commit": self._members / self._commits if self._commits else 0.0,
+            }
+
+    def _usable(self, group):
+        return group is not None and not group.closing and group.members < self.max_size and \
+            time.monotonic() < group.deadline
+
+    def _join(self):
+        with self._cond:
+            if self._usable(self._group):
+                return self._enter(self._group)
+
+        # Opening a connection can block on the pool, so it happens outside the lock
+        connection = self.acquire()
+        with self._cond:
+            if self._usable(self._group):
+                self.release(connection)
+                return self._enter(self._group)
+            self._group = CommitGroup(connection, time.monotonic() + self.window)
+            self._groups += 1
+            return self._enter(self._group)
+
+    def _enter(self, group):
+        group.members += 1
+        group.pending += 1
+        self._members += 1
+        return group
+
+    def _end_member(self, unit_of_work):
+        # Calls that already succeeded are part of the group's transaction and cannot be undone alone
+        if unit_of_work.failed and unit_of_work.merged:
+            with self._cond:
+                group = unit_of_work.group
+                group.error = group.error or psycopg2.DatabaseError(
+                    f"Another transaction in the same commit group failed: {unit_of_work.error}")
+
+    def _leave(self, group):
+        with self._cond:
+            group.pending -= 1
+            self._cond.notify_all()
+            while not group.done:
+                ready = group.members >= self.max_size or time.monotonic() >= group.deadline
+                if group.pending == 0 and ready and not group.closing:
+                    group.closing = True
+                    if self._group is group:
+                        self._group = None
+                    break
+                self._cond.wait(timeout=max(0.0, group.deadline - time.monotonic()) or None)
+            else:
+                return
+
+        # This caller was the last one out: commit for the whole group, without holding the lock
+        try:
+            try:
+                if group.error is None:
+                    group.connection.commit()
+                else:
+                    group.connection.rollback()
+            except psycopg2.Error as e:
+                group.error = e
+                group.connection.rollback()
+            if group.error is None and self.on_commit is not None:
+                group.commit_result = self.on_commit(group.connection)
+        finally:
+            self.release(group.connection)
+            with self._cond:
+                self._commits += 1
+                group.done = True
+                self._cond.notify_all()
@@ -1,12 +1,17 @@
 import os
 import sys
 import boto3
+from boto3.s3.transfer import TransferConfig
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 
 # Get the directory of the Python script
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
+# Large files go up in 16 MB parts, 8 at a time, instead of boto3's 8 MB default parts
+MB = 1024 * 1024
+transfer_config = TransferConfig(multipart_threshold=64 * MB, multipart_chunksize=16 * MB, max_concurrency=8)
+
 
 def browse_files():
     """Opens a new finder window and allows the user to select files for upload. Closes program if Cancel button
@@ -135,7 +140,8 @@ while True:
                 aws_secret_access_key=secret_key
             )
             # Actual upload command
-            s3.meta.client.upload_file(file_path, bucket_name, f"productimages/{wasabiFileLocation}")
+            s3.meta.client.upload_file(file_path, bucket_name, f"productimages/{wasabiFileLocation}",
+                                       Config=transfer_config)
             upload_count += 1
 
             # Generic error handling if the file can't be uploaded
@@ -0,0 +1,234 @@
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Each top-level prefix is listed as one key range per character, so its LIST calls run in parallel
+SHARD_CHARACTERS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+
+def prefix_end(prefix):
+    """
+    Returns the smallest string greater than every string starting with prefix, or None for "".
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+
+
+class BucketInventory:
+
+    def __init__(self, client, bucket, path, max_workers=16, lock=None):
+        """
+        A local snapshot of a bucket's objects (key, size, ETag, last modified) kept in SQLite.
+
+        refresh() lists the bucket with many LIST calls in flight: every top-level prefix is split into
+        key ranges that are listed in parallel, and each range's rows are replaced as it finishes. Ranges
+        can be refreshed on their own, e.g. only those older than max_age. Counts, existence checks and key
+        listings are then answered from the snapshot without calling Wasabi.
+
+        Args:
+            client: A boto3 S3 client (thread-safe; shared by the listing workers).
+            bucket (str): The bucket to inventory.
+            path (str): SQLite file holding the snapshot. May be the upload manifest's file.
+            max_workers (int, optional): LIST calls in flight. Defaults to 16.
+            lock (threading.Lock, optional): Lock serializing use of the SQLite file, shared with the upload
+                                             manifest when both live in the same file. Defaults to a new lock.
+        """
+        self.client = client
+        self.bucket = bucket
+        self.max_workers = max_workers
+        self._lock = lock if lock is not None else threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS inventory (
+                key TEXT NOT NULL PRIMARY KEY,
+                size INTEGER NOT NULL,
+                etag TEXT NOT NULL,
+                last_modified REAL NOT NULL
+            )
+        """)
+        # One row per listed key range: keys after start_after, up to and including end_key
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS inventory_ranges (
+                prefix TEXT NOT NULL,
+                start_after TEXT NOT NULL,
+                end_key TEXT,
+                objects INTEGER NOT NULL,
+                refreshed_at REAL NOT NULL,
+                PRIMARY KEY (prefix, start_after)
+            )
+        """)
+        self._db.commit()
+
+    def refresh(self, prefixes=None, max_age=None):
+        """
+        Lists the bucket into the snapshot.
+
+        Args:
+            prefixes (list, optional): Only refresh these top-level prefixes (e.g. ["productimages/"]).
+                                       Defaults to None (discover and refresh every prefix).
+            max_age (float, optional): Skip key ranges refreshed less than this many seconds ago.
+                                       Defaults to None (refresh everything).
+
+        Returns:
+            int: Objects listed.
+        """
+        started = time.monotonic()
+        if prefixes is None:
+            prefixes = self._top_level_prefixes()
+
+        ranges = [keyRange for prefix in prefixes for keyRange in self._ranges(prefix)]
+        if max_age is not None:
+            ranges = [keyRange for keyRange in ranges if time.time() - self._refreshed_at(*keyRange[:2]) >= max_age]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            listed = sum(pool.map(lambda keyRange: self._refresh_range(*keyRange), ranges))
+
+        print(f"Inventory refreshed: {listed} objects in {len(ranges)} key ranges "
+              f"({time.monotonic() - started:.1f}s)")
+        return listed
+
+    def ensure_fresh(self, max_age):
+        """
+        Re-lists the key ranges listed more than max_age seconds ago, or the whole bucket if the snapshot
+        is empty. Costs nothing while the snapshot is fresh. max_age=None keeps a populated snapshot as is.
+
+        Returns:
+            int: Objects listed.
+        """
+        refreshedAt = self.refreshed_at()
+        if refreshedAt is None:
+            return self.refresh()
+        if max_age is not None and time.time() - refreshedAt >= max_age:
+            return self.refresh(max_age=max_age)
+        return 0
+
+    def refreshed_at(self):
+        """
+        Returns when the oldest part of the snapshot was listed (Unix time), or None if it is empty.
+        """
+        with self._lock:
+            return self._db.execute("SELECT MIN(refreshed_at) FROM inventory_ranges").fetchone()[0]
+
+    def count(self, prefix=""):
+        with self._lock:
+            query, params = self._prefix_filter(prefix)
+            return self._db.execute(f"SELECT COUNT(*) FROM inventory {query}", params).fetchone()[0]
+
+    def exists(self, key):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM inventory WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT key, size, etag, last_modified FROM inventory WHERE key = ?",
+                                   (key,)).fetchone()
+        return dict(zip(("key", "size", "etag", "last_modified"), row)) if row is not None else None
+
+    def objects(self, prefix=""):
+        """
+        Returns (key, size, etag, last_modified) tuples for every object under prefix, in key order.
+        """
+        with self._lock:
+            query, params = self._prefix_filter(prefix)
+            return self._db.execute(f"SELECT key, size, etag, last_modified FROM inventory {query} ORDER BY key",
+                                    params).fetchall()
+
+    def record(self, key, size, etag, last_modified=None):
+        """
+        Adds an object this process just uploaded, so the snapshot stays current between refreshes.
+        """
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO inventory (key, size, etag, last_modified) VALUES (?, ?, ?, ?)",
+                             (key, size, etag.strip('"'), last_modified or time.time()))
+            self._db.commit()
+
+    def remove(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM inventory WHERE key = ?", (key,))
+            self._db.commit()
+
+    def _top_level_prefixes(self):
+        prefixes = []
+        rootObjects = []
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Delimiter='/'):
+            prefixes.extend(commonPrefix['Prefix'] for commonPrefix in page.get('CommonPrefixes', []))
+            rootObjects.extend(page.get('Contents', []))
+
+        # Objects outside any prefix were all returned by this listing already, and prefixes it did not
+        # return no longer exist
+        with self._lock:
+            self._db.execute("DELETE FROM inventory WHERE instr(key, '/') = 0")
+            self._store(rootObjects)
+            stored = {row[0] for row in self._db.execute(
+                "SELECT DISTINCT substr(key, 1, instr(key, '/')) FROM inventory WHERE instr(key, '/') > 0")}
+            for prefix in stored - set(prefixes):
+                self._db.execute("DELETE FROM inventory WHERE key >= ? AND key < ?", (prefix, prefix_end(prefix)))
+                self._db.execute("DELETE FROM inventory_ranges WHERE prefix = ?", (prefix,))
+            self._db.commit()
+        return prefixes
+
+    @staticmethod
+    def _ranges(prefix):
+        # (prefix, start_after, end_key) covering every key under prefix exactly once
+        boundaries = [prefix + character for character in SHARD_CHARACTERS]
+        starts = [""] + boundaries
+        ends = boundaries + [None]
+        return [(prefix, start, end) for start, end in zip(starts, ends)]
+
+    def _refreshed_at(self, prefix, start_after):
+        with self._lock:
+            row = self._db.execute("SELECT refreshed_at FROM inventory_ranges WHERE prefix = ? AND start_after = ?",
+                                   (prefix, start_after)).fetchone()
+        return row[0] if row is not None else 0.0
+
+    def _refresh_range(self, prefix, start_after, end_key):
+        listed = []
+        kwargs = {'Bucket': self.bucket, 'Prefix': prefix}
+        if start_after:
+            kwargs['StartAfter'] = start_after
+
+        done = False
+        for page in self.client.get_paginator('list_objects_v2').paginate(**kwargs):
+            for obj in page.get('Contents', []):
+                if end_key is not None and obj['Key'] > end_key:
+                    done = True
+                    break
+                listed.append(obj)
+            if done:
+                break
+
+        # Replace the range's rows in one transaction, dropping objects deleted since the last listing
+        conditions, params = ["key >= ?"], [prefix]
+        if prefix_end(prefix) is not None:
+            conditions.append("key < ?")
+            params.append(prefix_end(prefix))
+        if start_after:
+            conditions.append("key > ?")
+            params.append(start_after)
+        if end_key is not None:
+            conditions.append("key <= ?")
+            params.append(end_key)
+
+        with self._lock:
+            self._db.execute(f"DELETE FROM inventory WHERE {' AND '.join(conditions)}", params)
+            self._store(listed)
+            self._db.execute("""
+                INSERT OR REPLACE INTO inventory_ranges (prefix, start_after, end_key, objects, refreshed_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (prefix, start_after, end_key, len(listed), time.time()))
+            self._db.commit()
+        return len(listed)
+
+    def _store(self, objects):
+        self._db.executemany("INSERT OR REPLACE INTO inventory (key, size, etag, last_modified) VALUES (?, ?, ?, ?)",
+                             [(obj['Key'], obj['Size'], obj['ETag'].strip('"'), obj['LastModified'].timestamp())
+                              for obj in objects])
+
+    @staticmethod
+    def _prefix_filter(prefix):
+        # A key range, so the primary key index answers prefix counts without a scan
+        if not prefix:
+            return "", ()
+        return "WHERE key >= ? AND key < ?", (prefix, prefix_end(prefix))
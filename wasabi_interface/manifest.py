@@ -0,0 +1,224 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+def part_number(key):
+    """
+    Returns the part number an object key or filename refers to: 'productimages/123.png' -> '123'.
+    """
+    return key.rsplit("/", 1)[-1].split(".")[0]
+
+
+class UploadManifest:
+
+    def __init__(self, path):
+        """
+        A persistent record of the objects uploaded to Wasabi, kept in a SQLite file.
+
+        Lookups are exact matches on an indexed key or part number, so part 123 is never mistaken for
+        41234. Each object carries its size, ETag and upload time. Safe to share between upload threads:
+        every use of the connection is serialized by lock, which other connections to the same file from
+        this process (the bucket inventory) share, and writes from other processes are waited on for up
+        to 30 seconds instead of failing with "database is locked".
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        # WAL lets a reader (e.g. a count from another process) run while uploads are being recorded
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                key TEXT NOT NULL PRIMARY KEY,
+                part_number TEXT NOT NULL,
+                size INTEGER,
+                etag TEXT,
+                uploaded_at REAL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS objects_part_number ON objects (part_number)")
+        # Multipart uploads in progress, so an interrupted upload resumes instead of starting over
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS multipart_uploads (
+                key TEXT NOT NULL PRIMARY KEY,
+                upload_id TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                part_size INTEGER NOT NULL,
+                started_at REAL NOT NULL
+            )
+        """)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS multipart_parts (
+                upload_id TEXT NOT NULL,
+                part_number INTEGER NOT NULL,
+                etag TEXT NOT NULL,
+                PRIMARY KEY (upload_id, part_number)
+            )
+        """)
+        # Content hashes of local files, valid while the file's size and mtime are unchanged
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                etag TEXT NOT NULL,
+                PRIMARY KEY (path, kind)
+            )
+        """)
+        self._db.commit()
+
+    @property
+    def lock(self):
+        return self._lock
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM objects").fetchone()[0]
+
+    def get(self, key):
+        """
+        Returns the stored record for an object key as a dict, or None.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT key, part_number, size, etag, uploaded_at FROM objects WHERE key = ?",
+                                   (key,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("key", "part_number", "size", "etag", "uploaded_at"), row))
+
+    def has_part(self, PN):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM objects WHERE part_number = ? LIMIT 1", (PN,)).fetchone() is not None
+
+    def part_numbers(self):
+        """
+        Returns every recorded part number as a set, for checking a whole directory in memory.
+        """
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT DISTINCT part_number FROM objects")}
+
+    def keys(self):
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT key FROM objects")}
+
+    def record(self, key, size=None, etag=None, uploaded_at=None):
+        self.record_many([(key, size, etag, uploaded_at)])
+
+    def record_many(self, objects):
+        """
+        Adds or updates (key, size, etag, uploaded_at) records in one transaction. uploaded_at is a Unix
+        timestamp and defaults to now.
+        """
+        now = time.time()
+        rows = [(key, part_number(key), size, etag.strip('"') if etag else etag,
+                 uploaded_at if uploaded_at is not None else now)
+                for key, size, etag, uploaded_at in objects]
+        with self._lock:
+            self._db.executemany("""
+                INSERT INTO objects (key, part_number, size, etag, uploaded_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET size = excluded.size, etag = excluded.etag,
+                                                uploaded_at = excluded.uploaded_at
+            """, rows)
+            self._db.commit()
+
+    def remove(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM objects WHERE key = ?", (key,))
+            self._db.commit()
+
+    def import_log(self, logPath, prefix="productimages/"):
+        """
+        Imports a Wasabi_UploadedPNS.txt log (one filename per line). Lines already in the manifest are
+        left as they are; size and ETag stay empty until the bucket is listed again.
+
+        Returns the number of new records.
+        """
+        if not os.path.exists(logPath):
+            return 0
+
+        with open(logPath, 'r') as f:
+            rows = [(f"{prefix}{line.strip()}", part_number(line.strip()), os.path.getmtime(logPath))
+                    for line in f if line.strip()]
+
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany("""
+                INSERT INTO objects (key, part_number, uploaded_at) VALUES (?, ?, ?) ON CONFLICT (key) DO NOTHING
+            """, rows)
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def pending_upload(self, key):
+        """
+        Returns the saved multipart upload for key as a dict, or None.
+        """
+        columns = ("key", "upload_id", "path", "size", "mtime", "part_size", "started_at")
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(columns)} FROM multipart_uploads WHERE key = ?",
+                                   (key,)).fetchone()
+        return dict(zip(columns, row)) if row is not None else None
+
+    def pending_uploads(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT key FROM multipart_uploads")]
+
+    def start_upload(self, key, upload_id, path, size, mtime, part_size):
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO multipart_uploads (key, upload_id, path, size, mtime, part_size, started_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, upload_id, path, size, mtime, part_size, time.time()))
+            self._db.commit()
+
+    def record_part(self, upload_id, part_number, etag):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO multipart_parts (upload_id, part_number, etag) VALUES (?, ?, ?)",
+                             (upload_id, part_number, etag))
+            self._db.commit()
+
+    def completed_parts(self, upload_id):
+        """
+        Returns {part number: ETag} for the parts of a multipart upload recorded so far.
+        """
+        with self._lock:
+            return dict(self._db.execute("SELECT part_number, etag FROM multipart_parts WHERE upload_id = ?",
+                                         (upload_id,)))
+
+    def finish_upload(self, key):
+        """
+        Forgets a multipart upload once it is completed or aborted.
+        """
+        with self._lock:
+            self._db.execute("""
+                DELETE FROM multipart_parts
+                WHERE upload_id IN (SELECT upload_id FROM multipart_uploads WHERE key = ?)
+            """, (key,))
+            self._db.execute("DELETE FROM multipart_uploads WHERE key = ?", (key,))
+            self._db.commit()
+
+    def cached_hash(self, path, kind, size, mtime):
+        """
+        Returns the stored hash of kind for path, or None if there is none or the file has changed since.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT etag FROM file_hashes WHERE path = ? AND kind = ? AND size = ? AND mtime = ?",
+                                   (path, kind, size, mtime)).fetchone()
+        return row[0] if row is not None else None
+
+    def store_hash(self, path, kind, size, mtime, etag):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO file_hashes (path, kind, size, mtime, etag) VALUES (?, ?, ?, ?, ?)",
+                             (path, kind, size, mtime, etag))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
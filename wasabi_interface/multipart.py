@@ -0,0 +1,193 @@
+import hashlib
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+MB = 1024 * 1024
+PART_SIZE = 16 * MB
+MIN_PART_SIZE = 5 * MB  # S3's minimum for every part but the last
+MAX_PARTS = 10000
+
+
+def choose_part_size(size, part_size=PART_SIZE):
+    """
+    Returns part_size, grown to whole megabytes where needed so the file fits in S3's 10,000 parts.
+    """
+    part_size = max(part_size, MIN_PART_SIZE)
+    if math.ceil(size / part_size) > MAX_PARTS:
+        part_size = math.ceil(size / MAX_PARTS / MB) * MB
+    return part_size
+
+
+def candidate_part_sizes(size, part_count, part_size=PART_SIZE):
+    """
+    Returns the part sizes, most likely first, that split a file of size bytes into part_count parts:
+    this uploader's, boto3's 8 MB default, and the smallest whole number of megabytes that fits (at least
+    S3's 5 MB minimum). An object's multipart ETag can only be reproduced with the part size it was uploaded with.
+    """
+    if part_count == 1:
+        return [max(size, MIN_PART_SIZE)]
+    smallest = max(math.ceil(size / part_count / MB) * MB, MIN_PART_SIZE)
+    candidates = [choose_part_size(size, part_size), 8 * MB, part_size, smallest]
+    return [candidate for candidate in dict.fromkeys(candidates)
+            if candidate >= MIN_PART_SIZE and math.ceil(size / candidate) == part_count]
+
+
+def file_md5(path):
+    """
+    Returns the hex MD5 of a file: the ETag S3 gives an object uploaded with a single PUT.
+    """
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(MB), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def multipart_etag(path, part_size):
+    """
+    Returns the ETag S3 gives a file uploaded in parts of part_size: the MD5 of the parts' MD5 digests,
+    followed by the part count.
+    """
+    digests = []
+    with open(path, 'rb') as f:
+        for part in iter(lambda: f.read(part_size), b''):
+            digests.append(hashlib.md5(part).digest())
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{max(1, len(digests))}"
+
+
+class MultipartUploader:
+
+    def __init__(self, client, bucket, manifest, part_size=PART_SIZE, max_concurrency=8):
+        """
+        Uploads large files in explicitly sized parts, several at a time, and resumes interrupted uploads.
+
+        The upload ID and every completed part are saved in the manifest as soon as S3 accepts them. Calling
+        upload() again for the same unchanged file continues the saved upload, sending only the parts S3
+        does not already have. Up to max_concurrency parts (part_size bytes each) are held in memory per file.
+
+        Args:
+            client: A boto3 S3 client (thread-safe; shared by the part workers).
+            bucket (str): The bucket to upload to.
+            manifest (UploadManifest): Where upload state is saved.
+            part_size (int, optional): Bytes per part. Defaults to 16 MB.
+            max_concurrency (int, optional): Parts uploaded at once for one file. Defaults to 8.
+        """
+        self.client = client
+        self.bucket = bucket
+        self.manifest = manifest
+        self.part_size = part_size
+        self.max_concurrency = max_concurrency
+
+    def upload(self, file, key):
+        """
+        Uploads file to key, resuming a saved upload of the same file if there is one. Returns the ETag.
+        """
+        stat = os.stat(file)
+        saved = self.manifest.pending_upload(key)
+        completed = None
+
+        if saved is not None:
+            if (saved["path"], saved["size"], saved["mtime"]) == (os.path.abspath(file), stat.st_size, stat.st_mtime):
+                completed = self._uploaded_parts(key, saved["upload_id"])
+            else:
+                # The file changed since the saved upload started; its parts are useless
+                self._abort(key, saved["upload_id"])
+            if completed is None:
+                self.manifest.finish_upload(key)
+
+        if completed is None:
+            part_size = choose_part_size(stat.st_size, self.part_size)
+            upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)['UploadId']
+            self.manifest.start_upload(key, upload_id, os.path.abspath(file), stat.st_size, stat.st_mtime, part_size)
+            completed = {}
+        else:
+            upload_id, part_size = saved["upload_id"], saved["part_size"]
+            print(f"Resuming upload of {key}: {len(completed)} parts already uploaded")
+
+        partCount = max(1, math.ceil(stat.st_size / part_size))
+        remaining = [n for n in range(1, partCount + 1) if n not in completed]
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            for partNumber, etag in zip(remaining, pool.map(
+                    lambda n: self._upload_part(file, key, upload_id, n, part_size), remaining)):
+                completed[partNumber] = etag
+
+        # If a part failed, pool.map raised above and the saved upload is left to resume from
+        response = self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id,
+            MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': completed[n]} for n in sorted(completed)]}
+        )
+        self.manifest.finish_upload(key)
+        self.manifest.record(key, stat.st_size, response['ETag'])
+
+        # The ETag is the file's hash for this part size, so a sync need not read the file again
+        if os.stat(file).st_mtime == stat.st_mtime:
+            self.manifest.store_hash(file, f"multipart-{part_size}", stat.st_size, stat.st_mtime,
+                                     response['ETag'].strip('"'))
+        return response['ETag']
+
+    def abort_abandoned(self, prefix="", older_than=24 * 3600):
+        """
+        Aborts multipart uploads under prefix that were started more than older_than seconds ago and
+        cannot be resumed from this manifest, so their stored parts stop being billed.
+
+        Returns the number of uploads aborted.
+        """
+        cutoff = time.time() - older_than
+        aborted = 0
+        paginator = self.client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for upload in page.get('Uploads', []):
+                if upload['Initiated'].timestamp() >= cutoff or self._resumable(upload['Key'], upload['UploadId']):
+                    continue
+                self._abort(upload['Key'], upload['UploadId'])
+                aborted += 1
+        return aborted
+
+    def _uploaded_parts(self, key, upload_id):
+        # S3 is the authority on which parts arrived; None means the upload no longer exists
+        completed = {}
+        try:
+            paginator = self.client.get_paginator('list_parts')
+            for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+                for part in page.get('Parts', []):
+                    completed[part['PartNumber']] = part['ETag']
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchUpload', '404'):
+                return None
+            raise
+
+        saved = self.manifest.completed_parts(upload_id)
+        for partNumber, etag in completed.items():
+            if saved.get(partNumber) != etag:
+                self.manifest.record_part(upload_id, partNumber, etag)
+        return completed
+
+    def _upload_part(self, file, key, upload_id, partNumber, part_size):
+        with open(file, 'rb') as f:
+            f.seek((partNumber - 1) * part_size)
+            body = f.read(part_size)
+        etag = self.client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=partNumber,
+                                       Body=body)['ETag']
+        self.manifest.record_part(upload_id, partNumber, etag)
+        return etag
+
+    def _resumable(self, key, upload_id):
+        saved = self.manifest.pending_upload(key)
+        if saved is None or saved["upload_id"] != upload_id or not os.path.exists(saved["path"]):
+            return False
+        stat = os.stat(saved["path"])
+        return (saved["size"], saved["mtime"]) == (stat.st_size, stat.st_mtime)
+
+    def _abort(self, key, upload_id):
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('NoSuchUpload', '404'):
+                raise
+        saved = self.manifest.pending_upload(key)
+        if saved is not None and saved["upload_id"] == upload_id:
+            self.manifest.finish_upload(key)
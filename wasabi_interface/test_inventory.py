@@ -0,0 +1,141 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from inventory import SHARD_CHARACTERS, BucketInventory, prefix_end
+
+
+class FakeS3Client:
+    """
+    Serves list_objects_v2 pages (Prefix, StartAfter, Delimiter) from an in-memory bucket.
+    """
+    def __init__(self, keys, page_size=2):
+        self.objects = {key: 1 for key in keys}
+        self.page_size = page_size
+        self.list_calls = 0
+
+    def get_paginator(self, operation):
+        assert operation == 'list_objects_v2'
+        return self
+
+    def paginate(self, Bucket, Prefix="", StartAfter="", Delimiter=None):
+        self.list_calls += 1
+        keys = sorted(key for key in self.objects if key.startswith(Prefix) and key > StartAfter)
+        contents, prefixes = [], []
+        for key in keys:
+            if Delimiter and Delimiter in key[len(Prefix):]:
+                commonPrefix = key[:key.index(Delimiter, len(Prefix)) + 1]
+                if commonPrefix not in prefixes:
+                    prefixes.append(commonPrefix)
+            else:
+                contents.append({'Key': key, 'Size': self.objects[key], 'ETag': f'"{key}"',
+                                 'LastModified': datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)})
+
+        for start in range(0, max(len(contents), 1), self.page_size):
+            page = {'Contents': contents[start:start + self.page_size]}
+            if start == 0:
+                page['CommonPrefixes'] = [{'Prefix': prefix} for prefix in prefixes]
+            yield page
+
+
+class RangeTest(unittest.TestCase):
+    def test_prefix_end(self):
+        self.assertEqual(prefix_end("productimages/"), "productimages0")
+        self.assertEqual(prefix_end("a"), "b")
+        self.assertIsNone(prefix_end(""))
+
+    def test_ranges_are_contiguous(self):
+        ranges = BucketInventory._ranges("p/")
+
+        self.assertEqual(len(ranges), len(SHARD_CHARACTERS) + 1)
+        self.assertEqual(ranges[0], ("p/", "", "p/0"))
+        self.assertEqual(ranges[-1], ("p/", "p/z", None))
+        for (_, _, end), (_, start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+
+    def test_every_key_falls_in_exactly_one_range(self):
+        keys = ["p/", "p/-1", "p/0", "p/0a", "p/1", "p/9zz", "p/A", "p/Zz", "p/a.png", "p/z", "p/zz", "p/~"]
+        ranges = BucketInventory._ranges("p/")
+
+        for key in keys:
+            matches = [keyRange for keyRange in ranges
+                       if key > keyRange[1] and (keyRange[2] is None or key <= keyRange[2])]
+            self.assertEqual(len(matches), 1, key)
+
+
+class BucketInventoryTest(unittest.TestCase):
+    KEYS = ["root.txt", "productimages/-1.png", "productimages/0.png", "productimages/07.png",
+            "productimages/123.png", "productimages/Z.png", "productimages/zz.png", "productimages/~.png",
+            "other/1.png", "other/2.png"]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.client = FakeS3Client(self.KEYS)
+        self.inventory = BucketInventory(self.client, "bucket", os.path.join(directory.name, "inventory.sqlite3"),
+                                         max_workers=4)
+        self.addCleanup(self.inventory._db.close)
+
+    def test_refresh_lists_every_object_once(self):
+        self.assertEqual(self.inventory.refresh(), 9)
+
+        self.assertEqual([row[0] for row in self.inventory.objects()], sorted(self.KEYS))
+        self.assertEqual(self.inventory.count("productimages/"), 7)
+        self.assertEqual(self.inventory.count("other/"), 2)
+        self.assertTrue(self.inventory.exists("root.txt"))
+        self.assertEqual(self.inventory.get("other/1.png")["etag"], "other/1.png")
+
+    def test_refresh_drops_deleted_objects_and_prefixes(self):
+        self.inventory.refresh()
+        del self.client.objects["productimages/123.png"]
+        del self.client.objects["other/1.png"]
+        del self.client.objects["other/2.png"]
+        del self.client.objects["root.txt"]
+
+        self.inventory.refresh()
+
+        self.assertEqual(self.inventory.count(), 6)
+        self.assertFalse(self.inventory.exists("productimages/123.png"))
+        self.assertEqual(self.inventory.count("other/"), 0)
+
+    def test_refresh_one_prefix(self):
+        self.inventory.refresh(prefixes=["other/"])
+
+        self.assertEqual(self.inventory.count(), 2)
+        self.assertEqual(self.inventory.count("productimages/"), 0)
+
+    def test_ensure_fresh_only_lists_stale_ranges(self):
+        now = 1000.0
+        with mock.patch("inventory.time.time", side_effect=lambda: now):
+            self.inventory.ensure_fresh(max_age=60)
+            self.assertEqual(self.inventory.count(), 10)
+            self.assertEqual(self.inventory.refreshed_at(), 1000.0)
+
+            calls = self.client.list_calls
+            self.client.objects["productimages/new.png"] = 1
+            now += 30
+            self.assertEqual(self.inventory.ensure_fresh(max_age=60), 0)
+            self.assertEqual(self.client.list_calls, calls)
+            self.assertFalse(self.inventory.exists("productimages/new.png"))
+
+            now += 30
+            self.inventory.ensure_fresh(max_age=60)
+            self.assertTrue(self.inventory.exists("productimages/new.png"))
+            self.assertEqual(self.inventory.refreshed_at(), 1060.0)
+
+            now += 3600
+            self.assertEqual(self.inventory.ensure_fresh(max_age=None), 0)
+
+    def test_recorded_uploads_are_visible_before_a_refresh(self):
+        self.inventory.record("productimages/9.png", 5, '"abc"')
+
+        self.assertTrue(self.inventory.exists("productimages/9.png"))
+        self.assertEqual(self.inventory.get("productimages/9.png")["etag"], "abc")
+        self.inventory.remove("productimages/9.png")
+        self.assertFalse(self.inventory.exists("productimages/9.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
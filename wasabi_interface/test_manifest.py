@@ -0,0 +1,93 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from inventory import BucketInventory
+from manifest import UploadManifest, part_number
+
+
+class PartNumberTest(unittest.TestCase):
+    def test_part_number(self):
+        self.assertEqual(part_number("productimages/123.png"), "123")
+        self.assertEqual(part_number("41234.jpg"), "41234")
+        self.assertEqual(part_number("a/b/77"), "77")
+
+
+class UploadManifestTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.manifest = UploadManifest(os.path.join(self.directory, "manifest.sqlite3"))
+        self.addCleanup(self.manifest.close)
+
+    def write_log(self, lines):
+        logPath = os.path.join(self.directory, "Wasabi_UploadedPNS.txt")
+        with open(logPath, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return logPath
+
+    def test_import_log(self):
+        logPath = self.write_log(["123.png", "41234.png", "", "  9.jpg  "])
+
+        self.assertEqual(self.manifest.import_log(logPath), 3)
+        self.assertEqual(self.manifest.keys(), {"productimages/123.png", "productimages/41234.png",
+                                                "productimages/9.jpg"})
+        self.assertEqual(self.manifest.part_numbers(), {"123", "41234", "9"})
+
+        record = self.manifest.get("productimages/123.png")
+        self.assertIsNone(record["size"])
+        self.assertIsNone(record["etag"])
+        self.assertEqual(record["uploaded_at"], os.path.getmtime(logPath))
+
+    def test_part_numbers_match_exactly(self):
+        self.manifest.import_log(self.write_log(["41234.png"]))
+
+        self.assertTrue(self.manifest.has_part("41234"))
+        self.assertFalse(self.manifest.has_part("123"))
+        self.assertFalse(self.manifest.has_part("4123"))
+
+    def test_import_keeps_existing_records(self):
+        self.manifest.record("productimages/123.png", size=10, etag='"abc"', uploaded_at=1.0)
+
+        self.assertEqual(self.manifest.import_log(self.write_log(["123.png", "456.png"])), 1)
+        self.assertEqual(self.manifest.get("productimages/123.png"),
+                         {"key": "productimages/123.png", "part_number": "123", "size": 10, "etag": "abc",
+                          "uploaded_at": 1.0})
+        self.assertEqual(self.manifest.import_log(self.write_log(["123.png", "456.png"])), 0)
+        self.assertEqual(len(self.manifest), 2)
+
+    def test_import_with_a_prefix_and_a_missing_log(self):
+        self.assertEqual(self.manifest.import_log(self.write_log(["1.png"]), prefix="other/"), 1)
+        self.assertIn("other/1.png", self.manifest)
+        self.assertEqual(self.manifest.import_log(os.path.join(self.directory, "missing.txt")), 0)
+
+    def test_writers_sharing_the_file_wait_instead_of_failing(self):
+        self.assertEqual(self.manifest._db.execute("PRAGMA busy_timeout").fetchone()[0], 30000)
+
+        inventory = BucketInventory(None, "bucket", self.manifest.path, lock=self.manifest.lock)
+        self.addCleanup(inventory._db.close)
+        errors = []
+
+        def write(record, offset):
+            try:
+                for n in range(200):
+                    record(f"productimages/{offset + n}.png", n, "etag")
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(self.manifest.record, offset)) for offset in (0, 1000)]
+        threads += [threading.Thread(target=write, args=(inventory.record, offset)) for offset in (2000, 3000)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.manifest), 400)
+        self.assertEqual(inventory.count(), 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
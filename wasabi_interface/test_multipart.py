@@ -0,0 +1,65 @@
+import math
+import os
+import tempfile
+import unittest
+
+from multipart import MAX_PARTS, MB, MIN_PART_SIZE, PART_SIZE, candidate_part_sizes, choose_part_size, file_md5, \
+    multipart_etag
+
+
+class ChoosePartSizeTest(unittest.TestCase):
+    def test_default_part_size(self):
+        self.assertEqual(choose_part_size(100 * MB), PART_SIZE)
+        self.assertEqual(choose_part_size(1), PART_SIZE)
+
+    def test_part_size_is_at_least_the_s3_minimum(self):
+        self.assertEqual(choose_part_size(100 * MB, part_size=MB), MIN_PART_SIZE)
+
+    def test_part_size_grows_to_fit_the_part_limit(self):
+        self.assertEqual(choose_part_size(MAX_PARTS * PART_SIZE), PART_SIZE)
+
+        size = MAX_PARTS * PART_SIZE + 1
+        partSize = choose_part_size(size)
+        self.assertEqual(partSize, 17 * MB)
+        self.assertLessEqual(math.ceil(size / partSize), MAX_PARTS)
+
+        size = 5 * 1024 * 1024 * MB  # 5 TB, S3's largest object
+        self.assertLessEqual(math.ceil(size / choose_part_size(size)), MAX_PARTS)
+        self.assertEqual(choose_part_size(size) % MB, 0)
+
+
+class CandidatePartSizesTest(unittest.TestCase):
+    def test_single_part(self):
+        self.assertEqual(candidate_part_sizes(3, 1), [MIN_PART_SIZE])
+        self.assertEqual(candidate_part_sizes(12 * MB, 1), [12 * MB])
+
+    def test_candidates_give_the_part_count(self):
+        self.assertEqual(candidate_part_sizes(100 * MB, 7), [16 * MB, 15 * MB])
+        self.assertEqual(candidate_part_sizes(100 * MB, 13), [8 * MB])
+        self.assertEqual(candidate_part_sizes(100 * MB, 50), [])
+
+    def test_smallest_candidate_is_at_least_the_s3_minimum(self):
+        self.assertEqual(candidate_part_sizes(10 * MB + 1000, 3), [MIN_PART_SIZE])
+
+
+class MultipartEtagTest(unittest.TestCase):
+    def write(self, data):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "part.bin")
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_known_etags(self):
+        # ETags S3 returned for these files uploaded in 5 MB parts
+        path = self.write(b"a" * (5 * MB) + b"b" * (5 * MB) + b"c" * 1000)
+        self.assertEqual(multipart_etag(path, 5 * MB), "b4e2c63f76e3d886f8231e0deacb094b-3")
+
+        path = self.write(b"abc")
+        self.assertEqual(multipart_etag(path, 5 * MB), "af5da9f45af7a300e3aded972f8ff687-1")
+        self.assertEqual(file_md5(path), "900150983cd24fb0d6963f7d28e17f72")
+
+
+if __name__ == "__main__":
+    unittest.main()
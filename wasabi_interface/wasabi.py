@@ -1,81 +1,340 @@
 import boto3
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.config import Config
+from inventory import BucketInventory
+from manifest import UploadManifest
+from multipart import MB, PART_SIZE, MultipartUploader, candidate_part_sizes, file_md5, multipart_etag
+
+
+ENDPOINT_URL = 'https://s3.US-central-1.wasabisys.com'
+UPLOAD_LOG = 'Wasabi_UploadedPNS.txt'
+MANIFEST_NAME = 'Wasabi_Manifest.sqlite3'
+INVENTORY_MAX_AGE = 15 * 60  # seconds a part of the bucket inventory is trusted before it is listed again
+
+
+class UploadProgress:
+
+    def __init__(self, total):
+        """
+        Thread-safe counters for a batch of uploads, with aggregate throughput.
+        """
+        self.total = total
+        self.uploaded = 0
+        self.failed = 0
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, size=0, failed=False):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.uploaded += 1
+                self.bytes += size
+
+    def summary(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            return (f"{self.uploaded + self.failed}/{self.total} processed, {self.uploaded} uploaded, "
+                    f"{self.failed} failed, {self.uploaded / elapsed:.1f} files/s, "
+                    f"{self.bytes / elapsed / 1024 / 1024:.2f} MB/s")
+
 
 class WasabiUploader:
 
-    def __init__(self, directory):
+    def __init__(self, directory, endpoint_url=ENDPOINT_URL, max_pool_connections=50, manifest_path=None,
+                 multipart_threshold=64 * MB, part_size=PART_SIZE, part_concurrency=8, list_workers=16):
         self.directory = directory
         self.session = boto3.Session(profile_name="default")
         self.credentials = self.session.get_credentials()
         self.aws_access_key_id = self.credentials.access_key
         self.aws_secret_access_key = self.credentials.secret_key
         self.s3 = boto3.resource('s3',
-                                 endpoint_url='https://s3.US-central-1.wasabisys.com',
+                                 endpoint_url=endpoint_url,
                                  aws_access_key_id=self.aws_access_key_id,
                                  aws_secret_access_key=self.aws_secret_access_key
                                  )
 
         self.mpdb = self.s3.Bucket('mpdb')
 
-    def create_list_of_uploaded_parts(self, directory):
+        # boto3 clients are thread-safe (resources are not), so every upload worker shares this one and its
+        # connection pool
+        self.client = self.session.client('s3',
+                                          endpoint_url=endpoint_url,
+                                          config=Config(max_pool_connections=max_pool_connections)
+                                          )
+        self._log_lock = threading.Lock()
+
+        # The manifest decides what has been uploaded; a new one starts from the existing text log
+        self.manifest = UploadManifest(manifest_path or os.path.join(directory, MANIFEST_NAME))
+        if len(self.manifest) == 0:
+            self.manifest.import_log(f'{directory}/{UPLOAD_LOG}')
+
+        # Files of at least multipart_threshold bytes go up in resumable, parallel parts
+        self.multipart_threshold = multipart_threshold
+        self.multipart = MultipartUploader(self.client, self.mpdb.name, self.manifest, part_size=part_size,
+                                           max_concurrency=part_concurrency)
+
+        # A snapshot of the bucket listing, kept in the manifest's file and refreshed with parallel LIST calls
+        self.inventory = BucketInventory(self.client, self.mpdb.name, self.manifest.path, max_workers=list_workers,
+                                         lock=self.manifest.lock)
+
+    def create_list_of_uploaded_parts(self, directory, max_age=None):
+        """
+        Rebuilds the part number log and the manifest from a fresh inventory of the bucket.
+
+        Args:
+            directory (str): Path inside the directory holding the log.
+            max_age (float, optional): Only re-list key ranges of the inventory older than this many seconds.
+                                       Defaults to None (re-list the whole bucket).
+        """
         print("Working...")
+        self.inventory.refresh(max_age=max_age)
         UploadedPNsFileLocation = "/".join(
             directory.split("/", )[:-1])
 
         with open(f'{UploadedPNsFileLocation}/Wasabi_UploadedPNS.txt', 'a+') as f:
             f.seek(0)
-            existing_contents = f.read()
+            existing_items = set(f.read().splitlines())
 
-            for obj in self.mpdb.objects.all():
-                item = obj.key.split("/", 1)[1]
-                if item not in existing_contents:
+            listed = []
+            for key, size, etag, lastModified in self.inventory.objects():
+                listed.append((key, size, etag, lastModified))
+                item = key.split("/", 1)[1]
+                if item not in existing_items:
+                    existing_items.add(item)
                     f.write(f"{item}\n")
+
+                if len(listed) == 1000:
+                    self.manifest.record_many(listed)
+                    listed = []
+            self.manifest.record_many(listed)
         f.close()
 
         print(f"Wasabi Data processed, PN file created. "
               f"Available at: {UploadedPNsFileLocation}/Wasabi_UploadedPNS.txt'")
 
-    def upload_photos(self):
-        recordNumber = 0
-        recordsAdded = 0
+    def upload_photos(self, max_workers=16, progress_every=20):
+        """
+        Uploads every file in the directory whose part number is not in the manifest, max_workers at a time.
+
+        Workers share one S3 client and record each file in the manifest (and the text log) as soon as its
+        upload finishes, so an interrupted run keeps everything uploaded so far. Set max_workers=1 to
+        upload one file at a time.
+        """
+        logPath = f'{self.directory}/{UPLOAD_LOG}'
+
+        # Exact part number matches against a set built once per run
+        uploadedPNs = self.manifest.part_numbers()
 
+        pending = []
         for filename in os.listdir(self.directory):
+            file = os.path.join(self.directory, filename)
+            PN = filename.split(".")[0]
+            if filename == UPLOAD_LOG or filename.startswith(MANIFEST_NAME):
+                continue
+            if os.path.isfile(file) and PN not in uploadedPNs:
+                pending.append(filename)
 
-            recordNumber += 1
+        print(f"{len(pending)} images to upload with {max_workers} workers...")
+        progress = UploadProgress(len(pending))
 
-            with open(f'{self.directory}/Wasabi_UploadedPNS.txt', 'a+') as f:
+        with open(logPath, 'a') as log, ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(self._upload_photo, filename, log): filename
+                       for filename in pending}
 
-                f.seek(0)
-                existing_contents = f.read()
-                file = os.path.join(self.directory, filename)
+            for recordNumber, future in enumerate(as_completed(futures), start=1):
+                filename = futures[future]
                 PN = filename.split(".")[0]
+                try:
+                    progress.record(future.result())
+                except Exception as e:
+                    progress.record(failed=True)
+                    print(f"failed to upload {PN} to Wasabi. Error: {e}")
+
+                if recordNumber % progress_every == 0:  # only printing every 20th record for confirmation of upload
+                    print(f"Uploading to Wasabi: {progress.summary()}")
+
+        print(f"Complete! Records Added: {progress.uploaded} ({progress.summary()})")
+
+    def upload_large_file(self, file, key=None):
+        """
+        Uploads one large file in parallel parts, resuming where an earlier attempt stopped.
+
+        Args:
+            file (str): Path of the local file.
+            key (str, optional): Object key. Defaults to productimages/<filename>.
+        """
+        key = key or f"productimages/{os.path.basename(file)}"
+        try:
+            etag = self.multipart.upload(file, key)
+            print(f"{key} uploaded to Wasabi (ETag {etag})")
+            return etag
+        except Exception as e:
+            print(f"failed to upload {key} to Wasabi, it will resume on the next attempt. Error: {e}")
+
+    def abort_abandoned_uploads(self, older_than_hours=24, prefix=""):
+        """
+        Aborts multipart uploads older than older_than_hours that this manifest cannot resume, so Wasabi stops
+        storing their orphaned parts.
+        """
+        aborted = self.multipart.abort_abandoned(prefix=prefix, older_than=older_than_hours * 3600)
+        print(f"{aborted} abandoned multipart uploads aborted")
+        return aborted
+
+    def sync(self, directory=None, prefix="productimages/", delete=False, max_workers=16, hash_workers=8,
+             dry_run=False):
+        """
+        Makes the bucket prefix match a local directory (and its subdirectories), uploading only what changed.
+
+        A file is uploaded when its key is missing remotely, its size differs, or its content hash differs
+        from the object's ETag. Hashes are computed in parallel, only for files whose size matches, and are
+        cached in the manifest until the file's size or mtime changes, so an unchanged tree is not re-read.
+
+        Args:
+            directory (str, optional): Local directory to sync. Defaults to the uploader's directory.
+            prefix (str, optional): Bucket prefix mirrored from the directory. Defaults to "productimages/".
+            delete (bool, optional): Delete objects under prefix with no local file. Defaults to False.
+            max_workers (int, optional): Concurrent uploads. Defaults to 16.
+            hash_workers (int, optional): Concurrent hash computations. Defaults to 8.
+            dry_run (bool, optional): Only report what would change. Defaults to False.
+
+        Returns:
+            dict: Keys uploaded, deleted and unchanged, and the number of failures.
+        """
+        directory = directory or self.directory
+
+        localFiles = {}
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if filename == UPLOAD_LOG or filename.startswith(MANIFEST_NAME):
+                    continue
+                path = os.path.join(root, filename)
+                stat = os.stat(path)
+                key = prefix + os.path.relpath(path, directory).replace(os.sep, "/")
+                localFiles[key] = (path, stat.st_size, stat.st_mtime)
 
-                if os.path.isfile(file):
+        self.inventory.refresh(prefixes=[prefix])
+        remoteObjects = {key: (size, etag, lastModified)
+                         for key, size, etag, lastModified in self.inventory.objects(prefix)}
 
-                    if PN not in existing_contents:
+        toUpload = [key for key in localFiles
+                    if key not in remoteObjects or localFiles[key][1] != remoteObjects[key][0]]
+        sameSize = [key for key in localFiles if key in remoteObjects and localFiles[key][1] == remoteObjects[key][0]]
+        with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+            changed = pool.map(lambda key: self._changed(localFiles[key], remoteObjects[key]), sameSize)
+            toUpload += [key for key, isChanged in zip(sameSize, changed) if isChanged]
+        toDelete = sorted(set(remoteObjects) - set(localFiles)) if delete else []
 
-                        try:
+        result = {"uploaded": [], "deleted": [], "unchanged": len(localFiles) - len(toUpload), "failed": 0}
+        print(f"Sync {directory} -> {self.mpdb.name}/{prefix}: {len(toUpload)} to upload, {len(toDelete)} to delete, "
+              f"{result['unchanged']} unchanged")
+        if dry_run:
+            result["uploaded"], result["deleted"] = sorted(toUpload), toDelete
+            return result
 
-                            self.mpdb.upload_file(file, f"productimages/{filename}")
-                            f.write(f"{filename}\n")
-                            recordsAdded += 1
-                            if recordNumber % 20 == 0:  # only printing every 20th record for confirmation of upload
+        progress = UploadProgress(len(toUpload))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {pool.submit(self._upload_object, localFiles[key][0], key): key for key in toUpload}
+            for future in as_completed(futures):
+                try:
+                    progress.record(future.result())
+                    result["uploaded"].append(futures[future])
+                except Exception as e:
+                    progress.record(failed=True)
+                    result["failed"] += 1
+                    print(f"failed to upload {futures[future]} to Wasabi. Error: {e}")
 
-                                print(f"{PN} successfully uploaded to Wasabi ({recordsAdded} images uploaded)")
+        # DeleteObjects takes up to 1000 keys per request
+        for start in range(0, len(toDelete), 1000):
+            batch = toDelete[start:start + 1000]
+            response = self.client.delete_objects(Bucket=self.mpdb.name,
+                                                  Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+            failedKeys = {error['Key'] for error in response.get('Errors', [])}
+            for key in batch:
+                if key in failedKeys:
+                    result["failed"] += 1
+                else:
+                    self.manifest.remove(key)
+                    self.inventory.remove(key)
+                    result["deleted"].append(key)
 
-                        except Exception as e:
-                            print(f"failed to upload {PN} to Wasabi. Error: {e}")
+        print(f"Sync complete! {progress.summary()}, {len(result['deleted'])} deleted")
+        return result
 
-            f.close()  
-        print(f"Complete! Records Added: {recordsAdded}")
+    def _changed(self, localFile, remoteObject):
+        path, size, mtime = localFile
+        _, remoteEtag, lastModified = remoteObject
 
-    def count_uploads(self):
-        counting_mpdb = self.s3.Bucket('mpdb')
-        count = 0
-        print("Counting...")
-        for _ in counting_mpdb.objects.all():
-            count += 1
+        if "-" not in remoteEtag:
+            return self._file_hash(path, "md5", size, mtime) != remoteEtag
+
+        # A multipart ETag depends on the part size used, which the object does not record; try the
+        # part sizes that give its part count
+        partSizes = candidate_part_sizes(size, int(remoteEtag.split("-")[1]), self.multipart.part_size)
+        if not partSizes:
+            # No plausible part size fits, so the ETag cannot be reproduced; fall back to mtime
+            return mtime > lastModified
+        return all(self._file_hash(path, f"multipart-{partSize}", size, mtime) != remoteEtag
+                   for partSize in partSizes)
+
+    def _file_hash(self, path, kind, size, mtime):
+        etag = self.manifest.cached_hash(path, kind, size, mtime)
+        if etag is None:
+            etag = file_md5(path) if kind == "md5" else multipart_etag(path, int(kind.split("-")[1]))
+            self.manifest.store_hash(path, kind, size, mtime, etag)
+        return etag
+
+    def _upload_object(self, file, key):
+        stat = os.stat(file)
+        size = stat.st_size
+        if size < self.multipart_threshold:
+            with open(file, 'rb') as body:
+                etag = self.client.put_object(Bucket=self.mpdb.name, Key=key, Body=body)['ETag']
+            self.manifest.record(key, size, etag)
+
+            # The returned ETag is the file's MD5, so the next sync need not read the file again
+            if os.stat(file).st_mtime == stat.st_mtime:
+                self.manifest.store_hash(file, "md5", size, stat.st_mtime, etag.strip('"'))
+        else:
+            # Stores the multipart ETag for the part size it actually used (a resumed upload keeps its own)
+            etag = self.multipart.upload(file, key)
+        self.inventory.record(key, size, etag)
+        return size
+
+    def _upload_photo(self, filename, log):
+        size = self._upload_object(os.path.join(self.directory, filename), f"productimages/{filename}")
+
+        with self._log_lock:
+            log.write(f"{filename}\n")
+            log.flush()
+        return size
+
+    def count_uploads(self, prefix="", refresh=False, max_age=INVENTORY_MAX_AGE):
+        """
+        Counts the objects in the bucket from the inventory. Parts of the inventory older than max_age
+        seconds are listed again first (the whole bucket if refresh is set or the inventory is empty).
+        """
+        if refresh:
+            print("Counting...")
+            self.inventory.refresh()
+        else:
+            self.inventory.ensure_fresh(max_age)
+        count = self.inventory.count(prefix)
         print(f"{count} objects found in the library's bucket")
+        return count
+
+    def object_exists(self, key, max_age=INVENTORY_MAX_AGE):
+        """
+        Returns whether key is in the bucket according to the inventory, listing parts of the bucket
+        again only when they are older than max_age seconds.
+        """
+        self.inventory.ensure_fresh(max_age)
+        return self.inventory.exists(key)
 
     def count_items_in_part_list(self):
         """